@@ -45,8 +45,18 @@ class HyperionJson(HyperionConnector):
             :return:
             :raises HyperionError
         """
+        self.send_encoded(json.dumps(fields) + "\n")
+
+    def send_encoded(self, message):
+        """
+        Send an already encoded message to the Hyperion server.
+            :param message: the encoded message, e.g. from encode_colors
+            :type message: str
+            :return:
+            :raises HyperionError
+        """
         try:
-            self._socket.sendall(json.dumps(fields) + "\n")
+            self._socket.sendall(message)
         except socket.error:
             self._connected = False
             raise HyperionError("Connection failed")
@@ -109,8 +119,23 @@ class HyperionJson(HyperionConnector):
         .. Note:: If only one set of (r,g,b) values are given
                   the color will apply to all LEDs.
         """
-        self.__send_json({HyperionJson._Field.COMMAND:
-                          HyperionJson._Command.COLOR,
-                          HyperionJson._Field.PRIORITY: priority,
-                          HyperionJson._Field.COLOR: colors,
-                          HyperionJson._Field.DURATION: duration})
+        self.send_encoded(self.encode_colors(colors, priority, duration))
+
+    @staticmethod
+    def encode_colors(colors, priority, duration=-1):
+        """
+        Encode a color message once, to be sent with send_encoded.
+            :param colors: list of the flattened led data (r,g,b) * led count
+            :type colors: list
+            :param priority: the priority
+            :type priority: int
+            :param duration: the display duration in milliseconds (default: -1)
+            :type duration: int
+            :return: the encoded message
+            :rtype: str
+        """
+        return json.dumps({HyperionJson._Field.COMMAND:
+                           HyperionJson._Command.COLOR,
+                           HyperionJson._Field.PRIORITY: priority,
+                           HyperionJson._Field.COLOR: colors,
+                           HyperionJson._Field.DURATION: duration}) + "\n"
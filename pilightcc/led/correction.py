@@ -0,0 +1,98 @@
+""" LED color correction module. """
+
+# Vectorized lookup
+import numpy as np
+
+# Application
+from pilightcc.settings.settings import Setting
+
+
+class ColorCorrection(object):
+    """ Color Correction class.
+    Applies gamma, white balance and brightness correction through
+    precomputed 256 entry lookup tables, one per color channel.
+    The tables are only rebuilt when the correction changes and the
+    gather index buffer is reused while the frame shape is kept.
+    """
+
+    # The settings affecting the correction.
+    SETTINGS = [Setting.LED_GAMMA, Setting.LED_BRIGHTNESS,
+                Setting.LED_WHITE_RED, Setting.LED_WHITE_GREEN,
+                Setting.LED_WHITE_BLUE]
+
+    __CHANNELS = 3
+    __LUT_SIZE = 256
+
+    def __init__(self):
+        self.__params = None
+        self.__identity = True
+        self.__lut = np.empty(ColorCorrection.__CHANNELS *
+                              ColorCorrection.__LUT_SIZE, np.uint8)
+        # Offsets selecting the table of each channel.
+        self.__offsets = np.arange(ColorCorrection.__CHANNELS,
+                                   dtype=np.intp) * ColorCorrection.__LUT_SIZE
+        self.__index = None
+        self.set_correction()
+
+    def set_correction(self, gamma=1.0, brightness=1.0,
+                       white_point=(255, 255, 255)):
+        """ Update the correction, tables are rebuilt only on change.
+            :param gamma: the gamma exponent (default: 1.0)
+            :type gamma: float
+            :param brightness: the brightness factor 0-1 (default: 1.0)
+            :type brightness: float
+            :param white_point: the (r,g,b) output for full white
+                                (default: (255, 255, 255))
+            :type white_point: tuple
+        """
+        params = (float(gamma), float(brightness), tuple(white_point))
+        if params == self.__params:
+            return
+        self.__params = params
+
+        levels = np.arange(ColorCorrection.__LUT_SIZE) / 255.0
+        levels **= gamma
+        for c, white in enumerate(white_point):
+            table = self.__lut[c * ColorCorrection.__LUT_SIZE:
+                               (c + 1) * ColorCorrection.__LUT_SIZE]
+            np.copyto(table, np.clip(
+                np.round(levels * white * brightness), 0, 255),
+                casting='unsafe')
+
+        identity = np.tile(np.arange(ColorCorrection.__LUT_SIZE),
+                           ColorCorrection.__CHANNELS)
+        self.__identity = bool((self.__lut == identity).all())
+
+    def set_correction_from_settings(self, settings):
+        """ Update the correction from the LED settings.
+            :param settings: the settings dictionary
+            :type settings: dict
+        """
+        self.set_correction(settings[Setting.LED_GAMMA],
+                            settings[Setting.LED_BRIGHTNESS] / 100.0,
+                            (settings[Setting.LED_WHITE_RED],
+                             settings[Setting.LED_WHITE_GREEN],
+                             settings[Setting.LED_WHITE_BLUE]))
+
+    def is_identity(self):
+        """
+            :return: True if the correction leaves colors unchanged
+            :rtype: bool
+        """
+        return self.__identity
+
+    def apply(self, frame):
+        """ Correct a frame in place.
+            :param frame: uint8 colors with the channels as last axis, e.g.
+                          an (h, w, 3) image or an (n, 3) LED array
+            :type frame: numpy.ndarray
+            :return: the corrected frame
+            :rtype: numpy.ndarray
+        """
+        if self.__identity:
+            return frame
+        if self.__index is None or self.__index.shape != frame.shape:
+            self.__index = np.empty(frame.shape, np.intp)
+        np.add(frame, self.__offsets, out=self.__index)
+        np.take(self.__lut, self.__index, out=frame, mode='clip')
+        return frame
@@ -0,0 +1,49 @@
+""" LED frame module. """
+
+# Vectorized frame operations
+import numpy as np
+
+
+def normalize(data, min_value, max_value, out=None):
+    """ Clip levels to a range and scale them to 0-1.
+        :param data: the levels, e.g. in dB
+        :type data: list | numpy.ndarray
+        :param min_value: the level mapped to 0
+        :type min_value: float
+        :param max_value: the level mapped to 1
+        :type max_value: float
+        :param out: float array to write to, same shape as data (optional)
+        :type out: numpy.ndarray
+        :return: the normalized levels
+        :rtype: numpy.ndarray
+    """
+    if out is None:
+        data = out = np.array(data, np.float32)
+    np.clip(data, min_value, max_value, out=out)
+    out -= min_value
+    out /= float(max_value - min_value)
+    return out
+
+
+class LedFrame(object):
+    """ LED Frame class.
+    Holds the (r,g,b) values of a LED strip in a preallocated (count, 3)
+    uint8 array, effects write into it in place.
+    """
+
+    def __init__(self, count):
+        """
+            :param count: the number of LEDs
+            :type count: int
+        """
+        self.colors = np.zeros((count, 3), np.uint8)
+
+    def __len__(self):
+        return len(self.colors)
+
+    def to_list(self):
+        """
+            :return: the LED data as a list of repeated (r,g,b) values
+            :rtype: list
+        """
+        return self.colors.ravel().tolist()
@@ -0,0 +1,211 @@
+""" LED layout module. """
+
+# Precomputed index arrays
+import numpy as np
+
+# Application
+from pilightcc.settings.settings import Setting, LedCorner, LedDir
+
+
+class LedLayout(object):
+    """ LED Layout class.
+    The geometry of a LED strip around the screen, computed once per
+    setting change. Every physical LED, in strip order, gets the side it
+    is on, its position along the side (in ascending x or y) and its
+    source in the joined audio channels. The strip runs from the start
+    corner, in the given direction, along all four sides.
+
+    Audio effects render two channels from the bottom centre up to the top
+    centre, the left channel along the left side and the right channel
+    along the right side. Odd top and bottom counts leave the centre LED
+    unlit.
+    """
+
+    # Sides, in edge order.
+    TOP = 0
+    RIGHT = 1
+    BOTTOM = 2
+    LEFT = 3
+
+    # Ring order corners, clockwise from the top left (north west) corner.
+    __CORNERS = [LedCorner.NW, LedCorner.NE, LedCorner.SE, LedCorner.SW]
+
+    def __init__(self, count_top, count_bottom, count_side,
+                 corner=LedCorner.SE, direction=LedDir.CCW):
+        """
+            :param count_top: the LED count along the top edge
+            :type count_top: int
+            :param count_bottom: the LED count along the bottom edge
+            :type count_bottom: int
+            :param count_side: the LED count along each side edge
+            :type count_side: int
+            :param corner: the corner of the first LED (default: SE)
+            :type corner: str
+            :param direction: the LED direction (default: CCW)
+            :type direction: str
+        """
+        self.count_top = count_top
+        self.count_bottom = count_bottom
+        self.count_side = count_side
+        self.corner = corner
+        self.direction = direction
+        self.counts = [count_top, count_side, count_bottom, count_side]
+        self.count = sum(self.counts)
+        self.channel_width = count_top // 2 + count_bottom // 2 + count_side
+
+        # Clockwise ring from the top left corner: top left to right, right
+        # side downwards, bottom right to left and left side upwards.
+        ring_sides = np.repeat([LedLayout.TOP, LedLayout.RIGHT,
+                                LedLayout.BOTTOM, LedLayout.LEFT],
+                               self.counts)
+        ring_positions = np.concatenate([
+            np.arange(count_top), np.arange(count_side),
+            np.arange(count_bottom)[::-1], np.arange(count_side)[::-1]])
+
+        # Rotate to the start corner, counter clockwise strips start with
+        # the LED before the corner.
+        corner_offsets = np.cumsum([0, count_top, count_side, count_bottom])
+        start = corner_offsets[LedLayout.__CORNERS.index(corner)]
+        ring = np.roll(np.arange(self.count), -start)
+        if direction == LedDir.CCW:
+            ring = ring[::-1]
+
+        # Side and position of every physical LED.
+        self.sides = ring_sides[ring]
+        self.positions = ring_positions[ring].astype(np.intp)
+
+        # Index of every physical LED with the sides stored in edge order.
+        edge_offsets = np.cumsum([0] + self.counts[:-1])
+        self.edge_index = (edge_offsets[self.sides] +
+                           self.positions).astype(np.intp)
+
+        self.channel_index = self.__get_channel_index()
+
+    @staticmethod
+    def from_settings(settings):
+        """ Create the layout from the LED settings.
+            :param settings: the settings dictionary
+            :type settings: dict
+            :rtype: LedLayout
+        """
+        return LedLayout(settings[Setting.LED_COUNT_TOP],
+                         settings[Setting.LED_COUNT_BOTTOM],
+                         settings[Setting.LED_COUNT_SIDE],
+                         settings[Setting.LED_START_CORNER],
+                         settings[Setting.LED_DIRECTION])
+
+    def __get_channel_index(self):
+        # Channel positions count from the bottom centre, the left channel
+        # is stored first, then the right channel and one unlit entry.
+        top, bottom, side = \
+            self.count_top, self.count_bottom, self.count_side
+        width = self.channel_width
+        unlit = 2 * width
+        pos = self.positions
+        half_bottom = bottom // 2
+        conditions = [
+            (self.sides == LedLayout.TOP) & (pos < top // 2),
+            (self.sides == LedLayout.TOP) & (pos >= top - top // 2),
+            self.sides == LedLayout.RIGHT,
+            (self.sides == LedLayout.BOTTOM) & (pos < half_bottom),
+            (self.sides == LedLayout.BOTTOM) & (pos >= bottom - half_bottom),
+            self.sides == LedLayout.LEFT]
+        choices = [
+            half_bottom + side + pos,
+            width + half_bottom + side + top - 1 - pos,
+            width + half_bottom + side - 1 - pos,
+            half_bottom - 1 - pos,
+            width + pos - (bottom - half_bottom),
+            half_bottom + side - 1 - pos]
+        return np.select(conditions, choices, unlit).astype(np.intp)
+
+    def get_channel_offset(self, section, fraction=1.0):
+        """ Get a position along the audio channels, from the bottom centre
+        up: the bottom half, the side and the top half.
+            :param section: LedLayout.BOTTOM, LedLayout.LEFT or
+                            LedLayout.RIGHT (the side) or LedLayout.TOP
+            :type section: int
+            :param fraction: the part of the section (default: 1.0)
+            :type fraction: float
+            :return: the channel position
+            :rtype: int
+        """
+        half_bottom = self.count_bottom // 2
+        starts = {LedLayout.BOTTOM: 0,
+                  LedLayout.LEFT: half_bottom,
+                  LedLayout.RIGHT: half_bottom,
+                  LedLayout.TOP: half_bottom + self.count_side}
+        return starts[section] + self.get_section_length(section, fraction)
+
+    def get_section_length(self, section, fraction=1.0):
+        """ Get a part of a section of the audio channels, rounded to whole
+        LEDs.
+            :param section: LedLayout.BOTTOM, LedLayout.LEFT or
+                            LedLayout.RIGHT (the side) or LedLayout.TOP
+            :type section: int
+            :param fraction: the part of the section (default: 1.0)
+            :type fraction: float
+            :return: the LED count
+            :rtype: int
+        """
+        counts = {LedLayout.BOTTOM: self.count_bottom // 2,
+                  LedLayout.LEFT: self.count_side,
+                  LedLayout.RIGHT: self.count_side,
+                  LedLayout.TOP: self.count_top // 2}
+        return int(round(counts[section] * fraction))
+
+    def get_side_mask(self, side):
+        """
+            :param side: the side, e.g. LedLayout.TOP
+            :type side: int
+            :return: True for the physical LEDs on the side
+            :rtype: numpy.ndarray
+        """
+        return self.sides == side
+
+    def get_edges(self, width, height, depth=0.1):
+        """ Get the pixel partition of the screen edges.
+        Every LED covers 1/count of its edge and `depth` of the frame.
+            :param width: the frame width
+            :type width: int
+            :param height: the frame height
+            :type height: int
+            :param depth: the region depth as frame fraction (default: 0.1)
+            :type depth: float
+            :return: (rows, columns, axis along the edge, segment starts)
+                     per side, in edge order
+            :rtype: list
+        """
+        depth_y = max(int(round(height * depth)), 1)
+        depth_x = max(int(round(width * depth)), 1)
+        edges = [(slice(0, depth_y), slice(None), 1),
+                 (slice(None), slice(width - depth_x, width), 0),
+                 (slice(height - depth_y, height), slice(None), 1),
+                 (slice(None), slice(0, depth_x), 0)]
+        return [(rows, cols, axis,
+                 (np.arange(count) * (width if axis == 1 else height)) //
+                 count)
+                for (rows, cols, axis), count in zip(edges, self.counts)]
+
+    def get_rects(self, width, height, depth=0.1):
+        """ Get the screen region of every LED.
+            :param width: the frame width
+            :type width: int
+            :param height: the frame height
+            :type height: int
+            :param depth: the region depth as frame fraction (default: 0.1)
+            :type depth: float
+            :return: the (n, 4) x0, y0, x1, y1 regions in physical order
+            :rtype: numpy.ndarray
+        """
+        rects = []
+        for rows, cols, axis, starts in self.get_edges(width, height,
+                                                       depth):
+            length = width if axis == 1 else height
+            ends = np.append(starts[1:], length)
+            y0, y1, _ = rows.indices(height)
+            x0, x1, _ = cols.indices(width)
+            for start, end in zip(starts, ends):
+                rects.append((start, y0, end, y1) if axis == 1 else
+                             (x0, start, x1, end))
+        return np.array(rects, np.intp).reshape(-1, 4)[self.edge_index]
@@ -3,14 +3,21 @@
 # Service
 from pilightcc.services.service import BaseService
 from pilightcc.services.service import ServiceLauncher
-from threading import Lock, Event
 
 # Application
 from pilightcc.services.audio.audioanalyzer import AudioAnalyserError
 from pilightcc.services.audio.audioeffect import LevelEffect
+from pilightcc.services.audio.audioeffect import SpectrumEffect
+from pilightcc.services.audio.framecache import FrameCache
+from pilightcc.services.audio.latency import FrameTiming, LatencyStats
+from pilightcc.services.audio.mainloop import GLibLoop
+from pilightcc.services.audio.pacing import Mailbox, FrameClock
+from pilightcc.services.audio.pacing import DataInterpolator
 from pilightcc.hyperion.hypjson import HyperionJson
 from pilightcc.hyperion.hypproto import HyperionError
+from pilightcc.led.correction import ColorCorrection
 from pilightcc.settings.settings import Setting, LedCorner, LedDir
+from pilightcc.settings.settings import AudioEffect
 
 
 class AudioService(BaseService):
@@ -26,17 +33,27 @@ class AudioService(BaseService):
     __ERROR_DELAY = 5
     __AUDIO_ANALYSER_TIMEOUT = 1
     __IMAGE_DURATION = 500
+    __REPORT_FRAMES = 1000
 
     def __init__(self, port):
         """ Constructor
         """
         super(AudioService, self).__init__(port, True)
         self._update_state(AudioService.StateValue.OK)
-        self.__lock = Lock()
-        self._new_data_event = Event()
         self.__hyperion_connector = None
         self.__audio_analyser = None
+        self.__audio_source = None
         self.__audio_effect = None
+        self.__correction = ColorCorrection()
+        self.__frame_cache = FrameCache(0)
+        self.__latency = LatencyStats()
+        self.__frame_count = 0
+
+        # Analyser updates are rendered on the frame clock.
+        self.__mailbox = Mailbox()
+        self.__frame_clock = FrameClock(1)
+        self.__interpolator = DataInterpolator(1)
+        self.__last_update_time = None
 
         # Register settings.
         self._register_settings_unit(
@@ -44,16 +61,26 @@ class AudioService(BaseService):
             self.__update_hyperion_connector)
 
         self._register_settings_unit(
-            [Setting.AUDIO_FRAME_RATE, Setting.LED_COUNT_TOP,
+            [Setting.AUDIO_FRAME_RATE, Setting.AUDIO_ANALYSER,
+             Setting.AUDIO_EFFECT, Setting.AUDIO_CACHE_LEVELS,
+             Setting.AUDIO_CACHE_SIZE, Setting.AUDIO_SOURCE,
+             Setting.AUDIO_INTERVAL, Setting.AUDIO_LOW_CUTOFF,
+             Setting.AUDIO_MID_LOWER, Setting.AUDIO_MID_UPPER,
+             Setting.AUDIO_HIGH_CUTOFF, Setting.LED_COUNT_TOP,
              Setting.LED_COUNT_BOTTOM, Setting.LED_COUNT_SIDE,
              Setting.LED_START_CORNER, Setting.LED_DIRECTION],
             self.__update_audio_effect)
 
-        self._register_settings_unit([Setting.AUDIO_PRIORITY])
+        self._register_settings_unit([Setting.AUDIO_PRIORITY],
+                                     self.__flush_frame_cache)
+
+        self._register_settings_unit(ColorCorrection.SETTINGS,
+                                     self.__update_correction)
 
     def _setup(self):
         self.__update_hyperion_connector()
         self.__update_audio_effect()
+        self.__update_correction()
 
     def _enable(self, enable):
         if enable:
@@ -64,7 +91,10 @@ class AudioService(BaseService):
             self.__audio_analyser.start()
         else:
             self.__hyperion_connector.disconnect()
-            self.__audio_analyser.stop()
+            self.__stop_audio_analyser()
+
+    def _on_shutdown(self):
+        GLibLoop.get().shutdown()
 
     def __update_hyperion_connector(self):
         if self.__hyperion_connector is not None:
@@ -74,17 +104,90 @@ class AudioService(BaseService):
             self._get_setting(Setting.HYPERION_JSON_PORT))
 
     def __update_audio_effect(self):
+        if self._get_setting(Setting.AUDIO_EFFECT) == AudioEffect.SPECTRUM:
+            self.__audio_effect = SpectrumEffect(self._get_settings())
+        else:
+            self.__audio_effect = LevelEffect(self._get_settings())
+        self.__frame_cache = FrameCache(
+            self._get_setting(Setting.AUDIO_CACHE_SIZE) * 1024)
+        self.__latency.clear()
+        self.__frame_clock.set_rate(
+            self._get_setting(Setting.AUDIO_FRAME_RATE))
+        self.__interpolator.set_period(self.__frame_clock.get_period())
+
+        # Keep the running analyser if the new effect can reconfigure it,
+        # a new pipeline is only built for a new source or analyser type.
+        source = self._get_setting(Setting.AUDIO_SOURCE)
+        if self.__audio_analyser is not None and \
+                source == self.__audio_source and \
+                self.__audio_effect.reconfigure_analyser(
+                    self.__audio_analyser):
+            return
         if self.__audio_analyser is not None:
             self.__audio_analyser.stop()
-        # self.__audio_effect = SpectrumEffect(self._get_settings())
-        self.__audio_effect = LevelEffect(self._get_settings())
+        self.__audio_source = source
         self.__audio_analyser = self.__audio_effect.get_new_analyser(
             self.__update_audio_data)
 
-    def __update_audio_data(self, data):
-        with self.__lock:
-            self._data = data
-            self._new_data_event.set()
+        # Restart the output schedule.
+        self.__frame_clock.reset()
+        self.__interpolator.reset()
+        self.__mailbox.clear()
+
+    def __update_correction(self):
+        self.__correction.set_correction_from_settings(self._get_settings())
+        self.__flush_frame_cache()
+
+    def __flush_frame_cache(self):
+        # Cached payloads include the correction and message settings.
+        self.__frame_cache.clear()
+
+    def __get_payload(self, data):
+        # Level driven effects are looked up by their quantized inputs.
+        cache = self.__frame_cache
+        key = self.__audio_effect.get_effect_key(data) \
+            if cache.is_enabled() else None
+        payload = None if key is None else cache.get(key)
+        if payload is None:
+            # Calculate send_effect frame, correct it in place and encode.
+            if key is None:
+                frame = self.__audio_effect.get_effect(data)
+            else:
+                frame = self.__audio_effect.get_keyed_effect(key)
+            self.__correction.apply(frame.colors)
+            payload = HyperionJson.encode_colors(
+                frame.to_list(), self._get_setting(Setting.AUDIO_PRIORITY),
+                self.__IMAGE_DURATION)
+            if key is not None:
+                cache.put(key, payload)
+        return payload
+
+    def __report_stats(self):
+        # Publish the latencies and cache use every few seconds.
+        self.__frame_count += 1
+        if self.__frame_count % AudioService.__REPORT_FRAMES:
+            return
+        msg = self.__latency.get_report()
+        msg += "; frames: {} dropped, {} late".format(
+            self.__mailbox.get_dropped(), self.__frame_clock.get_late())
+        cache = self.__frame_cache
+        if cache.get_lookups():
+            msg += "; frame cache hit rate: {:.1%}, {} frames, {} kB".format(
+                cache.get_hit_rate(), cache.get_size(),
+                cache.get_bytes() // 1024)
+        self._update_state(msg=msg)
+
+    def __update_audio_data(self, data, timing):
+        timing.stamp(FrameTiming.DISPATCH)
+        self.__mailbox.put((data, timing))
+
+    def __stop_audio_analyser(self):
+        # Restart the output schedule, no stale update is rendered after.
+        self.__audio_analyser.stop()
+        self.__interpolator.reset()
+        self.__mailbox.clear()
+        self.__last_update_time = None
+        self.__frame_clock.reset()
 
     def _run_service(self):
         try:
@@ -98,25 +201,43 @@ class AudioService(BaseService):
                 self.__audio_analyser.start()
                 self.__audio_effect.reset()
 
-            if self._new_data_event.wait(
-                    AudioService.__AUDIO_ANALYSER_TIMEOUT):
-                # Only update if not timed out.
-                with self.__lock:
-                    data = self._data
-                    self._new_data_event.clear()
-
-                # Calculate send_effect frame.
-                led_data = self.__audio_effect.get_effect(data)
-
-                # Send message.
-                self.__hyperion_connector.send_colors(
-                    led_data, self._get_setting(Setting.AUDIO_PRIORITY),
-                    self.__IMAGE_DURATION)
-            else:
+            # Wait for the first update, then render on the frame clock.
+            if not self.__interpolator.has_data():
+                if not self.__mailbox.wait(
+                        AudioService.__AUDIO_ANALYSER_TIMEOUT):
+                    self.__stop_audio_analyser()
+                    raise AudioAnalyserError("AudioAnalyser error")
+                self.__frame_clock.reset()
+            now = self.__frame_clock.wait()
+
+            # Only the latest update is used, older ones are dropped.
+            update, new = self.__mailbox.take()
+            timing = None
+            if new:
+                data, timing = update
+                timing.stamp(FrameTiming.WAIT)
+                self.__interpolator.push(data, now)
+                self.__last_update_time = now
+            elif self.__last_update_time is None:
+                # The mailbox was cleared after the wait, wait again.
+                return
+            elif now - self.__last_update_time > \
+                    AudioService.__AUDIO_ANALYSER_TIMEOUT:
                 # AudioAnalyser is not sending updates.
-                self.__audio_analyser.stop()
+                self.__stop_audio_analyser()
                 raise AudioAnalyserError("AudioAnalyser error")
 
+            payload = self.__get_payload(self.__interpolator.get(now))
+            if timing is not None:
+                timing.stamp(FrameTiming.RENDER)
+
+            # Send message.
+            self.__hyperion_connector.send_encoded(payload)
+            if timing is not None:
+                timing.stamp(FrameTiming.SEND)
+                self.__latency.add(timing)
+            self.__report_stats()
+
         except (HyperionError, AudioAnalyserError) as err:
             self._update_state(AudioService.StateValue.ERROR, err.msg)
             self._safe_delay(AudioService.__ERROR_DELAY)
@@ -7,9 +7,17 @@ from pilightcc.util.error import BaseError
 
 require_version('Gst', '1.0')
 require_version('Gtk', '3.0')
-from gi.repository import Gst, GObject
+from gi.repository import Gst
 
-from threading import Thread, Lock
+from threading import Lock
+
+# Spectral analysis
+import numpy as np
+
+from pilightcc.services.audio.filterbank import FilterBank
+from pilightcc.services.audio.latency import FrameTiming
+from pilightcc.services.audio.mainloop import GLibLoop
+from pilightcc.services.audio.onset import OnsetDetector
 
 
 class BaseAudioAnalyser:
@@ -18,12 +26,11 @@ class BaseAudioAnalyser:
         self.__lock = Lock()
         self.__error_callback = error_callback
 
-        # Initiate GObject.
-        GObject.threads_init()
-        Gst.init(None)
-        self.__loop = GObject.MainLoop()
+        # Bus watches run on the shared loop, which initiates GStreamer.
+        self.__loop = GLibLoop.get()
         self.__pipelines = []
         self.__connections = []
+        self.__capture_latency = None
 
     def __del__(self):
         self.stop()
@@ -44,41 +51,76 @@ class BaseAudioAnalyser:
     def _register_virtual_pipeline(self, pipeline):
         self.__pipelines.append(pipeline.compile())
 
+    def __get_capture_latency(self):
+        # The source latency is fixed while playing, query it once.
+        if self.__capture_latency is None and self.__pipelines:
+            query = Gst.Query.new_latency()
+            if self.__pipelines[0][0].query(query):
+                _, min_latency, _ = query.parse_latency()
+                self.__capture_latency = _to_seconds(min_latency)
+        return self.__capture_latency
+
+    def __get_running_time(self):
+        pipeline = self.__pipelines[0][0]
+        clock = pipeline.get_clock()
+        if clock is None:
+            return None
+        return _to_seconds(clock.get_time() - pipeline.get_base_time())
+
+    def _create_timing(self, timestamp, running_time):
+        """ Create the timing of an update, stamped as analysed.
+            :param timestamp: the stream time of the analysed audio in s
+            :type timestamp: float
+            :param running_time: the running time at the end of the
+                                 analysed audio in s
+            :type running_time: float
+            :return: the timing to pass to the callback
+            :rtype: FrameTiming
+        """
+        now = self.__get_running_time()
+        timing = FrameTiming(
+            timestamp, running_time, self.__get_capture_latency(),
+            None if now is None else max(now - running_time, 0.0))
+        timing.stamp(FrameTiming.ANALYSIS)
+        return timing
+
     def start(self):
         """ Start analysing audio.
         """
         with self.__lock:
             if not self.__running:
                 self.__running = True
+                self.__capture_latency = None
 
                 # Connect handlers and set state.
                 for p, handlers in self.__pipelines:
-                    bus = p.get_bus()
-                    bus.add_signal_watch()
-                    handler_connections = [bus.connect(tag, handler) for
-                                           tag, handler in handlers]
-                    self.__connections.append((p, handler_connections))
+                    self.__connections.append(
+                        (p, self.__loop.attach(p.get_bus(), handlers)))
 
                 for p, _ in self.__pipelines:
                     p.set_state(Gst.State.PLAYING)
 
-                # Setup shutdown watcher and start main loop.
-                Thread(target=self.__loop.run).start()
-
     def stop(self):
         """ Stop analysing audio.
         """
         with self.__lock:
             if self.__running:
                 self.__running = False
-                self.__loop.quit()
 
                 # Disconnect handlers and set state.
                 for p, handler_connections in self.__connections:
-                    bus = p.get_bus()
-                    [bus.disconnect(c) for c in handler_connections]
-                    bus.remove_signal_watch()
+                    self.__loop.detach(p.get_bus(), handler_connections)
                     p.set_state(Gst.State.NULL)
+                self.__connections = []
+
+    def reconfigure(self, **opts):
+        """ May be implemented by subclass.
+        Apply new options to the pipeline in place, without stopping it.
+        Options that are left out keep their value.
+            :return: False if the options need a new analyser
+            :rtype: bool
+        """
+        return False
 
     def is_running(self):
         """
@@ -102,23 +144,129 @@ class AudioAnalyserError(BaseError):
         self.msg = msg
 
 
+class AudioSource(object):
+    """ Audio Source class.
+    Where an analyser reads its audio from: a PulseAudio source, an audio
+    file or a generated test signal. In settings, sources are written as
+    the PulseAudio source name, 'file:<path>' or 'test:<wave>' with an
+    audiotestsrc wave, e.g. 'test:pink-noise'.
+
+    Files and test signals play in real time by default, otherwise as fast
+    as the analysis runs, e.g. for benchmarks.
+    """
+
+    PULSE = 'pulse'
+    FILE = 'file'
+    TEST = 'test'
+
+    __FILE_BIN = "filesrc name=source ! decodebin ! audioconvert ! " \
+                 "audioresample"
+    __TEST_SAMPLES_PER_BUFFER = 1024
+
+    def __init__(self, kind, location, realtime=True, duration=None):
+        """
+            :param kind: the source kind, e.g. AudioSource.FILE
+            :type kind: str
+            :param location: the PulseAudio source name, the file path or
+                             the test wave
+            :type location: str
+            :param realtime: play files and test signals in real time
+                             (default: True)
+            :type realtime: bool
+            :param duration: the test signal length in s (default: endless)
+            :type duration: float
+        """
+        self.kind = kind
+        self.location = location
+        self.realtime = realtime
+        self.duration = duration
+
+    @staticmethod
+    def parse(value, realtime=True, duration=None):
+        """ Create a source from its settings form.
+            :param value: the source, e.g. 'file:/tmp/track.ogg'
+            :type value: str | AudioSource
+            :param realtime: play in real time (default: True)
+            :type realtime: bool
+            :param duration: the test signal length in s (default: endless)
+            :type duration: float
+            :rtype: AudioSource
+        """
+        if isinstance(value, AudioSource):
+            return value
+        for kind in (AudioSource.FILE, AudioSource.TEST):
+            if value.startswith(kind + ':'):
+                return AudioSource(kind, value[len(kind) + 1:], realtime,
+                                   duration)
+        return AudioSource(AudioSource.PULSE, value)
+
+    def is_offline(self):
+        """
+            :return: True if the audio is analysed as fast as possible
+            :rtype: bool
+        """
+        return self.kind != AudioSource.PULSE and not self.realtime
+
+    def is_synced(self):
+        """
+            :return: True if the sinks must pace a file in real time
+            :rtype: bool
+        """
+        return self.kind == AudioSource.FILE and self.realtime
+
+    def make_element(self, sample_rate):
+        """
+            :param sample_rate: the analysed sample rate in Hz
+            :type sample_rate: int
+            :return: the source element, or a bin with decoding
+            :rtype: Gst.Element
+        """
+        if self.kind == AudioSource.FILE:
+            source = Gst.parse_bin_from_description(
+                AudioSource.__FILE_BIN, True)
+            source.get_by_name('source').set_property('location',
+                                                      self.location)
+        elif self.kind == AudioSource.TEST:
+            source = Gst.ElementFactory.make('audiotestsrc', None)
+            Gst.util_set_object_arg(source, 'wave', self.location)
+            source.set_property('is-live', self.realtime)
+            source.set_property('samplesperbuffer',
+                                AudioSource.__TEST_SAMPLES_PER_BUFFER)
+            if self.duration is not None:
+                source.set_property('num-buffers', int(np.ceil(
+                    self.duration * sample_rate /
+                    AudioSource.__TEST_SAMPLES_PER_BUFFER)))
+        else:
+            source = Gst.ElementFactory.make('pulsesrc', None)
+            source.set_property('device', self.location)
+        return source
+
+
 class LevelAudioAnalyser(BaseAudioAnalyser):
     __LEVEL_MSG_NAME = 'level'
     __LEVEL_MSG_RMS = 'rms'
     __LEVEL_MSG_PEAK = 'peak'
     __LEVEL_MSG_DECAY = 'decay'
+    __LEVEL_MSG_TIMESTAMP = 'timestamp'
+    __LEVEL_MSG_RUNNING_TIME = 'running-time'
+    __LEVEL_MSG_DURATION = 'duration'
 
     class MessageTag(object):
         LOW = 'low'
         MID = 'mid'
         HIGH = 'high'
 
+    # Default bands: a low-pass, a band-pass and a high-pass filter.
+    BANDS = [(MessageTag.LOW, 0, 100),
+             (MessageTag.MID, 1000, 4500),
+             (MessageTag.HIGH, 5000, 22050)]
+
     def __init__(self, source, callback, **opts):
         """
         Optional arguments:
 
-            :param source: the PulseAudio device to capture
-            :type source: str
+            :param source: the PulseAudio device to capture, or the source
+            :type source: str | AudioSource
             :param callback: the callback function for spectrum data
             :type callback: callable
             :param error_callback: the error callback function (default: None)
@@ -133,13 +281,24 @@ class LevelAudioAnalyser(BaseAudioAnalyser):
             :type peak_ttl: float
             :param peak_falloff: the peak falloff in dB/s 'LEVEL' (default: 10)
             :type peak_falloff: float
+            :param onsets: detect onsets and beats (default: True)
+            :type onsets: bool
+            :param bands: the (name, lower Hz, upper Hz) bands, a lower
+                          bound of 0 gives a low-pass filter and an upper
+                          bound at the Nyquist frequency a high-pass filter
+                          (default: LevelAudioAnalyser.BANDS)
+            :type bands: list
 
         Tips:
 
         * The `samplerate` parameter decides the upper frequency bound.
 
         * The `callback` parameter should be a function
-          my_callback(data), where `data` is a dict of . # TODO
+          my_callback(data, timing), where `data` is a dict of
+          {band: {'rms': [...], 'peak': [...], 'decay': [...]}} with the
+          levels per channel in dB and `timing` is a FrameTiming. With
+          `onsets`, the data also holds 'beat' (bool), 'onset_strength'
+          (the band flux in dB) and 'bpm' (0 while unknown).
 
         * The `error_callback` parameter should be a function
           my_error_callback(msg), where `msg` is a error message.
@@ -152,38 +311,78 @@ class LevelAudioAnalyser(BaseAudioAnalyser):
         self.__sample_rate = opts.get('samplerate', 44100)
         self.__peak_ttl = opts.get('peak_ttl', 30)
         self.__peak_falloff = opts.get('peak_falloff', 10)
+        self.__onsets = OnsetDetector() if opts.get('onsets', True) else None
+        self.__bands = opts.get('bands', LevelAudioAnalyser.BANDS)
 
-        # Create pipelines.
+        # Create one pipeline, the source is teed into the band branches.
         self.__level_lock = Lock()
-        self.__levels = {}
-        self.__initialized = False
-
-        low_pipeline = self.__create_filter_pipeline(
-            lambda _, m: self.__on_message(self.MessageTag.LOW, _, m))
-        low_pipeline.add_limit_filter(100, 'low-pass')
-        self._register_virtual_pipeline(low_pipeline)
-
-        mid_pipeline = self.__create_filter_pipeline(
-            lambda _, m: self.__on_message(self.MessageTag.MID, _, m))
-        mid_pipeline.add_band_filter(1000, 4500, 'band-pass')
-        self._register_virtual_pipeline(mid_pipeline)
-
-        high_pipeline = self.__create_filter_pipeline(
-            lambda _, m: self.__on_message(self.MessageTag.HIGH, _, m))
-        high_pipeline.add_limit_filter(5000, 'high-pass')
-        self._register_virtual_pipeline(high_pipeline)
-
-    def __create_filter_pipeline(self, handler):
-        return FilterLevelPipeline(self.__source, self.__multichannel,
-                                   self.__sample_rate, self.__interval,
-                                   self.__peak_falloff, self.__peak_ttl,
-                                   handler, self._on_error, self._on_eos)
-
-    def __on_message(self, tag, _, msg):
+        self.__pending = {}
+
+        pipeline = TeeLevelPipeline(self.__source, self.__multichannel,
+                                    self.__sample_rate, self.__interval,
+                                    self.__peak_falloff, self.__peak_ttl,
+                                    self.__on_message, self._on_error,
+                                    self._on_eos)
+        self.__branches = []
+        for name, lower, upper in self.__bands:
+            mode, frequencies = self.__get_filter(lower, upper)
+            branch = pipeline.add_branch(name)
+            if mode == 'band-pass':
+                branch.add_band_filter(lower, upper, mode)
+            else:
+                branch.add_limit_filter(frequencies[0], mode)
+            self.__branches.append(branch)
+        self._register_virtual_pipeline(pipeline)
+
+    def __get_filter(self, lower, upper):
+        # The filter mode and frequencies of a band.
+        if lower <= 0:
+            return 'low-pass', (upper,)
+        if upper >= self.__sample_rate / 2:
+            return 'high-pass', (lower,)
+        return 'band-pass', (lower, upper)
+
+    def reconfigure(self, **opts):
+        """ Apply new options to the running pipeline. The interval, the
+        peak settings and the band frequencies are element properties,
+        other changes, e.g. a band changing from band-pass to high-pass,
+        need a new analyser.
+            :return: False if the options need a new analyser
+            :rtype: bool
+        """
+        bands = opts.get('bands', self.__bands)
+        if opts.get('multichannel', self.__multichannel) != \
+                self.__multichannel or \
+                opts.get('samplerate', self.__sample_rate) != \
+                self.__sample_rate or \
+                [b[0] for b in bands] != [b[0] for b in self.__bands] or \
+                [self.__get_filter(*b[1:])[0] for b in bands] != \
+                [self.__get_filter(*b[1:])[0] for b in self.__bands]:
+            return False
+
+        self.__interval = opts.get('interval', self.__interval)
+        self.__peak_ttl = opts.get('peak_ttl', self.__peak_ttl)
+        self.__peak_falloff = opts.get('peak_falloff', self.__peak_falloff)
+        self.__bands = bands
+        for branch, (_, lower, upper) in zip(self.__branches, bands):
+            branch.set_level(self.__interval, self.__peak_falloff,
+                             self.__peak_ttl)
+            branch.set_frequencies(*self.__get_filter(lower, upper)[1])
+        return True
+
+    def __on_message(self, _, msg):
         msg_st = msg.get_structure()
         if msg_st.get_name() == LevelAudioAnalyser.__LEVEL_MSG_NAME:
+            # The level elements are named after their band.
+            tag = msg.src.get_name()
+            timestamp = msg_st.get_value(
+                LevelAudioAnalyser.__LEVEL_MSG_TIMESTAMP)
+            end_time = msg_st.get_value(
+                LevelAudioAnalyser.__LEVEL_MSG_RUNNING_TIME) + \
+                msg_st.get_value(LevelAudioAnalyser.__LEVEL_MSG_DURATION)
             with self.__level_lock:
-                self.__levels[tag] = {
+                levels = self.__pending.setdefault(timestamp, {})
+                levels[tag] = {
                     'rms': msg_st.get_value(
                         LevelAudioAnalyser.__LEVEL_MSG_RMS),
                     'peak': msg_st.get_value(
@@ -191,24 +390,283 @@ class LevelAudioAnalyser(BaseAudioAnalyser):
                     'decay': msg_st.get_value(
                         LevelAudioAnalyser.__LEVEL_MSG_DECAY)
                 }
-
-            if not self.__initialized:
-                self.__initialized = all([tag in self.__levels
-                                          for tag in [self.MessageTag.LOW,
-                                                      self.MessageTag.MID,
-                                                      self.MessageTag.HIGH]])
-
-            # print("{}: {}".format(tag, msg_st.to_string()))
-            if self.MessageTag.LOW == tag and self.__initialized:
-                self.__callback(
-                    {self.MessageTag.LOW: self.__levels[self.MessageTag.LOW],
-                     self.MessageTag.MID: self.__levels[self.MessageTag.MID],
-                     self.MessageTag.HIGH: self.__levels[self.MessageTag.HIGH]})
+                complete = len(levels) == len(self.__bands)
+                if complete:
+                    # All bands of the same buffers, drop older leftovers.
+                    for t in [t for t in self.__pending if t <= timestamp]:
+                        del self.__pending[t]
+
+            if complete:
+                timestamp = _to_seconds(timestamp)
+                if self.__onsets is not None:
+                    levels.update(self.__onsets.update(
+                        [v for name, _, _ in self.__bands
+                         for v in levels[name]['rms']], timestamp))
+                self.__callback(levels, self._create_timing(
+                    timestamp, _to_seconds(end_time)))
         else:
             print(msg_st.to_string())
 
 
-def print_data(data):
+class FFTAudioAnalyser(BaseAudioAnalyser):
+    """ FFT Audio Analyser class.
+    Pulls raw samples from an appsink and computes the levels of any number
+    of bands in one windowed FFT per update, instead of one filter and level
+    pipeline per band. The callback data and timing have the same form as
+    the level analyser's: {band: {'rms': [...], 'peak': [...],
+    'decay': [...]}}, with the same onset fields. Without sample peaks the
+    peak is the rms, so the cost does not grow with the band count.
+    """
+
+    # Default bands, the same as the level analyser's filters.
+    BANDS = LevelAudioAnalyser.BANDS
+
+    def __init__(self, source, callback, **opts):
+        """
+        Optional arguments:
+
+            :param source: the PulseAudio device to capture, or the source
+            :type source: str | AudioSource
+            :param callback: the callback function for level data
+            :type callback: callable
+            :param error_callback: the error callback function (default: None)
+            :type error_callback: callable
+            :param bands: the (name, lower Hz, upper Hz) bands
+                          (default: FFTAudioAnalyser.BANDS)
+            :type bands: list
+            :param fft_size: the FFT size in samples (default: 2048)
+            :type fft_size: int
+            :param interval: the update interval in ms (default: 100)
+            :type interval: int
+            :param multichannel: use multiple channels (default: False)
+            :type multichannel: bool
+            :param samplerate: the sample rate to use in Hz (default: 44100)
+            :type samplerate: int
+            :param peak_ttl: the peak ttl in ms (default: 30)
+            :type peak_ttl: float
+            :param peak_falloff: the peak falloff in dB/s (default: 10)
+            :type peak_falloff: float
+            :param sample_peaks: report band sample peaks like the level
+                                 analyser, filtering costs an inverse FFT
+                                 per band (default: False)
+            :type sample_peaks: bool
+            :param onsets: detect onsets and beats (default: True)
+            :type onsets: bool
+        """
+        BaseAudioAnalyser.__init__(self, opts.get('error_callback', None))
+        self.__callback = callback
+        self.__onsets = OnsetDetector() if opts.get('onsets', True) else None
+        self.__opts = {
+            'bands': FFTAudioAnalyser.BANDS,
+            'fft_size': 2048,
+            'interval': 100,
+            'multichannel': False,
+            'samplerate': 44100,
+            'peak_ttl': 30,
+            'peak_falloff': 10,
+            'sample_peaks': False
+        }
+        self.__opts.update(opts)
+        self.__channels = 2 if self.__opts['multichannel'] else 1
+        self.__analysis = self.__create_analysis()
+        self.__pending_frames = 0
+
+        self._register_virtual_pipeline(AppSinkPipeline(
+            source, self.__channels, self.__opts['samplerate'],
+            self.__on_samples, self._on_error, self._on_eos))
+
+    def __create_analysis(self):
+        # The bands, filter bank and update interval in frames, replaced
+        # together.
+        opts = self.__opts
+        bands = opts['bands']
+        filter_bank = FilterBank(
+            opts['samplerate'], self.__channels,
+            [(lower, upper) for _, lower, upper in bands], opts['fft_size'],
+            opts['peak_ttl'] / 1000.0, opts['peak_falloff'],
+            opts['sample_peaks'])
+        return bands, filter_bank, \
+            opts['samplerate'] * opts['interval'] // 1000
+
+    def reconfigure(self, **opts):
+        """ Apply new options while running. Unchanged options keep the
+        analysis, changed ones replace it on the streaming thread's next
+        buffer, continuing from the samples and decaying peaks of the
+        previous one. Only a change of the channels or the sample rate
+        needs a new analyser.
+            :return: False if the options need a new analyser
+            :rtype: bool
+        """
+        new_opts = dict(self.__opts, **opts)
+        for key in ('multichannel', 'samplerate'):
+            if new_opts[key] != self.__opts[key]:
+                return False
+        if new_opts == self.__opts:
+            return True
+        self.__opts = new_opts
+        analysis = self.__create_analysis()
+        analysis[1].carry_over(self.__analysis[1])
+        self.__analysis = analysis
+        return True
+
+    def __on_samples(self, data, timestamp):
+        bands, filter_bank, interval_frames = self.__analysis
+        samples = np.frombuffer(data, np.float32).reshape(-1, self.__channels)
+        filter_bank.push(samples)
+        self.__pending_frames += len(samples)
+        if self.__pending_frames < interval_frames:
+            return
+        self.__pending_frames = 0
+
+        rms, peak, decay = filter_bank.analyse(timestamp)
+        data = dict(
+            (name, {'rms': rms[:, i].tolist(), 'peak': peak[:, i].tolist(),
+                    'decay': decay[:, i].tolist()})
+            for i, (name, _, _) in enumerate(bands))
+        if self.__onsets is not None:
+            data.update(self.__onsets.update(rms.ravel(), timestamp))
+
+        # Live sources start their segment at running time zero.
+        self.__callback(data, self._create_timing(timestamp, timestamp))
+
+
+class SpectrumParser(object):
+    """ Spectrum Parser class.
+    Reads the magnitudes of spectrum messages as a (channels, bands) array.
+    The structure values are read directly, the message text is only parsed
+    when the bindings cannot convert the value lists, and then in one pass
+    with NumPy instead of per value.
+    """
+
+    __MAGNITUDE = 'magnitude'
+    __MAGNITUDE_TEXT = 'magnitude=(float)'
+
+    def read_structure(self, structure):
+        """ Read the magnitudes of a spectrum message structure.
+            :param structure: the message structure
+            :type structure: Gst.Structure
+            :return: the (channels, bands) magnitudes in dB
+            :rtype: numpy.ndarray
+        """
+        try:
+            # Gst.ValueList and Gst.ValueArray hold their values in array.
+            value = structure.get_value(SpectrumParser.__MAGNITUDE)
+            values = getattr(value, 'array', value)
+            if len(values) and not isinstance(values[0], float):
+                values = [getattr(v, 'array', v) for v in values]
+            return np.array(values, np.float32, ndmin=2)
+        except (TypeError, ValueError):
+            return self.parse_message(structure.to_string())
+
+    def parse_message(self, msg):
+        """ Parse the magnitudes of a spectrum message string.
+            :param msg: the message structure as string
+            :type msg: str
+            :return: the (channels, bands) magnitudes in dB
+            :rtype: numpy.ndarray
+        """
+        start = msg.index(SpectrumParser.__MAGNITUDE_TEXT) + len(
+            SpectrumParser.__MAGNITUDE_TEXT)
+        body = msg[start:].rstrip(' ;')
+        if body.startswith('< <'):
+            # Multichannel: an array of per channel arrays.
+            channels = body[3:-3].split('>, <')
+        else:
+            channels = [body.strip('{}<> ')]
+        return np.array([np.fromstring(c, np.float32, sep=',')
+                         for c in channels])
+
+    def parse_single_channel_message(self, msg):
+        return self.parse_message(msg)
+
+    def parse_multi_channel_message(self, msg):
+        return self.parse_message(msg)
+
+
+class SpectrumAudioAnalyser(BaseAudioAnalyser):
+    """ Spectrum Audio Analyser class.
+    Delivers the magnitudes of the GStreamer spectrum element to the
+    callback as a (channels, bands) array in dB, with a FrameTiming.
+    """
+
+    __SPECTRUM_MSG_NAME = 'spectrum'
+    __SPECTRUM_MSG_TIMESTAMP = 'timestamp'
+    __SPECTRUM_MSG_RUNNING_TIME = 'running-time'
+    __SPECTRUM_MSG_DURATION = 'duration'
+
+    def __init__(self, source, callback, **opts):
+        """
+        Optional arguments:
+
+            :param source: the PulseAudio device to capture, or the source
+            :type source: str | AudioSource
+            :param callback: the callback function for spectrum data
+            :type callback: callable
+            :param error_callback: the error callback function (default: None)
+            :type error_callback: callable
+            :param bands: the number of spectrum bands (default: 128)
+            :type bands: int
+            :param interval: the update interval in ms (default: 100)
+            :type interval: int
+            :param multichannel: use multiple channels (default: False)
+            :type multichannel: bool
+            :param samplerate: the sample rate to use in Hz (default: 44100)
+            :type samplerate: int
+            :param threshold: the magnitude floor in dB (default: -80)
+            :type threshold: int
+        """
+        BaseAudioAnalyser.__init__(self, opts.get('error_callback', None))
+        self.__callback = callback
+        self.__parser = SpectrumParser()
+        self.__opts = {
+            'bands': 128,
+            'interval': 100,
+            'multichannel': False,
+            'samplerate': 44100,
+            'threshold': -80
+        }
+        self.__opts.update(opts)
+        self.__pipeline = SpectrumPipeline(
+            source, self.__opts['multichannel'], self.__opts['samplerate'],
+            self.__opts['interval'], self.__opts['bands'],
+            self.__opts['threshold'], self.__on_message, self._on_error,
+            self._on_eos)
+        self._register_virtual_pipeline(self.__pipeline)
+
+    def reconfigure(self, **opts):
+        """ Apply a new interval or threshold to the running spectrum
+        element, other changes need a new analyser.
+            :return: False if the options need a new analyser
+            :rtype: bool
+        """
+        for key in ('bands', 'multichannel', 'samplerate'):
+            if opts.get(key, self.__opts[key]) != self.__opts[key]:
+                return False
+        self.__opts.update(opts)
+        self.__pipeline.set_analysis(self.__opts['interval'],
+                                     self.__opts['threshold'])
+        return True
+
+    def __on_message(self, _, msg):
+        msg_st = msg.get_structure()
+        if msg_st.get_name() == SpectrumAudioAnalyser.__SPECTRUM_MSG_NAME:
+            end_time = msg_st.get_value(
+                SpectrumAudioAnalyser.__SPECTRUM_MSG_RUNNING_TIME) + \
+                msg_st.get_value(
+                    SpectrumAudioAnalyser.__SPECTRUM_MSG_DURATION)
+            self.__callback(
+                self.__parser.read_structure(msg_st),
+                self._create_timing(
+                    _to_seconds(msg_st.get_value(
+                        SpectrumAudioAnalyser.__SPECTRUM_MSG_TIMESTAMP)),
+                    _to_seconds(end_time)))
+
+
+def _to_seconds(time):
+    return float(time) / Gst.SECOND
+
+
+def print_data(data, timing=None):
     if len(data) > 3:
         # from sys import stdout
         # stdout.write("\rAmplitude: %d%%  dB" % (data[0][1]))
@@ -222,6 +680,23 @@ class BaseVirtualPipeline(object):
     def __init__(self, on_error, on_eos):
         self.elements = []
         self.handlers = [('message::eos', on_eos), ('message::error', on_error)]
+        self.sync = False
+
+    def _add_source(self, source, sample_rate):
+        """ Create and add the audio source, the sinks sync to the clock
+        for files played in real time.
+            :param source: the PulseAudio source name or the source
+            :type source: str | AudioSource
+            :param sample_rate: the sample rate in Hz
+            :type sample_rate: int
+            :return: the source element
+            :rtype: Gst.Element
+        """
+        source = AudioSource.parse(source)
+        self.sync = source.is_synced()
+        element = source.make_element(sample_rate)
+        self.elements.append(element)
+        return element
 
     def _link_elements(self):
         """ To be implemented by subclass.
@@ -240,17 +715,102 @@ class BaseVirtualPipeline(object):
             return pipeline, self.handlers
 
 
-class FilterLevelPipeline(BaseVirtualPipeline):
-    def __init__(self, source, multichannel, sample_rate, interval,
-                 peak_falloff, peak_ttl, handler, on_error, on_eos):
+def _make_level(interval, peak_falloff, peak_ttl, name=None):
+    level_analyser = Gst.ElementFactory.make('level', name)
+    _set_level(level_analyser, interval, peak_falloff, peak_ttl)
+    return level_analyser
+
+
+def _set_level(level_analyser, interval, peak_falloff, peak_ttl):
+    level_analyser.set_property('interval', interval * Gst.MSECOND)
+    level_analyser.set_property('peak-falloff', peak_falloff)
+    level_analyser.set_property('peak-ttl', peak_ttl * Gst.MSECOND)
+
+
+def _make_limit_filter(cutoff, mode, poles, cheb_type):
+    audio_filter = Gst.ElementFactory.make('audiocheblimit', None)
+    audio_filter.set_property('mode', mode)
+    audio_filter.set_property('cutoff', cutoff)
+    audio_filter.set_property('poles', poles)
+    audio_filter.set_property('type', cheb_type)
+    return audio_filter
+
+
+def _make_band_filter(lower_cutoff, upper_cutoff, mode, poles, cheb_type):
+    audio_filter = Gst.ElementFactory.make('audiochebband', None)
+    audio_filter.set_property('mode', mode)
+    audio_filter.set_property('lower-frequency', lower_cutoff)
+    audio_filter.set_property('upper-frequency', upper_cutoff)
+    audio_filter.set_property('poles', poles)
+    audio_filter.set_property('type', cheb_type)
+    return audio_filter
+
+
+class LevelBranch(object):
+    """ Level Branch class.
+    A chain of filters followed by a named level element and a sink,
+    fed by the tee of a TeeLevelPipeline.
+    """
+
+    def __init__(self, pipeline, name, interval, peak_falloff, peak_ttl):
+        self.__pipeline = pipeline
+        self.filters = []
+        self.level_analyser = _make_level(interval, peak_falloff, peak_ttl,
+                                          name)
+        # Branches share the streaming thread, sinks must not block it.
+        self.sink = Gst.ElementFactory.make('fakesink', None)
+        self.sink.set_property('async', False)
+        self.sink.set_property('sync', pipeline.sync)
+        pipeline.elements += [self.level_analyser, self.sink]
+
+    def __add_filter(self, element):
+        self.filters.append(element)
+        self.__pipeline.elements.append(element)
+
+    def add_limit_filter(self, cutoff, mode='low-pass', poles=4, cheb_type=1):
+        self.__add_filter(_make_limit_filter(cutoff, mode, poles, cheb_type))
+        return self
+
+    def add_band_filter(self, lower_cutoff, upper_cutoff, mode='band-pass',
+                        poles=4, cheb_type=1):
+        self.__add_filter(_make_band_filter(lower_cutoff, upper_cutoff, mode,
+                                            poles, cheb_type))
+        return self
+
+    def set_level(self, interval, peak_falloff, peak_ttl):
+        """ Update the level element, also while playing.
+        """
+        _set_level(self.level_analyser, interval, peak_falloff, peak_ttl)
+
+    def set_frequencies(self, *frequencies):
+        """ Update the filter of the branch, also while playing.
+            :param frequencies: the cutoff of a limit filter, or the lower
+                                and upper frequency of a band filter
+            :type frequencies: float
+        """
+        audio_filter = self.filters[0]
+        if len(frequencies) == 1:
+            audio_filter.set_property('cutoff', frequencies[0])
+        else:
+            audio_filter.set_property('lower-frequency', frequencies[0])
+            audio_filter.set_property('upper-frequency', frequencies[1])
+
+    def link(self, tee):
+        elements = self.filters + [self.level_analyser, self.sink]
+        link_ok = tee.link(elements[0])
+        for i in range(0, len(elements) - 1):
+            link_ok = link_ok and elements[i].link(elements[i + 1])
+        return link_ok
+
+
+class SpectrumPipeline(BaseVirtualPipeline):
+    def __init__(self, source, multichannel, sample_rate, interval, bands,
+                 threshold, handler, on_error, on_eos):
         BaseVirtualPipeline.__init__(self, on_error, on_eos)
-        self.__filters = []
         self.handlers.append(('message::element', handler))
 
         # Audio source.
-        self.__audio_source = Gst.ElementFactory.make('pulsesrc', None)
-        self.__audio_source.set_property('device', source)
-        self.elements.append(self.__audio_source)
+        self.__audio_source = self._add_source(source, sample_rate)
 
         self.__caps = Gst.caps_from_string(
             "audio/x-raw, channels=(int){}, rate=(int){}".format(
@@ -258,61 +818,141 @@ class FilterLevelPipeline(BaseVirtualPipeline):
         self.__caps_filter = Gst.ElementFactory.make('audioconvert', None)
         self.elements.append(self.__caps_filter)
 
-        # Level messages.
-        self.__level_analyser = Gst.ElementFactory.make('level', None)
-        self.__level_analyser.set_property('interval', interval * Gst.MSECOND)
-        self.__level_analyser.set_property('peak-falloff', peak_falloff)
-        self.__level_analyser.set_property('peak-ttl', peak_ttl * Gst.MSECOND)
-        self.elements.append(self.__level_analyser)
+        # Spectrum messages, magnitudes only.
+        self.__spectrum = Gst.ElementFactory.make('spectrum', None)
+        self.__spectrum.set_property('bands', bands)
+        self.set_analysis(interval, threshold)
+        self.__spectrum.set_property('multi-channel', multichannel)
+        self.__spectrum.set_property('post-messages', True)
+        self.__spectrum.set_property('message-phase', False)
+        self.elements.append(self.__spectrum)
 
         # Sink
         self.__sink = Gst.ElementFactory.make('fakesink', None)
+        self.__sink.set_property('sync', self.sync)
         self.elements.append(self.__sink)
 
-    def __add_filter(self, element):
-        self.__filters.append(element)
-        self.elements.append(element)
+    def set_analysis(self, interval, threshold):
+        """ Update the spectrum element, also while playing.
+            :param interval: the update interval in ms
+            :type interval: int
+            :param threshold: the magnitude floor in dB
+            :type threshold: int
+        """
+        self.__spectrum.set_property('threshold', threshold)
+        self.__spectrum.set_property('interval', interval * Gst.MSECOND)
 
     def _link_elements(self):
         link_ok = self.__audio_source.link(self.__caps_filter)
-        if len(self.__filters) == 0:
-            link_ok = link_ok and self.__caps_filter.link_filtered(
-                self.__level_analyser, self.__caps)
-        else:
-            # Link to first filter.
-            link_ok = link_ok and self.__caps_filter.link_filtered(
-                self.__filters[0], self.__caps)
+        link_ok = link_ok and self.__caps_filter.link_filtered(
+            self.__spectrum, self.__caps)
+        link_ok = link_ok and self.__spectrum.link(self.__sink)
+
+        if not link_ok:
+            raise AudioAnalyserError("Error: could not link elements.")
 
-            # Link all filters.
-            for i in range(0, len(self.__filters) - 1):
-                link_ok = link_ok and self.__filters[i].link(
-                    self.__filters[i + 1])
 
-            # Link last filter to level analyser.
-            link_ok = link_ok and self.__filters[-1].link(self.__level_analyser)
+class AppSinkPipeline(BaseVirtualPipeline):
+    """ App Sink Pipeline class.
+    Delivers raw interleaved 32 bit float samples to a handler
+    my_handler(data, timestamp), called from the streaming thread with the
+    buffer bytes and the buffer end time in seconds.
+    """
+
+    def __init__(self, source, channels, sample_rate, handler, on_error,
+                 on_eos):
+        BaseVirtualPipeline.__init__(self, on_error, on_eos)
+        self.__handler = handler
 
-        link_ok = link_ok and self.__level_analyser.link(self.__sink)
+        # Audio source.
+        offline = AudioSource.parse(source).is_offline()
+        self.__audio_source = self._add_source(source, sample_rate)
+
+        self.__caps = Gst.caps_from_string(
+            "audio/x-raw, format=(string)F32LE, layout=(string)interleaved, "
+            "channels=(int){}, rate=(int){}".format(channels, sample_rate))
+        self.__caps_filter = Gst.ElementFactory.make('audioconvert', None)
+        self.elements.append(self.__caps_filter)
+
+        # Samples are pulled as they arrive, nothing is queued. Offline
+        # sources wait for the analysis instead of dropping samples.
+        self.__sink = Gst.ElementFactory.make('appsink', None)
+        self.__sink.set_property('emit-signals', True)
+        self.__sink.set_property('sync', self.sync)
+        self.__sink.set_property('max-buffers', 8)
+        self.__sink.set_property('drop', not offline)
+        self.__sink.connect('new-sample', self.__on_new_sample)
+        self.elements.append(self.__sink)
+
+    def __on_new_sample(self, sink):
+        sample = sink.emit('pull-sample')
+        if sample is not None:
+            buf = sample.get_buffer()
+            end_time = buf.pts + (buf.duration if buf.duration !=
+                                  Gst.CLOCK_TIME_NONE else 0)
+            self.__handler(buf.extract_dup(0, buf.get_size()),
+                           float(end_time) / Gst.SECOND)
+        return Gst.FlowReturn.OK
+
+    def _link_elements(self):
+        link_ok = self.__audio_source.link(self.__caps_filter)
+        link_ok = link_ok and self.__caps_filter.link_filtered(
+            self.__sink, self.__caps)
 
         if not link_ok:
-            print("Error: could not link elements.")  # TODO
+            raise AudioAnalyserError("Error: could not link elements.")
 
-    def add_limit_filter(self, cutoff, mode='low-pass', poles=4, cheb_type=1):
-        audio_filter = Gst.ElementFactory.make('audiocheblimit', None)
-        audio_filter.set_property('mode', mode)
-        audio_filter.set_property('cutoff', cutoff)
-        audio_filter.set_property('poles', poles)
-        audio_filter.set_property('type', cheb_type)
-        self.__add_filter(audio_filter)
 
-    def add_band_filter(self, lower_cutoff, upper_cutoff, mode='band-pass',
-                        poles=4, cheb_type=1):
-        audio_filter = Gst.ElementFactory.make('audiochebband', None)
-        audio_filter.set_property('mode', mode)
-        audio_filter.set_property('lower-frequency', lower_cutoff)
-        audio_filter.set_property('upper-frequency', upper_cutoff)
-        audio_filter.set_property('poles', poles)
-        audio_filter.set_property('type', cheb_type)
-        self.__add_filter(audio_filter)
+class TeeLevelPipeline(BaseVirtualPipeline):
+    """ Tee Level Pipeline class.
+    A single audio source and conversion teed into filter and level
+    branches, so all bands analyse the same buffers from one audio
+    stream. The level elements are named after their branch, a single
+    message handler tells them apart by the message source.
+    """
+
+    def __init__(self, source, multichannel, sample_rate, interval,
+                 peak_falloff, peak_ttl, handler, on_error, on_eos):
+        BaseVirtualPipeline.__init__(self, on_error, on_eos)
+        self.__interval = interval
+        self.__peak_falloff = peak_falloff
+        self.__peak_ttl = peak_ttl
+        self.__branches = []
+        self.handlers.append(('message::element', handler))
+
+        # Audio source.
+        self.__audio_source = self._add_source(source, sample_rate)
+
+        self.__caps = Gst.caps_from_string(
+            "audio/x-raw, channels=(int){}, rate=(int){}".format(
+                2 if multichannel else 1, sample_rate))
+        self.__caps_filter = Gst.ElementFactory.make('audioconvert', None)
+        self.elements.append(self.__caps_filter)
+
+        self.__tee = Gst.ElementFactory.make('tee', None)
+        self.elements.append(self.__tee)
+
+    def add_branch(self, name):
+        """ Add a level branch.
+            :param name: the branch name, used as level element name
+            :type name: str
+            :return: the branch, to add filters to
+            :rtype: LevelBranch
+        """
+        branch = LevelBranch(self, name, self.__interval,
+                             self.__peak_falloff, self.__peak_ttl)
+        self.__branches.append(branch)
+        return branch
+
+    def _link_elements(self):
+        link_ok = self.__audio_source.link(self.__caps_filter)
+        link_ok = link_ok and self.__caps_filter.link_filtered(
+            self.__tee, self.__caps)
+        for branch in self.__branches:
+            link_ok = link_ok and branch.link(self.__tee)
+
+        if not link_ok:
+            raise AudioAnalyserError("Error: could not link elements.")
 
 
 if __name__ == '__main__':
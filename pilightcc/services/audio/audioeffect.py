@@ -1,159 +1,162 @@
 """ Audio Effect module. """
 
 from pilightcc.services.audio.audioanalyzer import LevelAudioAnalyser
-from pilightcc.settings.settings import Setting, LedCorner, LedDir
+from pilightcc.services.audio.audioanalyzer import FFTAudioAnalyser
+from pilightcc.services.audio.audioanalyzer import SpectrumAudioAnalyser
+from pilightcc.services.audio.audioanalyzer import AudioSource
+from pilightcc.services.audio.filterbank import get_log_frequency_matrix
+from pilightcc.services.audio.effectgraph import EffectGraph, EffectContext
+from pilightcc.services.audio.effectgraph import BandSelect, SpectrumSelect
+from pilightcc.services.audio.effectgraph import Normalize, Decay, Quantize
+from pilightcc.services.audio.effectgraph import SegmentFill, ColorMap
+from pilightcc.services.audio.effectgraph import Mirror, Layout
+from pilightcc.led.layout import LedLayout
+from pilightcc.settings.settings import Setting
+from pilightcc.settings.settings import AudioAnalyser
 
 
 class BaseAudioEffect(object):
     _STD_MULTI_CH = True
-    _STD_INTERVAL = 20
-
-    _PULSE_AUDIO_DEVICE = "alsa_output.usb-Propellerhead_Balance_0001002008080-00.analog-stereo.monitor"  # TODO Remove
+    _SAMPLE_RATE = 44100
 
     def __init__(self, settings):
         self._settings = settings
 
-    def _join_channel_effects(self, left_ch, right_ch):
-        # Pre calculate some led counts.
-        channel_count_top = self._settings[Setting.LED_COUNT_TOP] // 2
-        channel_count_bottom = self._settings[Setting.LED_COUNT_BOTTOM] // 2
-
-        # Piece together the channels. (Adding the right channel in reverse.)
-        joined = []
-        joined += left_ch
-        joined += [[0, 0, 0]] if \
-            channel_count_top * 2 < \
-            self._settings[Setting.LED_COUNT_TOP] else []
-        joined += right_ch[::-1]
-        joined += [[0, 0, 0]] if \
-            channel_count_bottom * 2 < \
-            self._settings[Setting.LED_COUNT_BOTTOM] else []
-
-        # Calculate the starting index.
-        channels_offset = [channel_count_bottom,
-                           self._settings[Setting.LED_COUNT_SIDE],
-                           self._settings[Setting.LED_COUNT_TOP],
-                           self._settings[Setting.LED_COUNT_SIDE]]
-
-        corner_indices = {LedCorner.SW: 1, LedCorner.NW: 2,
-                          LedCorner.NE: 3, LedCorner.SE: 4}
-
-        # Set the effective corner index and channel order.
-        corner_index = corner_indices.get(
-            self._settings[Setting.LED_START_CORNER])
-        if self._settings[Setting.LED_DIRECTION] == LedDir.CCW:
-            corner_index = 1 - corner_index
-            joined.reverse()
-
-        start = sum(channels_offset[:corner_index])
-
-        # Reorder the joined data.
-        reordered = joined[start:] + joined[:start]
-
-        return self._flatten_color_list(reordered)
-
-    @staticmethod
-    def _create_basic_color_effect(norm_data, color):
-        return [[int(round(c * v)) for c in color] for v in norm_data]
-
-    @staticmethod
-    def _apply_linear_decay_effect(norm_data, prev_data, decay_amount):
-        return [x if x >= y else y - decay_amount for (x, y) in
-                zip(norm_data, prev_data)]
-
-    @staticmethod
-    def _normalize_data(data, min_value, max_value):
-        diff = max_value - min_value
-        return [(max(min_value, min(max_value, v)) - min_value) / diff for v in
-                data]
-
-    @staticmethod
-    def _flatten_color_list(effect_data):
-        return [c for color in effect_data for c in color]
+        # Effect channels run from the bottom centre up.
+        self._layout = LedLayout.from_settings(settings)
+        self._channel_width = self._layout.channel_width
+
+    def _get_effect_context(self):
+        """
+            :return: the context to compile effect graphs for
+            :rtype: EffectContext
+        """
+        return EffectContext(self._layout,
+                             self._settings[Setting.AUDIO_FRAME_RATE],
+                             2 if self._STD_MULTI_CH else 1)
+
+    def _get_source(self, source=None):
+        """
+            :param source: the source to use instead of the setting
+                           (default: None)
+            :type source: AudioSource
+            :return: the audio source
+            :rtype: AudioSource
+        """
+        if source is not None:
+            return source
+        return AudioSource.parse(self._settings[Setting.AUDIO_SOURCE])
 
     def reset(self):
         """ To be implemented by subclass.
         """
         pass
 
-    def get_new_analyser(self, callback):
+    def _get_analyser_class(self):
         """ To be implemented by subclass.
+            :return: the analyser class of the effect
+            :rtype: type
         """
         raise NotImplementedError("Please implement this method")
 
+    def _get_analyser_options(self):
+        """ To be implemented by subclass.
+            :return: the analyser options of the effect
+            :rtype: dict
+        """
+        raise NotImplementedError("Please implement this method")
+
+    def get_new_analyser(self, callback, source=None):
+        """
+            :param callback: the analyser callback
+            :type callback: callable
+            :param source: the source to use instead of the setting, e.g.
+                           a file for replay (default: None)
+            :type source: AudioSource
+            :return: the analyser, not started
+            :rtype: BaseAudioAnalyser
+        """
+        return self._get_analyser_class()(self._get_source(source), callback,
+                                          **self._get_analyser_options())
+
+    def reconfigure_analyser(self, analyser):
+        """ Apply the analyser options of this effect to the running
+        analyser of a previous effect, in place.
+            :param analyser: the analyser
+            :type analyser: BaseAudioAnalyser
+            :return: False if the effect needs a new analyser
+            :rtype: bool
+        """
+        return type(analyser) is self._get_analyser_class() and \
+            analyser.reconfigure(**self._get_analyser_options())
+
     def get_effect(self, data):
         """ To be implemented by subclass.
         Calculate the LED effects from the spectrum data.
             :param data: the analyser data
             :type data: list | dict
-            :return: the LED data as a list of repeated (r,g,b) values
-            :rtype: list
+            :return: the LED frame, reused between calls
+            :rtype: LedFrame
+        """
+        raise NotImplementedError("Please implement this method")
+
+    def get_effect_key(self, data):
+        """ May be implemented by subclass.
+        Quantize the effect inputs, effects whose frame is a pure function
+        of a few levels return a key that identifies the frame.
+            :param data: the analyser data
+            :type data: list | dict
+            :return: the key, None if the frame can't be cached
+            :rtype: tuple
+        """
+        return None
+
+    def get_keyed_effect(self, key):
+        """ To be implemented by subclass, if keys are returned.
+        Calculate the LED effects from a key.
+            :param key: the key from get_effect_key
+            :type key: tuple
+            :return: the LED frame, reused between calls
+            :rtype: LedFrame
         """
         raise NotImplementedError("Please implement this method")
 
 
-# class SpectrumEffect(BaseAudioEffect):
-#     _EFFECT_MIN_AMP = -30
-#     _EFFECT_MAX_AMP = 0
-#     _EFFECT_DECAY = 0.3
-#
-#     def __init__(self, settings):
-#         super(SpectrumEffect, self).__init__(settings)
-#         self.__prev_left_ch = None
-#         self.__prev_right_ch = None
-#
-#     def reset(self):
-#         self.__prev_left_ch = None
-#         self.__prev_right_ch = None
-#
-#     def get_new_analyser(self, callback):
-#         return AudioAnalyser(self._PULSE_AUDIO_DEVICE, callback,
-#                              mode=AudioAnalyser.Mode.SPECTRUM,
-#                              interval=self._STD_INTERVAL,
-#                              multichannel=self._STD_MULTI_CH,
-#                              threshold=self._EFFECT_MIN_AMP,
-#                              cutoff=self._EFFECT_MAX_AMP)
-#
-#     def get_effect(self, data):
-#         leds_per_channel = (self._settings[Setting.LED_COUNT_TOP] // 2 +
-#                             self._settings[Setting.LED_COUNT_BOTTOM] // 2 +
-#                             self._settings[Setting.LED_COUNT_SIDE])
-#
-#         # Divide into two channels and create effects.
-#         left_ch = self._normalize_data(
-#             data[0][:leds_per_channel], self._EFFECT_MIN_AMP,
-#             self._EFFECT_MAX_AMP)
-#
-#         if self.__prev_left_ch is not None:
-#             left_ch = self._apply_linear_decay_effect(
-#                 left_ch, self.__prev_left_ch,
-#                 self._EFFECT_DECAY / self._settings[
-#                     Setting.AUDIO_FRAME_RATE])
-#         self.__prev_left_ch = left_ch
-#
-#         left_ch_eff = self._create_basic_color_effect(
-#             left_ch, [0, 0, 255])
-#
-#         # Second channel if needed.
-#         if len(data) > 1:
-#             right_ch = self._normalize_data(
-#                 data[1][:leds_per_channel], self._EFFECT_MIN_AMP,
-#                 self._EFFECT_MAX_AMP)
-#
-#             if self.__prev_right_ch is not None:
-#                 right_ch = self._apply_linear_decay_effect(
-#                     right_ch, self.__prev_right_ch,
-#                     self._EFFECT_DECAY / self._settings[
-#                         Setting.AUDIO_FRAME_RATE])
-#             self.__prev_right_ch = right_ch
-#
-#             right_ch_eff = self._create_basic_color_effect(
-#                 right_ch, [0, 0, 255])
-#         else:
-#             right_ch_eff = left_ch_eff
-#
-#         # Join channels correctly.
-#         return self._join_channel_effects(left_ch_eff, right_ch_eff)
+class SpectrumEffect(BaseAudioEffect):
+    _EFFECT_MIN_AMP = -30
+    _EFFECT_MAX_AMP = 0
+    _EFFECT_DECAY = 0.3
+    _SPECTRUM_BANDS = 128
+
+    def __init__(self, settings):
+        super(SpectrumEffect, self).__init__(settings)
+
+        # Log spaced spectrum bins per LED, from the bottom centre up.
+        self.__effect = EffectGraph([
+            SpectrumSelect(get_log_frequency_matrix(
+                self._SAMPLE_RATE, self._SPECTRUM_BANDS,
+                self._channel_width)),
+            Normalize(self._EFFECT_MIN_AMP, self._EFFECT_MAX_AMP),
+            Decay(self._EFFECT_DECAY),
+            ColorMap([0, 0, 255]),
+            Mirror(),
+            Layout()]).compile(self._get_effect_context())
+
+    def reset(self):
+        self.__effect.reset()
+
+    def _get_analyser_class(self):
+        return SpectrumAudioAnalyser
+
+    def _get_analyser_options(self):
+        return {'bands': self._SPECTRUM_BANDS,
+                'interval': self._settings[Setting.AUDIO_INTERVAL],
+                'multichannel': self._STD_MULTI_CH,
+                'samplerate': self._SAMPLE_RATE,
+                'threshold': self._EFFECT_MIN_AMP}
+
+    def get_effect(self, data):
+        return self.__effect.evaluate(data)
 
 
 class LevelEffect(BaseAudioEffect):
@@ -161,90 +164,52 @@ class LevelEffect(BaseAudioEffect):
     _EFFECT_MAX_AMP = 0
     _EFFECT_FALLOFF = 40
     _EFFECT_DECAY_DELAY = 20
+    _EFFECT_MIN_LEVEL = 0.15
 
-    def get_new_analyser(self, callback):
-        return LevelAudioAnalyser(self._PULSE_AUDIO_DEVICE, callback,
-                                  interval=self._STD_INTERVAL,
-                                  multichannel=self._STD_MULTI_CH,
-                                  peak_ttl=self._EFFECT_DECAY_DELAY,
-                                  peak_falloff=self._EFFECT_FALLOFF)
+    def __init__(self, settings):
+        super(LevelEffect, self).__init__(settings)
+
+        # A comb of the low, mid and high levels per channel: the bottom
+        # and the lower side, the rest of the side and the top. Levels
+        # below the minimum all give the same frame, levels are only
+        # quantized for the frame cache.
+        tags = LevelAudioAnalyser.MessageTag
+        stages = [BandSelect([tags.LOW, tags.MID, tags.HIGH], 'decay'),
+                  Normalize(self._EFFECT_MIN_AMP, self._EFFECT_MAX_AMP,
+                            self._EFFECT_MIN_LEVEL)]
+        stages += [Quantize(settings[Setting.AUDIO_CACHE_LEVELS])] \
+            if settings[Setting.AUDIO_CACHE_SIZE] > 0 else []
+        self.__effect = EffectGraph(stages + [
+            SegmentFill([[(LedLayout.BOTTOM, 1.0), (LedLayout.LEFT, 0.3)],
+                         [(LedLayout.LEFT, 0.7)]]),
+            ColorMap([0, 0, 255]),
+            Mirror(),
+            Layout()]).compile(self._get_effect_context())
+
+    def _get_analyser_class(self):
+        if self._settings[Setting.AUDIO_ANALYSER] == AudioAnalyser.FFT:
+            return FFTAudioAnalyser
+        return LevelAudioAnalyser
+
+    def _get_analyser_options(self):
+        settings = self._settings
+        tags = LevelAudioAnalyser.MessageTag
+        return {'bands': [(tags.LOW, 0, settings[Setting.AUDIO_LOW_CUTOFF]),
+                          (tags.MID, settings[Setting.AUDIO_MID_LOWER],
+                           settings[Setting.AUDIO_MID_UPPER]),
+                          (tags.HIGH, settings[Setting.AUDIO_HIGH_CUTOFF],
+                           self._SAMPLE_RATE // 2)],
+                'interval': settings[Setting.AUDIO_INTERVAL],
+                'multichannel': self._STD_MULTI_CH,
+                'samplerate': self._SAMPLE_RATE,
+                'peak_ttl': self._EFFECT_DECAY_DELAY,
+                'peak_falloff': self._EFFECT_FALLOFF}
 
     def get_effect(self, data):
-        leds_per_channel = (self._settings[Setting.LED_COUNT_TOP] // 2 +
-                            self._settings[Setting.LED_COUNT_BOTTOM] // 2 +
-                            self._settings[Setting.LED_COUNT_SIDE])
-
-        # Divide into two channels and create effects.
-        # rms = self._normalize_data(data['rms'], self._EFFECT_MIN_AMP,
-        #                            self._EFFECT_MAX_AMP)
-        # peak = self._normalize_data(data['peak'], self._EFFECT_MIN_AMP,
-        #                             self._EFFECT_MAX_AMP)
-        decay_low = self._normalize_data(data['low']['decay'],
-                                         self._EFFECT_MIN_AMP,
-                                         self._EFFECT_MAX_AMP)
-        decay_mid = self._normalize_data(data['mid']['decay'],
-                                         self._EFFECT_MIN_AMP,
-                                         self._EFFECT_MAX_AMP)
-        decay_high = self._normalize_data(data['high']['decay'],
-                                          self._EFFECT_MIN_AMP,
-                                          self._EFFECT_MAX_AMP)
-
-        # left_ch_eff = self._create_pulse_level_color_effect(
-        #     decay[0], 0.15, leds_per_channel, [0, 255, 0])
-        # left_ch_eff = self._create_slider_level_color_effect(
-        #     decay_low[0], leds_per_channel, [0, 255, 0])
-
-        left_ch_eff = self._create_comb_level_color_effect(
-            decay_low[0], decay_mid[0], decay_high[0], 0.15, leds_per_channel,
-            [0, 0, 255])
-        right_ch_eff = self._create_comb_level_color_effect(
-            decay_low[1], decay_mid[0], decay_high[1], 0.15, leds_per_channel,
-            [0, 0, 255])
-
-        # # Second channel if needed.
-        # if len(decay_low) > 1 and len(decay_high) > 1:
-        #     # right_ch_eff = self._create_pulse_level_color_effect(
-        #     #     decay[1], 0.15, leds_per_channel, [0, 255, 0])
-        #     right_ch_eff = self._create_slider_level_color_effect(
-        #         decay_low[0], leds_per_channel, [0, 255, 0])
-        # else:
-        #     right_ch_eff = left_ch_eff
-
-        # Join channels correctly.
-        return self._join_channel_effects(left_ch_eff, right_ch_eff)
-
-    def _create_comb_level_color_effect(self, low_norm_level, mid_norm_level,
-                                        high_norm_level, min_norm_level,
-                                        channel_width, color):
-        low_led_count = self._settings[Setting.LED_COUNT_BOTTOM] // 2 + \
-                        int(round(self._settings[Setting.LED_COUNT_SIDE] * 0.3))
-        mid_led_count = int(round(self._settings[Setting.LED_COUNT_SIDE] * 0.7))
-        return \
-            LevelEffect._create_pulse_level_color_effect(
-                low_norm_level, min_norm_level, low_led_count, color) + \
-            LevelEffect._create_pulse_level_color_effect(
-                mid_norm_level, min_norm_level, mid_led_count, color) + \
-            LevelEffect._create_pulse_level_color_effect(
-               high_norm_level, min_norm_level,
-               channel_width - low_led_count - mid_led_count, color)
-
-    @staticmethod
-    def _create_slider_level_color_effect(norm_level, channel_width, color):
-        level = norm_level * channel_width
-        return [color if i < level else [0, 0, 0] for i in range(channel_width)]
-
-    @staticmethod
-    def _create_scaled_slider_level_color_effect(norm_level, channel_width,
-                                                 low_color, mid_color,
-                                                 high_color):
-        level = norm_level * channel_width
-        return [(low_color if i < channel_width * 0.66 else
-                 (mid_color if i < channel_width * 0.90 else high_color))
-                if i < level else [0, 0, 0]
-                for i in range(channel_width)]
-
-    @staticmethod
-    def _create_pulse_level_color_effect(norm_level, min_norm_level,
-                                         channel_width, color):
-        return [[int(round(c * max(norm_level, min_norm_level))) for c in color]
-                for _ in range(channel_width)]
+        return self.__effect.evaluate(data)
+
+    def get_effect_key(self, data):
+        return self.__effect.get_key(data)
+
+    def get_keyed_effect(self, key):
+        return self.__effect.evaluate_key(key)
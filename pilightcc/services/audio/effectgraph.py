@@ -0,0 +1,505 @@
+""" Audio effect graph module.
+
+An effect is declared as a chain of stages, e.g.
+
+    EffectGraph([BandSelect(['low', 'mid', 'high']),
+                 Normalize(-30, 0),
+                 SegmentFill([[(LedLayout.BOTTOM, 1.0), (LedLayout.LEFT, 0.3)],
+                              [(LedLayout.LEFT, 0.7)]]),
+                 ColorMap([0, 0, 255]),
+                 Mirror(),
+                 Layout()])
+
+and compiled once per setting change into a flat list of operations on
+preallocated arrays. Evaluating a compiled effect reads no settings,
+allocates no frames and has no per LED Python loops.
+"""
+
+# Vectorized operations
+import numpy as np
+
+# Application
+from pilightcc.led.frame import LedFrame, normalize
+from pilightcc.util.error import BaseError
+
+
+class EffectContext(object):
+    """ Effect Context class.
+    The settings an effect graph is compiled for.
+    """
+
+    def __init__(self, layout, frame_rate, channels=2):
+        """
+            :param layout: the LED layout
+            :type layout: LedLayout
+            :param frame_rate: the output frame rate in Hz
+            :type frame_rate: float
+            :param channels: the number of audio channels (default: 2)
+            :type channels: int
+        """
+        self.layout = layout
+        self.frame_rate = frame_rate
+        self.channels = channels
+
+
+class EffectGraphError(BaseError):
+    """ Error raised for effect graphs that can't be compiled.
+    """
+
+    def __init__(self, msg):
+        """
+            :param msg: the error message
+            :type msg: str
+        """
+        self.msg = msg
+
+
+class _Operation(object):
+    """ A compiled stage, applied to the output of the previous one.
+    """
+
+    def apply(self, value):
+        raise NotImplementedError("Please implement this method")
+
+    def reset(self):
+        pass
+
+
+class EffectStage(object):
+    """ Effect Stage class.
+    A declared step of an effect.
+    """
+
+    def compile(self, context, shape):
+        """ To be implemented by subclass.
+        Compile the stage for the settings and the input of the stage.
+            :param context: the compile context
+            :type context: EffectContext
+            :param shape: the input array shape, None for analyser data
+            :type shape: tuple
+            :return: the operation and the output array shape
+            :rtype: tuple
+        """
+        raise NotImplementedError("Please implement this method")
+
+
+class BandSelect(EffectStage):
+    """ Band Select stage.
+    Reads a field of level analyser data, {band: {field: [per channel]}},
+    into (channels, bands) levels.
+    """
+
+    def __init__(self, bands, field='decay'):
+        """
+            :param bands: the band names, in output order
+            :type bands: list
+            :param field: the level field, 'rms', 'peak' or 'decay'
+                          (default: 'decay')
+            :type field: str
+        """
+        self.bands = bands
+        self.field = field
+
+    def compile(self, context, shape):
+        if shape is not None:
+            raise EffectGraphError("Band select must be the first stage.")
+        return _BandSelect(self.bands, self.field, context.channels), \
+            (context.channels, len(self.bands))
+
+
+class _BandSelect(_Operation):
+    def __init__(self, bands, field, channels):
+        self.__columns = [(i, band) for i, band in enumerate(bands)]
+        self.__field = field
+        self.__out = np.empty((channels, len(bands)), np.float32)
+
+    def apply(self, data):
+        out, field = self.__out, self.__field
+        for i, band in self.__columns:
+            out[:, i] = data[band][field]
+        return out
+
+
+class SpectrumSelect(EffectStage):
+    """ Spectrum Select stage.
+    Maps spectrum analyser data, (channels, bins) magnitudes, to
+    (channels, bands) levels through a (bins, bands) matrix.
+    """
+
+    def __init__(self, matrix):
+        """
+            :param matrix: the (bins, bands) matrix, e.g. from
+                           get_log_frequency_matrix
+            :type matrix: numpy.ndarray
+        """
+        self.matrix = matrix
+
+    def compile(self, context, shape):
+        if shape is not None:
+            raise EffectGraphError("Spectrum select must be the first stage.")
+        return _SpectrumSelect(self.matrix, context.channels), \
+            (context.channels, self.matrix.shape[1])
+
+
+class _SpectrumSelect(_Operation):
+    def __init__(self, matrix, channels):
+        self.__matrix = np.ascontiguousarray(matrix, np.float32)
+        self.__out = np.empty((channels, matrix.shape[1]), np.float32)
+
+    def apply(self, data):
+        return np.dot(data, self.__matrix, out=self.__out)
+
+
+class Normalize(EffectStage):
+    """ Normalize stage.
+    Scales levels in dB to 0-1, with an optional floor.
+    """
+
+    def __init__(self, min_value, max_value, floor=0.0):
+        """
+            :param min_value: the level mapped to 0
+            :type min_value: float
+            :param max_value: the level mapped to 1
+            :type max_value: float
+            :param floor: the lowest normalized level (default: 0.0)
+            :type floor: float
+        """
+        self.min_value = min_value
+        self.max_value = max_value
+        self.floor = floor
+
+    def compile(self, context, shape):
+        _check_levels(self, shape)
+        return _Normalize(self.min_value, self.max_value, self.floor), shape
+
+
+class _Normalize(_Operation):
+    def __init__(self, min_value, max_value, floor):
+        self.__min_value = min_value
+        self.__max_value = max_value
+        self.__floor = floor
+
+    def apply(self, levels):
+        normalize(levels, self.__min_value, self.__max_value, out=levels)
+        if self.__floor:
+            np.maximum(levels, self.__floor, out=levels)
+        return levels
+
+
+class Decay(EffectStage):
+    """ Decay stage.
+    Keeps rising levels, falling levels fall linearly from the previous
+    frame but never below the new level.
+    """
+
+    def __init__(self, falloff):
+        """
+            :param falloff: the fall in normalized levels per second
+            :type falloff: float
+        """
+        self.falloff = falloff
+
+    def compile(self, context, shape):
+        _check_levels(self, shape)
+        return _Decay(float(self.falloff) / context.frame_rate, shape), shape
+
+
+class _Decay(_Operation):
+    def __init__(self, amount, shape):
+        self.__amount = amount
+        self.__previous = np.empty(shape, np.float32)
+        self.__first = True
+
+    def apply(self, levels):
+        previous = self.__previous
+        if self.__first:
+            self.__first = False
+            np.copyto(previous, levels)
+        else:
+            previous -= self.__amount
+            np.maximum(previous, levels, out=previous)
+        return previous
+
+    def reset(self):
+        self.__first = True
+
+
+class Quantize(EffectStage):
+    """ Quantize stage.
+    Rounds levels to a number of steps. Everything after this stage only
+    depends on the quantized levels, so frames can be cached by the key
+    of the compiled effect.
+    """
+
+    def __init__(self, steps):
+        """
+            :param steps: the number of steps from 0 to 1
+            :type steps: int
+        """
+        self.steps = steps
+
+    def compile(self, context, shape):
+        _check_levels(self, shape)
+        return _Quantize(float(max(self.steps, 1)), shape), shape
+
+
+class _Quantize(_Operation):
+    def __init__(self, steps, shape):
+        self.__steps = steps
+        self.__values = np.empty(shape, np.float32)
+        self.__key = np.empty(shape, np.intp)
+        self.__levels = np.empty(shape, np.float32)
+        self.__flat_levels = self.__levels.reshape(-1)
+
+    def apply(self, levels):
+        """
+            :return: the key, the quantized levels
+            :rtype: tuple
+        """
+        values = self.__values
+        np.multiply(levels, self.__steps, out=values)
+        values += 0.5
+        np.copyto(self.__key, values, casting='unsafe')
+        return tuple(self.__key.ravel().tolist())
+
+    def restore(self, key):
+        """
+            :param key: the key from apply
+            :type key: tuple
+            :return: the quantized levels
+            :rtype: numpy.ndarray
+        """
+        self.__flat_levels[:] = key
+        self.__levels /= self.__steps
+        return self.__levels
+
+
+class SegmentFill(EffectStage):
+    """ Segment Fill stage.
+    Spreads (channels, bands) levels along the channels, from the bottom
+    centre up, every band over its own segment. Segment lengths are sums of
+    (section, fraction) parts, each rounded to whole LEDs: LedLayout.BOTTOM
+    for the bottom half, LedLayout.LEFT or LedLayout.RIGHT for the side and
+    LedLayout.TOP for the top half. The last band fills the rest.
+    """
+
+    def __init__(self, lengths):
+        """
+            :param lengths: the segment lengths as lists of (section,
+                            fraction) parts, one less than the number of
+                            bands
+            :type lengths: list
+        """
+        self.lengths = lengths
+
+    def compile(self, context, shape):
+        _check_levels(self, shape)
+        if shape[1] != len(self.lengths) + 1:
+            raise EffectGraphError(
+                "Segment fill of {} bands needs {} segment lengths.".format(
+                    shape[1], shape[1] - 1))
+        layout = context.layout
+        ends = np.cumsum([sum(layout.get_section_length(section, fraction)
+                              for section, fraction in parts)
+                          for parts in self.lengths])
+        index = np.searchsorted(ends, np.arange(layout.channel_width),
+                                side='right')
+        return _SegmentFill(index, shape[0]), \
+            (shape[0], layout.channel_width)
+
+
+class _SegmentFill(_Operation):
+    def __init__(self, index, channels):
+        self.__index = index.astype(np.intp)
+        self.__out = np.empty((channels, len(index)), np.float32)
+
+    def apply(self, levels):
+        return np.take(levels, self.__index, axis=1, out=self.__out)
+
+
+class ColorMap(EffectStage):
+    """ Color Map stage.
+    Scales a color by (channels, width) levels, rounded half up, into
+    (channels, width, 3) colors.
+    """
+
+    def __init__(self, color):
+        """
+            :param color: the (r,g,b) color at full level
+            :type color: list
+        """
+        self.color = color
+
+    def compile(self, context, shape):
+        _check_levels(self, shape)
+        return _ColorMap(self.color, shape), shape + (3,)
+
+
+class _ColorMap(_Operation):
+    def __init__(self, color, shape):
+        self.__color = np.asarray(color, np.float32)
+        self.__values = np.empty(shape + (3,), np.float32)
+        self.__out = np.empty(shape + (3,), np.uint8)
+
+    def apply(self, levels):
+        values = self.__values
+        np.multiply(levels[..., None], self.__color, out=values)
+        values += 0.5
+        np.copyto(self.__out, values, casting='unsafe')
+        return self.__out
+
+
+class Mirror(EffectStage):
+    """ Mirror stage.
+    Places the first channel along the left side and the last along the
+    right side, a single channel goes to both. The output holds both
+    channels and an unlit entry, for the Layout stage.
+    """
+
+    def compile(self, context, shape):
+        if shape is None or len(shape) != 3:
+            raise EffectGraphError("Mirror needs (channels, width, 3) "
+                                   "colors.")
+        return _Mirror(shape[1]), (2 * shape[1] + 1, 3)
+
+
+class _Mirror(_Operation):
+    def __init__(self, width):
+        self.__width = width
+        self.__out = np.zeros((2 * width + 1, 3), np.uint8)
+
+    def apply(self, colors):
+        out, width = self.__out, self.__width
+        out[:width] = colors[0]
+        out[width:2 * width] = colors[-1]
+        return out
+
+
+class Layout(EffectStage):
+    """ Layout stage.
+    Orders mirrored channels along the physical LED strip, into a frame.
+    """
+
+    def compile(self, context, shape):
+        layout = context.layout
+        if shape != (2 * layout.channel_width + 1, 3):
+            raise EffectGraphError("Layout needs mirrored channels.")
+        return _Layout(layout), None
+
+
+class _Layout(_Operation):
+    def __init__(self, layout):
+        self.__index = layout.channel_index
+        self.__frame = LedFrame(layout.count)
+
+    def apply(self, joined):
+        np.take(joined, self.__index, axis=0, out=self.__frame.colors)
+        return self.__frame
+
+
+def _check_levels(stage, shape):
+    if shape is None or len(shape) != 2:
+        raise EffectGraphError("{} needs (channels, bands) levels.".format(
+            type(stage).__name__))
+
+
+class EffectGraph(object):
+    """ Effect Graph class.
+    A declared effect, a chain of stages ending with the Layout stage.
+    """
+
+    def __init__(self, stages):
+        """
+            :param stages: the stages, in order
+            :type stages: list
+        """
+        self.stages = stages
+
+    def compile(self, context):
+        """ Compile the effect for the settings.
+            :param context: the compile context
+            :type context: EffectContext
+            :return: the compiled effect
+            :rtype: CompiledEffect
+        """
+        operations = []
+        shape = None
+        for stage in self.stages:
+            operation, shape = stage.compile(context, shape)
+            operations.append(operation)
+        if not operations or not isinstance(operations[-1], _Layout):
+            raise EffectGraphError("The last stage must be the layout.")
+        return CompiledEffect(operations)
+
+
+class CompiledEffect(object):
+    """ Compiled Effect class.
+    The operations of an effect graph, split at the Quantize stage if
+    there is one.
+    """
+
+    def __init__(self, operations):
+        """
+            :param operations: the compiled stages, in order
+            :type operations: list
+        """
+        self.__operations = operations
+        quantize = [i for i, o in enumerate(operations)
+                    if isinstance(o, _Quantize)]
+        split = quantize[0] if quantize else len(operations)
+        self.__quantize = operations[split] if quantize else None
+        self.__head = [o.apply for o in operations[:split]]
+        self.__tail = [o.apply for o in operations[split + 1:]]
+
+    def is_keyed(self):
+        """
+            :return: True if the frames can be cached by key
+            :rtype: bool
+        """
+        return self.__quantize is not None
+
+    def reset(self):
+        """ Forget the previous frames, e.g. for decay.
+        """
+        for operation in self.__operations:
+            operation.reset()
+
+    def evaluate(self, data):
+        """
+            :param data: the analyser data
+            :type data: dict | numpy.ndarray
+            :return: the LED frame, reused between calls
+            :rtype: LedFrame
+        """
+        if self.__quantize is not None:
+            return self.evaluate_key(self.get_key(data))
+        value = data
+        for apply in self.__head:
+            value = apply(value)
+        return value
+
+    def get_key(self, data):
+        """
+            :param data: the analyser data
+            :type data: dict | numpy.ndarray
+            :return: the quantized levels, None without Quantize stage
+            :rtype: tuple
+        """
+        if self.__quantize is None:
+            return None
+        value = data
+        for apply in self.__head:
+            value = apply(value)
+        return self.__quantize.apply(value)
+
+    def evaluate_key(self, key):
+        """
+            :param key: the key from get_key
+            :type key: tuple
+            :return: the LED frame, reused between calls
+            :rtype: LedFrame
+        """
+        value = self.__quantize.restore(key)
+        for apply in self.__tail:
+            value = apply(value)
+        return value
@@ -0,0 +1,266 @@
+""" FFT filter bank module. """
+
+# Vectorized spectral analysis
+import numpy as np
+
+# Weight matrices per (sample rate, FFT size, band layout).
+_WEIGHTS = {}
+
+# Band filter responses per (sample rate, FFT size, band layout).
+_RESPONSES = {}
+
+# Bin to LED matrices per (sample rate, bins, LED count, frequency range).
+_LOG_MATRICES = {}
+
+# Floor for silent bands, in dB.
+_MIN_DB = -200.0
+
+
+def get_band_weights(sample_rate, fft_size, bands):
+    """ Get the bin to band weight matrix, cached per layout.
+
+    Every band sums the power of the FFT bins inside its frequency range,
+    bins on a band edge are weighted by their overlap. Bands narrower than
+    a bin use the nearest bin.
+
+        :param sample_rate: the sample rate in Hz
+        :type sample_rate: int
+        :param fft_size: the FFT size in samples
+        :type fft_size: int
+        :param bands: the (lower, upper) band limits in Hz
+        :type bands: tuple
+        :return: the (bins, bands) weight matrix, shared between callers
+        :rtype: numpy.ndarray
+    """
+    key = (sample_rate, fft_size, tuple(tuple(b) for b in bands))
+    weights = _WEIGHTS.get(key)
+    if weights is None:
+        bin_width = float(sample_rate) / fft_size
+        # Bin k covers [k - 0.5, k + 0.5) bin widths.
+        lower_edges = (np.arange(fft_size // 2 + 1) - 0.5) * bin_width
+        upper_edges = lower_edges + bin_width
+        weights = np.zeros((len(lower_edges), len(bands)), np.float32)
+        for i, (lower, upper) in enumerate(bands):
+            overlap = np.minimum(upper_edges, upper) - \
+                np.maximum(lower_edges, lower)
+            weights[:, i] = np.clip(overlap / bin_width, 0, 1)
+            if not weights[:, i].any():
+                nearest = int(round((lower + upper) / 2.0 / bin_width))
+                weights[min(nearest, len(lower_edges) - 1), i] = 1
+        weights.setflags(write=False)
+        _WEIGHTS[key] = weights
+    return weights
+
+
+def get_band_responses(sample_rate, fft_size, bands):
+    """ Get the frequency responses of linear phase band filters, cached
+    per layout.
+
+    The filters have fft_size taps, follow the band weights and are
+    tapered with a Kaiser window. The responses are sampled for FFTs of
+    twice the size, so filtering the latest 2 * fft_size samples by
+    overlap-save gives fft_size + 1 valid band samples.
+
+        :param sample_rate: the sample rate in Hz
+        :type sample_rate: int
+        :param fft_size: the FFT size in samples
+        :type fft_size: int
+        :param bands: the (lower, upper) band limits in Hz
+        :type bands: tuple
+        :return: the (fft_size + 1, bands) responses, shared between
+                 callers
+        :rtype: numpy.ndarray
+    """
+    key = (sample_rate, fft_size, tuple(tuple(b) for b in bands))
+    responses = _RESPONSES.get(key)
+    if responses is None:
+        weights = get_band_weights(sample_rate, fft_size, bands)
+        taps = np.roll(np.fft.irfft(weights, fft_size, axis=0),
+                       fft_size // 2, axis=0)
+        taps *= np.kaiser(fft_size, 4)[:, None]
+        responses = np.fft.rfft(taps, 2 * fft_size, axis=0).astype(
+            np.complex64)
+        responses.setflags(write=False)
+        _RESPONSES[key] = responses
+    return responses
+
+
+def get_log_frequency_matrix(sample_rate, bins, count, min_frequency=40,
+                             max_frequency=None):
+    """ Get the matrix averaging spectrum bins into log spaced outputs.
+
+    The spectrum bins are evenly spaced from 0 to the Nyquist frequency,
+    outputs are spaced evenly on a log frequency scale, so low notes get
+    as many outputs as high ones. Every column sums to one, so values in dB
+    are averaged.
+
+        :param sample_rate: the sample rate in Hz
+        :type sample_rate: int
+        :param bins: the number of spectrum bins
+        :type bins: int
+        :param count: the number of outputs, e.g. LEDs
+        :type count: int
+        :param min_frequency: the lowest frequency in Hz (default: 40)
+        :type min_frequency: float
+        :param max_frequency: the highest frequency in Hz (default: Nyquist)
+        :type max_frequency: float
+        :return: the (bins, count) matrix, shared between callers
+        :rtype: numpy.ndarray
+    """
+    nyquist = sample_rate / 2.0
+    max_frequency = min(max_frequency or nyquist, nyquist)
+    key = (sample_rate, bins, count, min_frequency, max_frequency)
+    matrix = _LOG_MATRICES.get(key)
+    if matrix is None:
+        bin_width = nyquist / bins
+        lower_edges = np.arange(bins) * bin_width
+        edges = np.logspace(np.log10(min_frequency),
+                            np.log10(max_frequency), count + 1)
+        matrix = np.zeros((bins, count), np.float32)
+        for i in range(count):
+            overlap = np.minimum(lower_edges + bin_width, edges[i + 1]) - \
+                np.maximum(lower_edges, edges[i])
+            matrix[:, i] = np.clip(overlap / bin_width, 0, 1)
+            if not matrix[:, i].any():
+                nearest = int((edges[i] + edges[i + 1]) / 2.0 / bin_width)
+                matrix[min(nearest, bins - 1), i] = 1
+        matrix /= matrix.sum(axis=0)
+        matrix.setflags(write=False)
+        _LOG_MATRICES[key] = matrix
+    return matrix
+
+
+class FilterBank(object):
+    """ Filter Bank class.
+    Computes the energy of any number of frequency bands for all channels
+    with one windowed FFT. Levels are reported like the GStreamer level
+    element: rms, peak and decaying peak in dB, per channel and band, the
+    decaying peak follows the peak.
+
+    By default the peak is the rms, the cost is then dominated by the FFT
+    and does not grow with the band count. Sample peaks are the largest
+    samples of the band filtered signals since the last analysis, like the
+    level element's, but filtering costs an inverse FFT per band.
+    """
+
+    def __init__(self, sample_rate, channels, bands, fft_size=2048,
+                 peak_ttl=0.3, peak_falloff=10.0, sample_peaks=False):
+        """
+            :param sample_rate: the sample rate in Hz
+            :type sample_rate: int
+            :param channels: the number of channels
+            :type channels: int
+            :param bands: the (lower, upper) band limits in Hz
+            :type bands: list
+            :param fft_size: the FFT size in samples (default: 2048)
+            :type fft_size: int
+            :param peak_ttl: the peak hold time in seconds (default: 0.3)
+            :type peak_ttl: float
+            :param peak_falloff: the peak falloff in dB/s (default: 10)
+            :type peak_falloff: float
+            :param sample_peaks: report band sample peaks, at the cost of
+                                 an inverse FFT per band (default: False)
+            :type sample_peaks: bool
+        """
+        self.__fft_size = fft_size
+        self.__peak_ttl = peak_ttl
+        self.__peak_falloff = peak_falloff
+        self.__weights = get_band_weights(sample_rate, fft_size, bands)
+        # The latest samples, twice the window for filtering the peaks.
+        self.__responses = get_band_responses(
+            sample_rate, fft_size, bands)[:, :, None] \
+            if sample_peaks else None
+        self.__history = np.zeros(
+            (2 * fft_size if sample_peaks else fft_size, channels),
+            np.float32)
+        self.__new_samples = 0
+        self.__window = np.hanning(fft_size).astype(np.float32)[:, None]
+        self.__windowed = np.empty((fft_size, channels), np.float32)
+        # One sided power to mean square, a full scale sine is -3 dB rms.
+        self.__scale = 2.0 / (fft_size * np.sum(self.__window ** 2))
+        shape = (channels, len(bands))
+        self.__rms = np.empty(shape, np.float32)
+        self.__peak = np.empty(shape, np.float32)
+        self.__decay = np.full(shape, _MIN_DB, np.float32)
+        self.__peak_time = np.zeros(shape)
+        self.__time = None
+
+    def push(self, samples):
+        """ Add samples to the analysis window.
+            :param samples: the (frames, channels) samples in [-1, 1]
+            :type samples: numpy.ndarray
+        """
+        history = self.__history
+        count = min(len(samples), len(history))
+        if not count:
+            return
+        history[:-count] = history[count:]
+        history[-count:] = samples[-count:]
+        self.__new_samples += count
+
+    def carry_over(self, filter_bank):
+        """ Continue from the state of a replaced filter bank, so new bands
+        or a new interval don't restart the levels from silence. The latest
+        samples are kept, the decaying peaks if the bands are as many.
+            :param filter_bank: the replaced filter bank, of the same
+                                channels
+            :type filter_bank: FilterBank
+        """
+        history = filter_bank.__history
+        if history.shape[1] != self.__history.shape[1]:
+            return
+        count = min(len(history), len(self.__history))
+        self.__history[-count:] = history[-count:]
+        self.__new_samples = min(filter_bank.__new_samples, count)
+        self.__time = filter_bank.__time
+        if filter_bank.__decay.shape == self.__decay.shape:
+            self.__decay[:] = filter_bank.__decay
+            self.__peak_time[:] = filter_bank.__peak_time
+
+    def analyse(self, timestamp):
+        """ Analyse the latest window.
+            :param timestamp: the stream time of the window end in seconds
+            :type timestamp: float
+            :return: the rms, peak and decay levels in dB, each as a
+                     (channels, bands) array reused between calls
+            :rtype: tuple
+        """
+        np.multiply(self.__history[-self.__fft_size:], self.__window,
+                    out=self.__windowed)
+        spectrum = np.fft.rfft(self.__windowed, axis=0)
+        power = spectrum.real ** 2
+        power += spectrum.imag ** 2
+        energy = np.dot(self.__weights.T, power.astype(np.float32)).T
+        energy *= self.__scale
+        np.maximum(energy, 10 ** (_MIN_DB / 10), out=energy)
+        np.log10(energy, out=self.__rms)
+        self.__rms *= 10
+
+        # The band sample peaks of the new samples, overlap-save keeps the
+        # latest fft_size + 1.
+        new_samples = min(self.__new_samples, self.__fft_size + 1)
+        self.__new_samples = 0
+        if self.__responses is None:
+            peak = self.__rms
+        elif new_samples:
+            spectrum = np.fft.rfft(self.__history, axis=0)[:, None]
+            bands = np.fft.irfft(spectrum * self.__responses, axis=0)
+            amplitude = np.abs(bands[-new_samples:]).max(axis=0).T
+            np.maximum(amplitude, 10 ** (_MIN_DB / 20), out=amplitude)
+            np.log10(amplitude, out=self.__peak)
+            self.__peak *= 20
+            peak = self.__peak
+        else:
+            peak = self.__peak
+            peak.fill(_MIN_DB)
+
+        # Peak hold, then a linear falloff in dB.
+        elapsed = 0 if self.__time is None else timestamp - self.__time
+        self.__time = timestamp
+        held = timestamp - self.__peak_time <= self.__peak_ttl
+        falling = np.where(held, self.__decay,
+                           self.__decay - self.__peak_falloff * elapsed)
+        rising = peak >= falling
+        np.copyto(self.__decay, np.where(rising, peak, falling))
+        self.__peak_time[rising] = timestamp
+        return self.__rms, peak, self.__decay
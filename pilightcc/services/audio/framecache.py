@@ -0,0 +1,104 @@
+""" Effect frame cache module. """
+
+# LRU ordering
+from collections import OrderedDict
+import sys
+
+
+class FrameCache(object):
+    """ Frame Cache class.
+    Least recently used cache of encoded LED payloads, keyed by the
+    quantized effect inputs. Entries are evicted oldest first when the
+    estimated memory use exceeds the cap. The cache holds no parameters
+    itself, so it must be cleared whenever the effect, layout, correction
+    or message settings change.
+    """
+
+    def __init__(self, max_bytes):
+        """
+            :param max_bytes: the memory cap in bytes, 0 disables the cache
+            :type max_bytes: int
+        """
+        self.__max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+
+    def is_enabled(self):
+        return self.__max_bytes > 0
+
+    def get(self, key):
+        """ Get a payload, marking it as recently used.
+            :param key: the quantized effect inputs
+            :type key: tuple
+            :return: the payload, None on a miss
+            :rtype: str
+        """
+        payload = self.__entries.pop(key, None)
+        if payload is None:
+            self.__misses += 1
+            return None
+        self.__entries[key] = payload
+        self.__hits += 1
+        return payload
+
+    def put(self, key, payload):
+        """ Add a payload, evicting the least recently used ones if needed.
+            :param key: the quantized effect inputs
+            :type key: tuple
+            :param payload: the encoded payload
+            :type payload: str
+        """
+        size = FrameCache.__get_entry_size(key, payload)
+        if size > self.__max_bytes:
+            return
+        if key in self.__entries:
+            self.__bytes -= FrameCache.__get_entry_size(
+                key, self.__entries.pop(key))
+        while self.__bytes + size > self.__max_bytes:
+            old_key, old_payload = self.__entries.popitem(last=False)
+            self.__bytes -= FrameCache.__get_entry_size(old_key, old_payload)
+        self.__entries[key] = payload
+        self.__bytes += size
+
+    def clear(self):
+        """ Remove all payloads and reset the statistics.
+        """
+        self.__entries.clear()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+
+    def get_size(self):
+        """
+            :return: the number of cached payloads
+            :rtype: int
+        """
+        return len(self.__entries)
+
+    def get_bytes(self):
+        """
+            :return: the estimated memory use in bytes
+            :rtype: int
+        """
+        return self.__bytes
+
+    def get_lookups(self):
+        """
+            :return: the number of lookups since the last clear
+            :rtype: int
+        """
+        return self.__hits + self.__misses
+
+    def get_hit_rate(self):
+        """
+            :return: the fraction of lookups that hit since the last clear
+            :rtype: float
+        """
+        lookups = self.get_lookups()
+        return self.__hits / float(lookups) if lookups else 0.0
+
+    @staticmethod
+    def __get_entry_size(key, payload):
+        return sys.getsizeof(key) + sys.getsizeof(payload)
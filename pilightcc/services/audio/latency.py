@@ -0,0 +1,134 @@
+""" Audio to light latency module. """
+
+# Rolling windows
+from collections import deque
+
+# Percentiles
+import numpy as np
+
+# Application
+from pilightcc.util.clock import monotonic
+
+
+class FrameTiming(object):
+    """ Frame Timing class.
+    Follows one analyser update to the LEDs. The analyser fills in the
+    pipeline times of the analysed audio, then every stage stamps the
+    monotonic time at which it finished.
+    """
+
+    # Stages, in order. Capture and analysis are measured on the pipeline
+    # clock, the others between consecutive stamps.
+    CAPTURE = 'capture'
+    ANALYSIS = 'analysis'
+    DISPATCH = 'dispatch'
+    WAIT = 'wait'
+    RENDER = 'render'
+    SEND = 'send'
+    TOTAL = 'total'
+
+    STAGES = [CAPTURE, ANALYSIS, DISPATCH, WAIT, RENDER, SEND, TOTAL]
+
+    def __init__(self, timestamp=None, running_time=None,
+                 capture_latency=None, analysis_latency=None):
+        """
+            :param timestamp: the stream time of the analysed audio in
+                              seconds (default: None)
+            :type timestamp: float
+            :param running_time: the pipeline running time at the end of
+                                 the analysed audio in seconds (default: None)
+            :type running_time: float
+            :param capture_latency: the source latency in seconds, from
+                                    sound to buffer (default: None)
+            :type capture_latency: float
+            :param analysis_latency: the time from the end of the analysed
+                                     audio to the message in seconds
+                                     (default: None)
+            :type analysis_latency: float
+        """
+        self.timestamp = timestamp
+        self.running_time = running_time
+        self.capture_latency = capture_latency
+        self.analysis_latency = analysis_latency
+        self.stamps = []
+
+    def stamp(self, stage, now=None):
+        """ Mark the end of a stage.
+            :param stage: the stage, e.g. FrameTiming.RENDER
+            :type stage: str
+            :param now: the monotonic time (default: now)
+            :type now: float
+        """
+        self.stamps.append((stage, monotonic() if now is None else now))
+
+    def get_latencies(self):
+        """
+            :return: the known stage latencies in seconds, by stage
+            :rtype: dict
+        """
+        latencies = {}
+        if self.capture_latency is not None:
+            latencies[FrameTiming.CAPTURE] = self.capture_latency
+        if self.analysis_latency is not None:
+            latencies[FrameTiming.ANALYSIS] = self.analysis_latency
+        for (_, start), (stage, end) in zip(self.stamps, self.stamps[1:]):
+            latencies[stage] = end - start
+        if self.stamps:
+            latencies[FrameTiming.TOTAL] = sum(
+                latencies.get(s, 0) for s in [FrameTiming.CAPTURE,
+                                              FrameTiming.ANALYSIS]) + \
+                self.stamps[-1][1] - self.stamps[0][1]
+        return latencies
+
+
+class LatencyStats(object):
+    """ Latency Stats class.
+    Rolling percentiles of the stage latencies of the last frames.
+    """
+
+    def __init__(self, window=500):
+        """
+            :param window: the number of frames to keep (default: 500)
+            :type window: int
+        """
+        self.__latencies = dict((s, deque(maxlen=window))
+                                for s in FrameTiming.STAGES)
+
+    def add(self, timing):
+        """ Add the latencies of a frame.
+            :param timing: the frame timing
+            :type timing: FrameTiming
+        """
+        for stage, latency in timing.get_latencies().iteritems():
+            self.__latencies[stage].append(latency)
+
+    def clear(self):
+        for latencies in self.__latencies.itervalues():
+            latencies.clear()
+
+    def get_percentiles(self, stage, percentiles=(50, 95, 99)):
+        """
+            :param stage: the stage, e.g. FrameTiming.TOTAL
+            :type stage: str
+            :param percentiles: the percentiles (default: (50, 95, 99))
+            :type percentiles: tuple
+            :return: the latency percentiles in seconds, None without data
+            :rtype: list
+        """
+        latencies = self.__latencies[stage]
+        if not latencies:
+            return None
+        return np.percentile(latencies, percentiles).tolist()
+
+    def get_report(self):
+        """
+            :return: the p50/p95/p99 latencies in ms of the measured stages
+            :rtype: str
+        """
+        parts = []
+        for stage in FrameTiming.STAGES:
+            percentiles = self.get_percentiles(stage)
+            if percentiles is not None:
+                parts.append("{} {}".format(stage, "/".join(
+                    "{:.1f}".format(p * 1000) for p in percentiles)))
+        return "Latency p50/p95/p99 ms: " + ", ".join(parts)
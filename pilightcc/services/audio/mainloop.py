@@ -0,0 +1,118 @@
+""" GLib main loop module. """
+
+# PyGI - GLib main loop and GStreamer buses
+from gi import require_version
+
+require_version('Gst', '1.0')
+from gi.repository import GLib, GObject, Gst
+
+from threading import Thread, Lock, current_thread
+
+
+class GLibLoop(object):
+    """ GLib Loop class.
+    The one GLib main loop thread of the process, shared by all audio
+    analysers. Bus watches are added to the default main context, which
+    the loop runs. The thread is started on the first attach and then
+    idles in poll while no pipeline is playing, so starting and stopping
+    analysers never creates threads or loops.
+    """
+
+    __JOIN_TIMEOUT = 1
+
+    __instance = None
+    __instance_lock = Lock()
+
+    def __init__(self):
+        self.__lock = Lock()
+        # Held by shutdown until the thread has stopped, so attach can't
+        # start a thread that is quit by the pending shutdown.
+        self.__run_lock = Lock()
+        self.__loop = None
+        self.__thread = None
+        self.__watches = 0
+
+    @staticmethod
+    def get():
+        """ Get the loop of the process, GStreamer is initiated once on
+        the first call.
+            :rtype: GLibLoop
+        """
+        with GLibLoop.__instance_lock:
+            if GLibLoop.__instance is None:
+                GObject.threads_init()
+                Gst.init(None)
+                GLibLoop.__instance = GLibLoop()
+            return GLibLoop.__instance
+
+    def __start(self):
+        if self.__thread is None:
+            self.__loop = GLib.MainLoop()
+            self.__thread = Thread(target=self.__loop.run,
+                                   name='GLibLoop')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def attach(self, bus, handlers):
+        """ Watch a bus on the loop, the handlers are called on the loop
+        thread.
+            :param bus: the pipeline bus
+            :type bus: Gst.Bus
+            :param handlers: the (signal, handler) pairs,
+                             e.g. ('message::eos', on_eos)
+            :type handlers: list
+            :return: the handler connections, for detach
+            :rtype: list
+        """
+        with self.__run_lock, self.__lock:
+            self.__start()
+            bus.add_signal_watch()
+            self.__watches += 1
+            return [bus.connect(signal, handler)
+                    for signal, handler in handlers]
+
+    def detach(self, bus, connections):
+        """ Stop watching a bus, also from a handler on the loop thread.
+            :param bus: the pipeline bus
+            :type bus: Gst.Bus
+            :param connections: the connections from attach
+            :type connections: list
+        """
+        with self.__lock:
+            for connection in connections:
+                bus.disconnect(connection)
+            bus.remove_signal_watch()
+            self.__watches -= 1
+
+    def is_running(self):
+        """
+            :return: True if the loop thread is running
+            :rtype: bool
+        """
+        with self.__lock:
+            return self.__thread is not None and self.__thread.is_alive()
+
+    def get_watches(self):
+        """
+            :return: the number of attached buses
+            :rtype: int
+        """
+        with self.__lock:
+            return self.__watches
+
+    def shutdown(self):
+        """ Quit the loop and join its thread, a later attach starts it
+        again.
+        """
+        with self.__run_lock:
+            with self.__lock:
+                thread, self.__thread = self.__thread, None
+            if thread is None:
+                return
+            # Quit from the loop itself, a quit before run() starts is lost.
+            GLib.idle_add(self.__loop.quit, priority=GLib.PRIORITY_HIGH)
+            if thread is not current_thread():
+                thread.join(GLibLoop.__JOIN_TIMEOUT)
+                if thread.is_alive():
+                    print("GLibLoop: Error: the loop thread did not stop "
+                          "within {} s.".format(GLibLoop.__JOIN_TIMEOUT))
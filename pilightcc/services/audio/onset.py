@@ -0,0 +1,168 @@
+""" Onset and beat detection module. """
+
+# Vectorized flux and tempo histogram
+import numpy as np
+
+
+class OnsetDetector(object):
+    """ Onset Detector class.
+    Detects onsets in a stream of band levels from the band energy flux,
+    the summed rise of the levels since the previous update. The flux is
+    compared with an adaptive threshold, a running mean plus a multiple of
+    the running mean deviation, both exponential averages so every update
+    costs the same.
+
+    The tempo is estimated from a ring buffer of the latest onset times:
+    all onset intervals are folded into one tempo octave and the densest
+    bin of their histogram wins. Beats are onsets close to the predicted
+    beat time, missing beats are filled in for a few periods, so off beat
+    onsets don't count and short breaks keep the beat.
+    """
+
+    # Level floor in dB, so silence doesn't give huge rises.
+    __MIN_LEVEL = -90.0
+
+    def __init__(self, sensitivity=1.5, threshold=1.0, adaptation=0.05,
+                 min_interval=0.1, history=16, min_bpm=80, max_missed=4):
+        """
+            :param sensitivity: the threshold in mean deviations above the
+                                mean flux (default: 1.5)
+            :type sensitivity: float
+            :param threshold: the minimum threshold in dB (default: 1.0)
+            :type threshold: float
+            :param adaptation: the weight of every update in the running
+                               flux statistics (default: 0.05)
+            :type adaptation: float
+            :param min_interval: the minimum time between onsets in
+                                 seconds (default: 0.1)
+            :type min_interval: float
+            :param history: the number of onsets to estimate the tempo from
+                            (default: 16)
+            :type history: int
+            :param min_bpm: the lower end of the tempo octave, tempos are
+                            reported in [min_bpm, 2 * min_bpm) (default: 80)
+            :type min_bpm: int
+            :param max_missed: the number of beats to fill in without
+                               onsets (default: 4)
+            :type max_missed: int
+        """
+        self.__sensitivity = sensitivity
+        self.__threshold = threshold
+        self.__adaptation = adaptation
+        self.__min_interval = min_interval
+        self.__min_bpm = min_bpm
+        self.__max_missed = max_missed
+
+        # Onset ring buffer and the pairs of onsets to compare.
+        self.__onsets = np.full(history, -np.inf)
+        self.__next_onset = 0
+        self.__pairs = np.triu_indices(history, 1)
+        self.reset()
+
+    def reset(self):
+        self.__levels = None
+        self.__rise = None
+        self.__mean = 0.0
+        self.__deviation = 0.0
+        self.__onsets.fill(-np.inf)
+        self.__last_onset = -np.inf
+        self.__bpm = 0.0
+        self.__beat_time = None
+        self.__missed = 0
+
+    def get_bpm(self):
+        return self.__bpm
+
+    def update(self, levels, timestamp):
+        """ Add the band levels of an update.
+            :param levels: the band levels in dB, e.g. all bands of all
+                           channels, always in the same order
+            :type levels: list | numpy.ndarray
+            :param timestamp: the stream time in seconds
+            :type timestamp: float
+            :return: 'beat' (bool), 'onset_strength' (the flux in dB) and
+                     'bpm' (0 while unknown)
+            :rtype: dict
+        """
+        if timestamp < self.__last_onset:
+            # The stream restarted.
+            self.reset()
+
+        flux = self.__get_flux(levels)
+        threshold = self.__mean + self.__sensitivity * self.__deviation + \
+            self.__threshold
+        onset = flux > threshold and \
+            timestamp - self.__last_onset >= self.__min_interval
+
+        # Adapt the statistics after the test, so an onset can't mask
+        # itself.
+        difference = flux - self.__mean
+        self.__mean += self.__adaptation * difference
+        self.__deviation += self.__adaptation * (abs(difference) -
+                                                 self.__deviation)
+
+        if onset:
+            self.__last_onset = timestamp
+            self.__onsets[self.__next_onset] = timestamp
+            self.__next_onset = (self.__next_onset + 1) % len(self.__onsets)
+            self.__bpm = self.__estimate_bpm()
+
+        return {'beat': self.__update_beat(onset, timestamp),
+                'onset_strength': flux,
+                'bpm': self.__bpm}
+
+    def __get_flux(self, levels):
+        levels = np.maximum(levels, OnsetDetector.__MIN_LEVEL)
+        if self.__levels is None or self.__levels.shape != levels.shape:
+            self.__levels = levels
+            self.__rise = np.empty_like(levels)
+            return 0.0
+        np.subtract(levels, self.__levels, out=self.__rise)
+        np.maximum(self.__rise, 0, out=self.__rise)
+        self.__levels = levels
+        return float(self.__rise.mean())
+
+    def __estimate_bpm(self):
+        # Intervals between all pairs of onsets, in beats per minute.
+        # Empty slots give NaN or infinite intervals.
+        first, second = self.__pairs
+        with np.errstate(invalid='ignore'):
+            intervals = np.abs(self.__onsets[first] - self.__onsets[second])
+            intervals = intervals[np.isfinite(intervals) & (intervals > 0)]
+        if len(intervals) < 3:
+            return self.__bpm
+        bpm = 60.0 / intervals
+
+        # Fold into one octave, then take the densest 1 BPM bin and its
+        # neighbours.
+        min_bpm = self.__min_bpm
+        bpm = bpm / 2 ** np.floor(np.log2(bpm / min_bpm))
+        counts = np.bincount((bpm - min_bpm).astype(np.intp),
+                             minlength=min_bpm)[:min_bpm]
+        density = counts + np.roll(counts, 1) + np.roll(counts, -1)
+        peak = min_bpm + np.argmax(density)
+        return float(bpm[np.abs(bpm - peak - 0.5) <= 1.5].mean())
+
+    def __update_beat(self, onset, now):
+        if not self.__bpm or self.__beat_time is None:
+            if onset:
+                self.__beat_time = now
+            return onset
+
+        period = 60.0 / self.__bpm
+        expected = self.__beat_time + period
+        if onset and now >= expected - period / 4:
+            # An onset on the beat.
+            self.__beat_time = now
+            self.__missed = 0
+            return True
+        if onset and now - self.__beat_time < period / 4:
+            # A late onset of a filled in beat, follow its phase.
+            self.__beat_time = now
+            return False
+        if now >= expected and self.__missed < self.__max_missed:
+            # No onset, fill in the beat.
+            self.__beat_time = expected
+            self.__missed += 1
+            return True
+        return False
@@ -0,0 +1,229 @@
+""" Audio output pacing module. """
+
+# Synchronization
+from threading import Lock, Event
+import time
+
+# Vectorized interpolation
+import numpy as np
+
+# Application
+from pilightcc.util.clock import monotonic
+
+
+class Mailbox(object):
+    """ Mailbox class.
+    Holds the latest value put by a producer, older values that were
+    never taken are replaced and counted as dropped.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__event = Event()
+        self.__value = None
+        self.__new = False
+        self.__dropped = 0
+
+    def put(self, value):
+        """
+            :param value: the new value
+        """
+        with self.__lock:
+            if self.__new:
+                self.__dropped += 1
+            self.__value = value
+            self.__new = True
+            self.__event.set()
+
+    def take(self):
+        """ Take the latest value, without waiting.
+            :return: the latest value and True if it was not taken before
+            :rtype: tuple
+        """
+        with self.__lock:
+            new = self.__new
+            self.__new = False
+            self.__event.clear()
+            return self.__value, new
+
+    def wait(self, timeout):
+        """ Wait for a new value.
+            :param timeout: the timeout in seconds
+            :type timeout: float
+            :return: True if a new value is available
+            :rtype: bool
+        """
+        return self.__event.wait(timeout)
+
+    def get_dropped(self):
+        """
+            :return: the number of values replaced before being taken
+            :rtype: int
+        """
+        return self.__dropped
+
+    def clear(self):
+        with self.__lock:
+            self.__value = None
+            self.__new = False
+            self.__dropped = 0
+            self.__event.clear()
+
+
+class FrameClock(object):
+    """ Frame Clock class.
+    Ticks at a fixed rate on the monotonic clock. Ticks that are already
+    past when waited for are skipped and counted as late, so a slow frame
+    doesn't make the following frames bunch up.
+    """
+
+    def __init__(self, rate, clock=monotonic, sleep=time.sleep):
+        """
+            :param rate: the frame rate in Hz
+            :type rate: float
+            :param clock: the time function in s (default: monotonic)
+            :type clock: callable
+            :param sleep: the sleep function in s (default: time.sleep)
+            :type sleep: callable
+        """
+        self.__period = 1.0 / rate
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__next_time = None
+        self.__late = 0
+
+    def set_rate(self, rate):
+        """
+            :param rate: the frame rate in Hz
+            :type rate: float
+        """
+        self.__period = 1.0 / rate
+        self.__next_time = None
+
+    def get_period(self):
+        return self.__period
+
+    def wait(self):
+        """ Sleep until the next tick.
+            :return: the tick time on the monotonic clock
+            :rtype: float
+        """
+        now = self.__clock()
+        if self.__next_time is None:
+            self.__next_time = now
+        delay = self.__next_time - now
+        if delay > 0:
+            self.__sleep(delay)
+            now = self.__next_time
+        else:
+            missed = int(-delay / self.__period)
+            self.__late += missed
+            self.__next_time += missed * self.__period
+        self.__next_time += self.__period
+        return now
+
+    def get_late(self):
+        """
+            :return: the number of skipped ticks
+            :rtype: int
+        """
+        return self.__late
+
+    def reset(self):
+        self.__next_time = None
+        self.__late = 0
+
+
+def interpolate(previous, latest, alpha, events=True):
+    """ Blend two analyser updates of the same form.
+        :param previous: the previous data
+        :type previous: dict | list | numpy.ndarray | float
+        :param latest: the latest data
+        :type latest: dict | list | numpy.ndarray | float
+        :param alpha: the weight of the latest data, 0-1
+        :type alpha: float
+        :param events: pass the events of the latest data, e.g. beats,
+                       otherwise they are False (default: True)
+        :type events: bool
+        :return: the blended data
+        :rtype: dict | list | numpy.ndarray
+    """
+    if isinstance(latest, dict):
+        return dict((key, interpolate(previous.get(key, value), value, alpha,
+                                      events))
+                    for key, value in latest.iteritems())
+    if isinstance(latest, np.ndarray):
+        if np.shape(previous) != latest.shape:
+            return latest
+        return previous + (latest - previous) * alpha
+    if isinstance(latest, bool):
+        # Events, e.g. beats, aren't blended.
+        return latest and events
+    if isinstance(latest, (int, float)):
+        return previous + (latest - previous) * alpha
+    if len(previous) != len(latest):
+        return latest
+    return [p + (v - p) * alpha for p, v in zip(previous, latest)]
+
+
+class DataInterpolator(object):
+    """ Data Interpolator class.
+    Renders at most one analysis interval behind the analyser: when frames
+    are due more often than updates arrive, the data moves from the
+    previous to the latest update over the measured update interval.
+    Events of an update, e.g. beats, are only rendered by the first frame
+    after it arrives.
+    """
+
+    def __init__(self, period):
+        """
+            :param period: the frame period in seconds
+            :type period: float
+        """
+        self.__period = period
+        self.reset()
+
+    def set_period(self, period):
+        self.__period = period
+
+    def reset(self):
+        self.__previous = None
+        self.__latest = None
+        self.__time = None
+        self.__interval = 0
+        self.__events = False
+
+    def has_data(self):
+        return self.__latest is not None
+
+    def push(self, data, now):
+        """ Add an analyser update.
+            :param data: the analyser data
+            :type data: dict | numpy.ndarray
+            :param now: the arrival time
+            :type now: float
+        """
+        if self.__time is not None:
+            self.__interval = now - self.__time
+        self.__previous = self.__latest
+        self.__latest = data
+        self.__time = now
+        self.__events = True
+
+    def get(self, now):
+        """
+            :param now: the frame time
+            :type now: float
+            :return: the data to render
+            :rtype: dict | numpy.ndarray
+        """
+        events, self.__events = self.__events, False
+        if self.__previous is None or self.__interval <= self.__period:
+            alpha = 1
+        else:
+            alpha = (now - self.__time) / self.__interval
+        if alpha >= 1:
+            if events:
+                return self.__latest
+            return interpolate(self.__latest, self.__latest, 1, False)
+        return interpolate(self.__previous, self.__latest, alpha, events)
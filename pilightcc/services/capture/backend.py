@@ -0,0 +1,499 @@
+""" Screen capture backend module. """
+
+# PyGI - Screen capture (Gtk).
+from gi import require_version
+
+require_version('Gdk', '3.0')
+require_version('Gst', '1.0')
+
+from gi.repository import Gdk
+from gi.repository import GdkPixbuf
+from gi.repository import Gst
+
+# Cairo surfaces
+import cairo
+
+# Frame processing
+import numpy as np
+
+# Thread safety
+from threading import Lock
+
+# Application
+from pilightcc.util.error import BaseError
+from pilightcc.settings.settings import CaptureBackend, CaptureScaling
+from pilightcc.services.capture.pool import CaptureBufferPool
+from pilightcc.services.capture.processing import TiledProcessor
+from pilightcc.services.capture.xrender import XRenderScaler, XRenderError
+
+# Gdk is not thread safe, window access is serialized.
+_GDK_LOCK = Lock()
+
+
+def get_screen_size():
+    """ Get the size of the whole screen.
+        :return: the (width, height) of the root window
+        :rtype: tuple
+    """
+    with _GDK_LOCK:
+        win = Gdk.get_default_root_window()
+        return win.get_width(), win.get_height()
+
+
+def get_monitor_areas():
+    """ Get the geometry of all monitors.
+        :return: the monitor areas in root window coordinates
+        :rtype: list
+    """
+    with _GDK_LOCK:
+        display = Gdk.Display.get_default()
+        try:
+            return [display.get_monitor(i).get_geometry()
+                    for i in range(display.get_n_monitors())]
+        except AttributeError:
+            # Gdk < 3.22
+            screen = Gdk.Screen.get_default()
+            return [screen.get_monitor_geometry(i)
+                    for i in range(screen.get_n_monitors())]
+
+
+class CaptureError(BaseError):
+    """ Error raised for capture errors.
+    """
+
+    def __init__(self, msg):
+        """
+            :param msg: the error message
+            :type msg: str
+        """
+        super(CaptureError, self).__init__(msg)
+
+
+class BaseCaptureBackend(object):
+    """ Base Capture Backend class.
+    Subclasses should implement grab, to_array and _scale.
+    Capturing is split in two steps so that they can be measured separately.
+    Area scaling is done by the frame processor for all backends.
+    """
+
+    def __init__(self, scaling=CaptureScaling.BILINEAR, **opts):
+        """
+            :param scaling: the scaling method (default: BILINEAR)
+            :type scaling: str
+
+        Optional arguments:
+
+            :param processor: the frame processor for area scaling
+            :type processor: TiledProcessor
+
+        Backend specific options are passed as keyword arguments, unknown
+        options are ignored.
+        """
+        self._scaling = scaling
+        self._processor = opts.get('processor') or TiledProcessor()
+
+    def get_screen_size(self):
+        """ Can be implemented by subclass.
+            :return: the (width, height) of the whole capture source
+            :rtype: tuple
+        """
+        return get_screen_size()
+
+    def get_monitor_areas(self):
+        """ Can be implemented by subclass.
+            :return: the selectable monitor areas
+            :rtype: list
+        """
+        return get_monitor_areas()
+
+    def grab(self, area):
+        """ To be implemented by subclass.
+        Grab a full resolution frame.
+            :param area: the area to grab, None for the whole screen
+            :type area: Gdk.Rectangle
+            :return: the backend specific frame
+        """
+        raise NotImplementedError("Please implement this method")
+
+    def to_array(self, frame):
+        """ To be implemented by subclass.
+        View a grabbed frame as an array, without scaling.
+            :param frame: the frame returned by grab
+            :return: the full resolution (height, width, 3) RGB frame
+            :rtype: numpy.ndarray
+        """
+        raise NotImplementedError("Please implement this method")
+
+    def _scale(self, frame, width, height):
+        """ To be implemented by subclass.
+        Scale a grabbed frame with the backend's own scaling.
+        """
+        raise NotImplementedError("Please implement this method")
+
+    def scale(self, frame, width, height):
+        """ Scale a grabbed frame.
+            :param frame: the frame returned by grab
+            :param width: the scaled width
+            :type width: int
+            :param height: the scaled height
+            :type height: int
+            :return: the scaled (height, width, 3) RGB frame
+            :rtype: numpy.ndarray
+        """
+        if self._scaling == CaptureScaling.AREA:
+            return self._processor.downscale(self.to_array(frame), width,
+                                             height)
+        return self._scale(frame, width, height)
+
+    def capture(self, area, width, height):
+        """ Grab and scale a frame.
+            :return: the scaled (height, width, 3) RGB frame
+            :rtype: numpy.ndarray
+        """
+        return self.scale(self.grab(area), width, height)
+
+    def close(self):
+        """ Can be implemented by subclass.
+        Release any backend resources.
+        """
+        pass
+
+
+class PixbufCaptureBackend(BaseCaptureBackend):
+    """ Pixbuf Capture Backend class.
+    Grabs the root window with Gdk and scales with GdkPixbuf.
+    """
+
+    __INTERP_TYPE = {
+        CaptureScaling.NEAREST: GdkPixbuf.InterpType.NEAREST,
+        CaptureScaling.TILES: GdkPixbuf.InterpType.TILES,
+        CaptureScaling.BILINEAR: GdkPixbuf.InterpType.BILINEAR,
+        CaptureScaling.HYPER: GdkPixbuf.InterpType.HYPER
+    }
+
+    def grab(self, area):
+        return self.get_pixel_buffer(area)
+
+    def to_array(self, frame):
+        return self.pixel_buffer_to_array(frame)[..., :3]
+
+    def _scale(self, frame, width, height):
+        return self.pixel_buffer_to_array(self.scale_pixel_buffer(
+            frame, width, height,
+            PixbufCaptureBackend.__INTERP_TYPE[self._scaling]))
+
+    # TODO Maybe use Gst?
+    @staticmethod
+    def get_pixel_buffer(area=None):
+        """ Grab the root window, or an area of it.
+            :param area: the area to grab, None for the whole window
+            :type area: Gdk.Rectangle
+        """
+        with _GDK_LOCK:
+            win = Gdk.get_default_root_window()
+            if area is None:
+                return Gdk.pixbuf_get_from_window(win, 0, 0, win.get_width(),
+                                                  win.get_height())
+            return Gdk.pixbuf_get_from_window(win, area.x, area.y,
+                                              area.width, area.height)
+
+    # @staticmethod
+    # def get_pixel_buffer():
+    #     from PyQt5.QtWidgets import QApplication
+    #     app = QApplication([])
+    #     return QApplication.screens()[0].grabWindow(
+    #         QApplication.desktop().winId()).toImage()
+
+    @staticmethod
+    def scale_pixel_buffer(pixel_buffer, width, height,
+                           interp=GdkPixbuf.InterpType.BILINEAR):
+        return pixel_buffer.scale_simple(width, height, interp)
+
+    @staticmethod
+    def pixel_buffer_to_array(pixel_buffer):
+        """ Convert a pixel buffer to a (height, width, channels) array.
+        Any row padding is dropped.
+        """
+        channels = pixel_buffer.get_n_channels()
+        # Strided view, the last row is not guaranteed to be padded.
+        return np.lib.stride_tricks.as_strided(
+            np.frombuffer(pixel_buffer.get_pixels(), np.uint8),
+            (pixel_buffer.get_height(), pixel_buffer.get_width(), channels),
+            (pixel_buffer.get_rowstride(), channels, 1))
+
+
+class PooledCaptureBackend(BaseCaptureBackend):
+    """ Pooled Capture Backend class.
+    Grabs the root window into a reused cairo surface and scales it into a
+    reused destination surface, buffers are only reallocated when the
+    capture or scale size changes.
+    """
+
+    __FILTER = {
+        CaptureScaling.NEAREST: cairo.FILTER_NEAREST,
+        CaptureScaling.TILES: cairo.FILTER_GOOD,
+        CaptureScaling.BILINEAR: cairo.FILTER_BILINEAR,
+        CaptureScaling.HYPER: cairo.FILTER_BEST
+    }
+
+    def __init__(self, scaling=CaptureScaling.BILINEAR, **opts):
+        super(PooledCaptureBackend, self).__init__(scaling, **opts)
+        self.__pool = CaptureBufferPool()
+
+    def grab(self, area):
+        with _GDK_LOCK:
+            win = Gdk.get_default_root_window()
+            if area is None:
+                x, y, width, height = 0, 0, win.get_width(), win.get_height()
+            else:
+                x, y, width, height = area.x, area.y, area.width, area.height
+            source = self.__pool.get(CaptureBufferPool.Role.SOURCE, width,
+                                     height)
+            Gdk.cairo_set_source_window(source.context, win, -x, -y)
+            source.context.paint()
+        return source
+
+    def to_array(self, frame):
+        frame.surface.flush()
+        return frame.rgb
+
+    def _scale(self, frame, width, height):
+        destination = self.__pool.get(CaptureBufferPool.Role.DESTINATION,
+                                      width, height)
+        ctx = destination.context
+        ctx.identity_matrix()
+        ctx.scale(float(width) / frame.width, float(height) / frame.height)
+        ctx.set_source_surface(frame.surface)
+        ctx.get_source().set_filter(
+            PooledCaptureBackend.__FILTER[self._scaling])
+        ctx.paint()
+        return destination.to_array()
+
+    def get_allocation_count(self):
+        """
+            :return: the number of buffers allocated so far
+            :rtype: int
+        """
+        return self.__pool.get_allocation_count()
+
+    def close(self):
+        self.__pool.clear()
+
+
+class XRenderCaptureBackend(BaseCaptureBackend):
+    """ XRender Capture Backend class.
+    Lets the X server scale the root window with XRender, so only the
+    scaled frame crosses the X connection instead of the full resolution
+    frame. Grabbing only selects the area, the transfer happens when
+    scaling. Falls back to the pooled backend if XRender is not available.
+    """
+
+    __FILTER = {
+        CaptureScaling.NEAREST: XRenderScaler.NEAREST,
+        CaptureScaling.TILES: XRenderScaler.GOOD,
+        CaptureScaling.BILINEAR: XRenderScaler.BILINEAR,
+        CaptureScaling.HYPER: XRenderScaler.BEST,
+        CaptureScaling.AREA: XRenderScaler.BOX
+    }
+
+    def __init__(self, scaling=CaptureScaling.BILINEAR, **opts):
+        super(XRenderCaptureBackend, self).__init__(scaling, **opts)
+        try:
+            self.__scaler = XRenderScaler()
+            self.__scaler.set_filter(XRenderCaptureBackend.__FILTER[scaling])
+            self.__fallback = None
+        except XRenderError:
+            self.__scaler = None
+            self.__fallback = PooledCaptureBackend(scaling, **opts)
+
+    def is_server_scaled(self):
+        """
+            :return: False if the pooled fallback is used
+            :rtype: bool
+        """
+        return self.__scaler is not None
+
+    def grab(self, area):
+        if self.__fallback is not None:
+            return self.__fallback.grab(area)
+        if area is None:
+            return (0, 0) + self.__scaler.get_screen_size()
+        return area.x, area.y, area.width, area.height
+
+    def to_array(self, frame):
+        if self.__fallback is not None:
+            return self.__fallback.to_array(frame)
+        return self.__scaler.read(*frame)
+
+    def scale(self, frame, width, height):
+        if self.__fallback is not None:
+            return self.__fallback.scale(frame, width, height)
+        return self.__scaler.scale(*(frame + (width, height)))
+
+    def close(self):
+        if self.__fallback is not None:
+            self.__fallback.close()
+        else:
+            self.__scaler.close()
+
+
+class VideoFileCaptureBackend(BaseCaptureBackend):
+    """ Video File Capture Backend class.
+    Decodes a video file with GStreamer instead of grabbing the screen, so
+    capturing can run without a display. Frames are scaled by the decode
+    pipeline, the video is looped and capture areas are ignored.
+    """
+
+    __PIPELINE = "filesrc name=source ! decodebin ! " \
+                 "videoconvert name=convert ! videoscale name=scale ! " \
+                 "capsfilter name=caps ! appsink name=sink"
+    __CAPS = "video/x-raw, format=(string)RGB"
+    __SIZE_CAPS = __CAPS + ", width=(int){}, height=(int){}"
+
+    # videoscale methods: nearest-neighbour, bilinear, lanczos.
+    __METHOD = {
+        CaptureScaling.NEAREST: 0,
+        CaptureScaling.TILES: 1,
+        CaptureScaling.BILINEAR: 1,
+        CaptureScaling.HYPER: 3,
+        CaptureScaling.AREA: 1
+    }
+
+    __PREROLL_TIMEOUT = 5
+
+    def __init__(self, scaling=CaptureScaling.BILINEAR, **opts):
+        """
+        Optional arguments:
+
+            :param video_file: the video file to decode
+            :type video_file: str
+            :param realtime: deliver frames at the native frame rate,
+                             otherwise as fast as they are pulled
+                             (default: True)
+            :type realtime: bool
+        """
+        super(VideoFileCaptureBackend, self).__init__(scaling, **opts)
+        Gst.init(None)
+        self.__video_file = opts.get('video_file', '')
+        self.__realtime = opts.get('realtime', True)
+        self.__pipeline = None
+        self.__sink = None
+        self.__caps_filter = None
+        self.__convert = None
+        self.__size = None
+
+    def __create_pipeline(self):
+        pipeline = Gst.parse_launch(VideoFileCaptureBackend.__PIPELINE)
+        pipeline.get_by_name('source').set_property('location',
+                                                    self.__video_file)
+        pipeline.get_by_name('scale').set_property(
+            'method', VideoFileCaptureBackend.__METHOD[self._scaling])
+        self.__caps_filter = pipeline.get_by_name('caps')
+        self.__caps_filter.set_property('caps', Gst.Caps.from_string(
+            VideoFileCaptureBackend.__CAPS))
+        self.__convert = pipeline.get_by_name('convert')
+
+        # Realtime keeps only the latest frame, like a screen grab.
+        self.__sink = pipeline.get_by_name('sink')
+        self.__sink.set_property('sync', self.__realtime)
+        self.__sink.set_property('max-buffers', 1)
+        self.__sink.set_property('drop', self.__realtime)
+
+        # Wait for the preroll, the caps are only negotiated after it. A
+        # timeout returns ASYNC, the file can't be played either.
+        pipeline.set_state(Gst.State.PLAYING)
+        result, _, _ = pipeline.get_state(
+            VideoFileCaptureBackend.__PREROLL_TIMEOUT * Gst.SECOND)
+        if result != Gst.StateChangeReturn.SUCCESS:
+            pipeline.set_state(Gst.State.NULL)
+            raise CaptureError("Video capture error: could not play " +
+                               self.__video_file)
+        self.__pipeline = pipeline
+
+    def get_screen_size(self):
+        if self.__pipeline is None:
+            self.__create_pipeline()
+        # The decoded size, before scaling.
+        caps = self.__convert.get_static_pad('sink').get_current_caps()
+        if caps is None:
+            raise CaptureError("Video capture error: no video in " +
+                               self.__video_file)
+        structure = caps.get_structure(0)
+        return structure.get_value('width'), structure.get_value('height')
+
+    def get_monitor_areas(self):
+        return []
+
+    def grab(self, area):
+        if self.__pipeline is None:
+            self.__create_pipeline()
+        sample = self.__sink.emit('pull-sample')
+        if sample is None:
+            # End of stream, loop the video.
+            self.__pipeline.seek_simple(
+                Gst.Format.TIME,
+                Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, 0)
+            sample = self.__sink.emit('pull-sample')
+            if sample is None:
+                raise CaptureError("Video capture error: no frames")
+        return sample
+
+    def scale(self, frame, width, height):
+        if (width, height) != self.__size:
+            # Scale the following frames in the pipeline.
+            self.__size = (width, height)
+            self.__caps_filter.set_property('caps', Gst.Caps.from_string(
+                VideoFileCaptureBackend.__SIZE_CAPS.format(width, height)))
+
+        pixels = self.to_array(frame)
+        frame_height, frame_width = pixels.shape[:2]
+        if (frame_width, frame_height) != (width, height):
+            # Caps change not applied yet, resample this frame.
+            pixels = pixels[np.arange(height) * frame_height // height][
+                :, np.arange(width) * frame_width // width]
+        return pixels
+
+    def to_array(self, frame):
+        structure = frame.get_caps().get_structure(0)
+        frame_width = structure.get_value('width')
+        frame_height = structure.get_value('height')
+        buf = frame.get_buffer()
+        data = np.frombuffer(buf.extract_dup(0, buf.get_size()), np.uint8)
+        # Rows are padded to 4 bytes.
+        return np.lib.stride_tricks.as_strided(
+            data, (frame_height, frame_width, 3),
+            (data.size // frame_height, 3, 1))
+
+    def close(self):
+        if self.__pipeline is not None:
+            self.__pipeline.set_state(Gst.State.NULL)
+            self.__pipeline = None
+
+
+_BACKENDS = {
+    CaptureBackend.PIXBUF: PixbufCaptureBackend,
+    CaptureBackend.POOLED: PooledCaptureBackend,
+    CaptureBackend.VIDEO: VideoFileCaptureBackend,
+    CaptureBackend.XRENDER: XRenderCaptureBackend
+}
+
+
+def get_backend_names():
+    """
+        :return: the names of all capture backends
+        :rtype: list
+    """
+    return sorted(_BACKENDS.keys())
+
+
+def create_backend(name, scaling=CaptureScaling.BILINEAR, **opts):
+    """ Create a capture backend.
+        :param name: the backend name, see CaptureBackend
+        :type name: str
+        :param scaling: the scaling method, see CaptureScaling
+        :type scaling: str
+        :param opts: backend specific options
+        :return: the backend, the pixbuf backend if the name is unknown
+        :rtype: BaseCaptureBackend
+    """
+    return _BACKENDS.get(name, PixbufCaptureBackend)(scaling, **opts)
@@ -1,12 +1,10 @@
 """ Screen capture service module. """
 
-# PyGI - Screen capture (Gtk).
-from gi import require_version
+# Frame timing
+import time
 
-require_version('Gdk', '3.0')
-
-from gi.repository import Gdk
-from gi.repository import GdkPixbuf
+# Parallel capture
+from multiprocessing.pool import ThreadPool
 
 # Service
 from pilightcc.services.service import ServiceLauncher
@@ -15,8 +13,21 @@ from pilightcc.services.service import DelayTimer
 
 # Application
 from pilightcc.hyperion.hypproto import HyperionProto
+from pilightcc.hyperion.hypjson import HyperionJson
 from pilightcc.hyperion.hypproto import HyperionError
-from pilightcc.settings.settings import Setting
+from pilightcc.settings.settings import Setting, CaptureMode
+from pilightcc.settings.settings import CaptureSampling
+from pilightcc.services.capture.interpolation import FrameInterpolator
+from pilightcc.services.capture.backend import create_backend
+from pilightcc.services.capture.backend import CaptureError
+from pilightcc.services.capture.resolution import compute_capture_size
+from pilightcc.services.capture.dominant import DominantColor
+from pilightcc.services.capture.window import WindowTracker, ScreenWatcher
+from pilightcc.services.capture.processing import TiledProcessor
+from pilightcc.services.capture.processing import EdgeRegions
+from pilightcc.services.capture.processing import SampleGrid
+from pilightcc.led.correction import ColorCorrection
+from pilightcc.led.layout import LedLayout
 
 
 class CaptureService(BaseService):
@@ -30,103 +41,430 @@ class CaptureService(BaseService):
         ERROR = 2
 
     __ERROR_DELAY = 5
-    __IMAGE_DURATION = 500
 
     def __init__(self, port):
         """ Constructor
         """
         super(CaptureService, self).__init__(port, True)
         self._update_state(CaptureService.StateValue.OK)
-        self.__hyperion_connector = None
+        self.__streams = []
+        self.__pool = None
+        self.__screen_size = None
+        self.__window_tracker = None
+        self.__screen_watcher = None
+        self.__resolution_msg = None
         self.__delay_timer = DelayTimer()
+        self.__capture_interval = 0
+        self.__next_capture_time = 0
 
         # Register settings.
         self._register_settings_unit([Setting.HYPERION_IP_ADDRESS,
-                                      Setting.HYPERION_PROTO_PORT],
-                                     self.__update_hyperion_connector)
+                                      Setting.HYPERION_PROTO_PORT,
+                                      Setting.HYPERION_JSON_PORT,
+                                      Setting.CAPTURE_MONITORS,
+                                      Setting.CAPTURE_PRIORITY,
+                                      Setting.CAPTURE_BACKEND,
+                                      Setting.CAPTURE_SCALING,
+                                      Setting.CAPTURE_VIDEO_FILE,
+                                      Setting.CAPTURE_VIDEO_REALTIME,
+                                      Setting.CAPTURE_WINDOW,
+                                      Setting.CAPTURE_WORKERS],
+                                     self.__update_streams)
 
-        self._register_settings_unit([Setting.CAPTURE_FRAME_RATE],
+        self._register_settings_unit([Setting.CAPTURE_FRAME_RATE,
+                                      Setting.CAPTURE_OUTPUT_FRAME_RATE],
                                      self.__update_timer)
 
-        self._register_settings_unit([Setting.CAPTURE_SCALE_WIDTH,
+        self._register_settings_unit([Setting.CAPTURE_MODE,
+                                      Setting.CAPTURE_SMOOTHING,
+                                      Setting.CAPTURE_SMOOTHING_TIME,
+                                      Setting.CAPTURE_SCALE_WIDTH,
                                       Setting.CAPTURE_SCALE_HEIGHT,
-                                      Setting.CAPTURE_PRIORITY])
+                                      Setting.CAPTURE_SCALE_AUTO,
+                                      Setting.CAPTURE_SAMPLES_PER_LED,
+                                      Setting.CAPTURE_SAMPLING,
+                                      Setting.LED_COUNT_TOP,
+                                      Setting.LED_COUNT_BOTTOM,
+                                      Setting.LED_COUNT_SIDE,
+                                      Setting.LED_START_CORNER,
+                                      Setting.LED_DIRECTION] +
+                                     ColorCorrection.SETTINGS,
+                                     self.__update_stream_settings)
 
     def _setup(self):
-        self.__update_hyperion_connector()
+        self.__screen_watcher = ScreenWatcher()
+        self.__update_streams()
+        self.__update_timer()
 
     def _enable(self, enable):
-        if enable:
-            try:
-                self.__hyperion_connector.connect()
-            except HyperionError:
-                pass
-        else:
-            self.__hyperion_connector.disconnect()
+        for stream in self.__streams:
+            stream.enable(enable)
 
-    def __update_hyperion_connector(self):
-        if self.__hyperion_connector is not None:
-            self.__hyperion_connector.disconnect()
-        self.__hyperion_connector = HyperionProto(
-            self._get_setting(Setting.HYPERION_IP_ADDRESS),
-            self._get_setting(Setting.HYPERION_PROTO_PORT))
+    def _on_shutdown(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
+        if self.__window_tracker is not None:
+            self.__window_tracker.close()
+            self.__window_tracker = None
+        if self.__screen_watcher is not None:
+            self.__screen_watcher.close()
+            self.__screen_watcher = None
+
+    def __update_streams(self):
+        for stream in self.__streams:
+            stream.enable(False)
+            stream.close()
+
+        # One stream per selected monitor, or the whole screen.
+        self.__streams = []
+        processors = [self.__create_processor()]
+        backends = [self.__create_backend(processors[0])]
+        try:
+            self.__screen_size = backends[0].get_screen_size()
+        except CaptureError as err:
+            backends[0].close()
+            processors[0].close()
+            self._update_state(CaptureService.StateValue.ERROR, err.msg)
+            return
+        areas = backends[0].get_monitor_areas()
+        monitors = self.parse_monitors(
+            self._get_setting(Setting.CAPTURE_MONITORS))
+        selected = [areas[m] for m in monitors if m < len(areas)] or [None]
+
+        # A followed window replaces the monitor selection.
+        if self.__window_tracker is not None:
+            self.__window_tracker.close()
+            self.__window_tracker = None
+        if self._get_setting(Setting.CAPTURE_WINDOW) and areas:
+            self.__window_tracker = WindowTracker(
+                self._get_setting(Setting.CAPTURE_WINDOW),
+                self.__on_window_area)
+            selected = [self.__window_tracker.get_area()]
+        processors += [self.__create_processor() for _ in selected[1:]]
+        backends += [self.__create_backend(p) for p in processors[1:]]
+
+        # Each stream gets its own Hyperion ports and priority.
+        self.__streams = [
+            CaptureStream(area, self._get_setting(Setting.HYPERION_IP_ADDRESS),
+                          self._get_setting(Setting.HYPERION_PROTO_PORT) + i,
+                          self._get_setting(Setting.HYPERION_JSON_PORT) + i,
+                          self._get_setting(Setting.CAPTURE_PRIORITY) + i,
+                          backend, processor)
+            for i, (area, backend, processor) in enumerate(
+                zip(selected, backends, processors))]
+        self.__update_stream_settings()
+
+        # Capture in parallel threads when more than one stream is active.
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
+        if len(self.__streams) > 1:
+            self.__pool = ThreadPool(len(self.__streams))
+
+    def __create_processor(self):
+        return TiledProcessor(self._get_setting(Setting.CAPTURE_WORKERS))
+
+    def __create_backend(self, processor):
+        return create_backend(
+            self._get_setting(Setting.CAPTURE_BACKEND),
+            self._get_setting(Setting.CAPTURE_SCALING),
+            processor=processor,
+            video_file=self._get_setting(Setting.CAPTURE_VIDEO_FILE),
+            realtime=self._get_setting(Setting.CAPTURE_VIDEO_REALTIME))
+
+    def __update_stream_settings(self):
+        for stream in self.__streams:
+            stream.set_scale(*self.__get_scale_size(stream))
+            stream.set_mode(self._get_setting(Setting.CAPTURE_MODE))
+            stream.set_leds(self._get_setting(Setting.LED_COUNT_TOP),
+                            self._get_setting(Setting.LED_COUNT_BOTTOM),
+                            self._get_setting(Setting.LED_COUNT_SIDE),
+                            self._get_setting(Setting.LED_START_CORNER),
+                            self._get_setting(Setting.LED_DIRECTION))
+            stream.set_sampling(
+                self._get_setting(Setting.CAPTURE_SAMPLING),
+                self._get_setting(Setting.CAPTURE_SAMPLES_PER_LED))
+            stream.set_smoothing(
+                self._get_setting(Setting.CAPTURE_SMOOTHING),
+                self._get_setting(Setting.CAPTURE_SMOOTHING_TIME) / 1000.0)
+            stream.set_correction(self._get_settings())
+
+        self.__report_resolution()
+
+    def __on_window_area(self, area):
+        # The followed window moved or resized, also rescale for its size.
+        if self.__streams:
+            stream = self.__streams[0]
+            stream.set_area(area)
+            scale = self.__get_scale_size(stream)
+            if scale != stream.get_scale():
+                stream.set_scale(*scale)
+                self.__report_resolution()
+
+    def __report_resolution(self):
+        # The chosen resolutions are kept with every OK state.
+        self.__resolution_msg = None
+        if self._get_setting(Setting.CAPTURE_SCALE_AUTO):
+            self.__resolution_msg = "Capture resolution: {}".format(
+                ", ".join("{}x{}".format(*s.get_scale())
+                          for s in self.__streams))
+        if self.__streams:
+            self._update_state(msg=self.__resolution_msg)
+
+    def __get_scale_size(self, stream):
+        if self._get_setting(Setting.CAPTURE_SCALE_AUTO):
+            area = stream.get_area()
+            screen_width, screen_height = self.__screen_size if \
+                area is None else (area.width, area.height)
+            size = compute_capture_size(
+                self._get_setting(Setting.LED_COUNT_TOP),
+                self._get_setting(Setting.LED_COUNT_BOTTOM),
+                self._get_setting(Setting.LED_COUNT_SIDE),
+                screen_width, screen_height,
+                self._get_setting(Setting.CAPTURE_SAMPLES_PER_LED))
+            if size is not None:
+                return size
+        return (self._get_setting(Setting.CAPTURE_SCALE_WIDTH),
+                self._get_setting(Setting.CAPTURE_SCALE_HEIGHT))
 
     def __update_timer(self):
-        self.__delay_timer.set_delay(
-            1.0 / self._get_setting(Setting.CAPTURE_FRAME_RATE))
+        # Output at least as often as capturing.
+        capture_rate = self._get_setting(Setting.CAPTURE_FRAME_RATE)
+        output_rate = max(
+            self._get_setting(Setting.CAPTURE_OUTPUT_FRAME_RATE),
+            capture_rate)
+        self.__capture_interval = 1.0 / capture_rate
+        self.__next_capture_time = 0
+        self.__delay_timer.set_delay(1.0 / output_rate)
 
-    def __update_pixel_buffer(self):
-        self.__data = self.scale_pixel_buffer(
-            self.get_pixel_buffer(),
-            self._get_setting(Setting.CAPTURE_SCALE_WIDTH),
-            self._get_setting(Setting.CAPTURE_SCALE_HEIGHT))
+    def __is_capture_due(self, now):
+        # Only capture when due, otherwise reuse the last captured frames.
+        if now < self.__next_capture_time:
+            return False
+        self.__next_capture_time += self.__capture_interval
+        if self.__next_capture_time <= now:
+            # Fell behind, restart the capture schedule.
+            self.__next_capture_time = now + self.__capture_interval
+        return True
 
     def _run_service(self):
         self.__delay_timer.start()
 
         try:
-            # Check that an hyperion connection is available.
-            if not self.__hyperion_connector.is_connected():
-                self.__hyperion_connector.connect()
-                self._update_state(CaptureService.StateValue.OK)
+            now = time.time()
+            capture = self.__is_capture_due(now)
 
-            # Capture frame.
-            self.__update_pixel_buffer()
+            # Rebuild streams if missing or the screen was reconfigured.
+            if not self.__streams or self.__screen_watcher.update():
+                self.__update_streams()
+                self._enable(True)
+                if not self.__streams:
+                    raise CaptureError("Capture error: no capture source")
 
-            # Send to hyperion server.
-            self.__hyperion_connector.send_image(
-                self._get_setting(Setting.CAPTURE_SCALE_WIDTH),
-                self._get_setting(Setting.CAPTURE_SCALE_HEIGHT),
-                self.__data.get_pixels(),
-                self._get_setting(Setting.CAPTURE_PRIORITY),
-                CaptureService.__IMAGE_DURATION)
+            # Follow the target window, the area only changes on events.
+            if self.__window_tracker is not None:
+                self.__window_tracker.update()
+
+            # Capture frames and send to hyperion servers.
+            if self.__pool is None:
+                reconnected = [s.update(capture, now) for s in self.__streams]
+            else:
+                reconnected = self.__pool.map(
+                    lambda s: s.update(capture, now), self.__streams)
 
-        except HyperionError as err:
+            if any(reconnected):
+                self._update_state(CaptureService.StateValue.OK,
+                                   self.__resolution_msg)
+
+        except (HyperionError, CaptureError) as err:
             self._update_state(CaptureService.StateValue.ERROR, err.msg)
             self._safe_delay(CaptureService.__ERROR_DELAY)
 
         # Wait until next run.
         self.__delay_timer.delay()
 
-    # TODO Maybe use Gst?
     @staticmethod
-    def get_pixel_buffer():
-        win = Gdk.get_default_root_window()
-        h = win.get_height()
-        w = win.get_width()
-        return Gdk.pixbuf_get_from_window(win, 0, 0, w, h)
-
-    # @staticmethod
-    # def get_pixel_buffer():
-    #     from PyQt5.QtWidgets import QApplication
-    #     app = QApplication([])
-    #     return QApplication.screens()[0].grabWindow(
-    #         QApplication.desktop().winId()).toImage()
+    def parse_monitors(value):
+        """ Parse a comma separated list of monitor indices.
+        An empty value selects the whole screen.
+        """
+        return [int(m) for m in value.split(',') if m.strip()]
 
-    @staticmethod
-    def scale_pixel_buffer(pixel_buffer, width, height):
-        return pixel_buffer.scale_simple(width, height,
-                                         GdkPixbuf.InterpType.BILINEAR)
+
+class CaptureStream(object):
+    """ Capture Stream class.
+    Captures one screen area and sends it on its own Hyperion connection.
+    Streams are updated from a thread pool when more than one is active.
+    Images and dominant colors are sent with the proto connection, LED
+    colors with the JSON connection.
+    """
+
+    __IMAGE_DURATION = 500
+
+    def __init__(self, area, ip_address, port, json_port, priority, backend,
+                 processor):
+        """
+            :param area: the area to capture, None for the whole screen
+            :type area: Gdk.Rectangle
+            :param ip_address: the Hyperion host address
+            :type ip_address: str
+            :param port: the Hyperion proto port
+            :type port: int
+            :param json_port: the Hyperion JSON port
+            :type json_port: int
+            :param priority: the Hyperion priority
+            :type priority: int
+            :param backend: the capture backend, owned by the stream
+            :type backend: BaseCaptureBackend
+            :param processor: the frame processor, owned by the stream
+            :type processor: TiledProcessor
+        """
+        self.__area = area
+        self.__priority = priority
+        self.__backend = backend
+        self.__processor = processor
+        self.__proto_connector = HyperionProto(ip_address, port)
+        self.__json_connector = HyperionJson(ip_address, json_port)
+        self.__hyperion_connector = self.__proto_connector
+        self.__interpolator = FrameInterpolator()
+        self.__correction = ColorCorrection()
+        self.__dominant = DominantColor()
+        self.__mode = CaptureMode.IMAGE
+        self.__width = 0
+        self.__height = 0
+        self.__leds = None
+        self.__layout = None
+        self.__regions = None
+        self.__sampling = (CaptureSampling.FULL, 0)
+        self.__sample_grid = None
+
+    def get_area(self):
+        return self.__area
+
+    def set_area(self, area):
+        self.__area = area
+
+    def get_scale(self):
+        return self.__width, self.__height
+
+    def get_screen_size(self):
+        return self.__backend.get_screen_size()
+
+    def set_scale(self, width, height):
+        self.__width = width
+        self.__height = height
+
+    def set_mode(self, mode):
+        if mode != self.__mode:
+            self.__mode = mode
+            self.__dominant.reset()
+            self.__interpolator.reset()
+            connector = self.__json_connector if mode == CaptureMode.LEDS \
+                else self.__proto_connector
+            if connector is not self.__hyperion_connector:
+                self.__hyperion_connector.disconnect()
+                self.__hyperion_connector = connector
+
+    def set_leds(self, count_top, count_bottom, count_side, corner,
+                 direction):
+        leds = (count_top, count_bottom, count_side, corner, direction)
+        if leds != self.__leds:
+            self.__leds = leds
+            self.__layout = LedLayout(*leds)
+            self.__regions = None
+            self.__interpolator.reset()
+
+    def set_sampling(self, sampling, samples):
+        if (sampling, samples) != self.__sampling:
+            self.__sampling = (sampling, samples)
+            self.__sample_grid = None
+
+    def set_smoothing(self, mode, time_constant):
+        self.__interpolator.set_mode(mode, time_constant)
+
+    def set_correction(self, settings):
+        self.__correction.set_correction_from_settings(settings)
+
+    def enable(self, enable):
+        if enable:
+            try:
+                self.__hyperion_connector.connect()
+            except HyperionError:
+                pass
+        else:
+            self.__hyperion_connector.disconnect()
+            self.__interpolator.reset()
+
+    def close(self):
+        self.__backend.close()
+        self.__processor.close()
+
+    def __get_regions(self, pixels):
+        # The LED regions follow the grabbed frame size.
+        height, width = pixels.shape[:2]
+        if self.__regions is None or \
+                (self.__regions.width, self.__regions.height) != \
+                (width, height):
+            self.__regions = EdgeRegions(self.__layout, width, height)
+        return self.__regions
+
+    def __average_leds(self, pixels):
+        regions = self.__get_regions(pixels)
+        sampling, samples = self.__sampling
+        if sampling == CaptureSampling.FULL:
+            return self.__processor.average_leds(pixels, regions)
+
+        # Sparse samples, regenerated with the regions.
+        if self.__sample_grid is None or \
+                self.__sample_grid.regions is not regions:
+            self.__sample_grid = SampleGrid(
+                regions, samples, sampling == CaptureSampling.JITTERED)
+        return self.__sample_grid.sample_leds(pixels)
+
+    def update(self, capture, now):
+        """ Capture (if requested) and send a frame.
+            :param capture: True if a new frame should be captured
+            :type capture: bool
+            :param now: the current time in seconds
+            :type now: float
+            :return: True if the Hyperion connection was re-established
+            :rtype: bool
+            :raises: HyperionError, CaptureError
+        """
+        # Check that an hyperion connection is available.
+        reconnected = not self.__hyperion_connector.is_connected()
+        if reconnected:
+            self.__hyperion_connector.connect()
+
+        # Capture frame, reduced to a single color in dominant mode or
+        # averaged per LED from the full resolution frame in LED mode.
+        if capture or not self.__interpolator.has_frame():
+            if self.__mode == CaptureMode.LEDS:
+                frame = self.__average_leds(self.__backend.to_array(
+                    self.__backend.grab(self.__area)))
+            else:
+                frame = self.__backend.capture(self.__area, self.__width,
+                                               self.__height)
+            if self.__mode == CaptureMode.DOMINANT:
+                frame = self.__dominant.update(frame)
+            self.__interpolator.push(frame, now)
+        data = self.__correction.apply(self.__interpolator.get_frame(now))
+
+        # Send to hyperion server.
+        if self.__mode == CaptureMode.DOMINANT:
+            self.__hyperion_connector.send_color(
+                DominantColor.to_rgb_int(data), self.__priority,
+                CaptureStream.__IMAGE_DURATION)
+        elif self.__mode == CaptureMode.LEDS:
+            self.__hyperion_connector.send_colors(
+                data.ravel().tolist(), self.__priority,
+                CaptureStream.__IMAGE_DURATION)
+        else:
+            self.__hyperion_connector.send_image(
+                self.__width, self.__height, data.tostring(), self.__priority,
+                CaptureStream.__IMAGE_DURATION)
+        return reconnected
 
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+""" Dominant color module. """
+
+# Vectorized clustering
+import numpy as np
+
+
+class DominantColor(object):
+    """ Dominant Color class.
+    Finds the dominant color of a frame with a small k-means clustering.
+    Centroids are kept between frames, so consecutive similar frames only
+    need one or two iterations to converge.
+    """
+
+    def __init__(self, clusters=4, iterations=2):
+        """
+            :param clusters: the number of clusters (default: 4)
+            :type clusters: int
+            :param iterations: the iterations per frame (default: 2)
+            :type iterations: int
+        """
+        self.__clusters = clusters
+        self.__iterations = iterations
+        self.__centroids = None
+        self.__counts = None
+        self.__pixels = None
+        self.__distances = None
+        self.__color = np.zeros((1, 1, 3), np.uint8)
+
+    def reset(self):
+        """ Forget the centroids of previous frames.
+        """
+        self.__centroids = None
+
+    def __seed(self):
+        # Spread the initial centroids evenly over the frame.
+        step = max(len(self.__pixels) // self.__clusters, 1)
+        self.__centroids = self.__pixels[::step][:self.__clusters].copy()
+        self.__distances = np.empty(
+            (len(self.__pixels), len(self.__centroids)), np.float32)
+
+    def update(self, frame):
+        """ Find the dominant color of a frame.
+            :param frame: the (h, w, 3) RGB frame
+            :type frame: numpy.ndarray
+            :return: the dominant color as a (1, 1, 3) frame (reused)
+            :rtype: numpy.ndarray
+        """
+        count = frame.shape[0] * frame.shape[1]
+        if self.__pixels is None or len(self.__pixels) != count:
+            self.__pixels = np.empty((count, 3), np.float32)
+            self.reset()
+        np.copyto(self.__pixels, frame.reshape(count, 3))
+        if self.__centroids is None:
+            self.__seed()
+
+        for _ in range(self.__iterations):
+            labels = self.__assign()
+            self.__counts = np.bincount(labels, minlength=len(
+                self.__centroids))
+            populated = self.__counts > 0
+            for c in range(3):
+                sums = np.bincount(labels, self.__pixels[:, c],
+                                   len(self.__centroids))
+                self.__centroids[populated, c] = \
+                    sums[populated] / self.__counts[populated]
+
+        dominant = self.__centroids[np.argmax(self.__counts)]
+        np.copyto(self.__color[0, 0], np.round(dominant), casting='unsafe')
+        return self.__color
+
+    def __assign(self):
+        # Squared distances without the per-pixel constant |p|^2.
+        distances = self.__distances
+        np.dot(self.__pixels, self.__centroids.T, out=distances)
+        distances *= -2
+        distances += (self.__centroids ** 2).sum(axis=1)
+        return distances.argmin(axis=1)
+
+    @staticmethod
+    def to_rgb_int(color):
+        """
+            :param color: the (1, 1, 3) color frame
+            :type color: numpy.ndarray
+            :return: the color as 0x00RRGGBB
+            :rtype: int
+        """
+        r, g, b = [int(c) for c in color[0, 0]]
+        return (r << 16) | (g << 8) | b
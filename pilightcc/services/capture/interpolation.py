@@ -0,0 +1,138 @@
+""" Capture frame interpolation module. """
+
+# Vectorized blending
+import numpy as np
+from math import exp
+
+# Application
+from pilightcc.settings.settings import CaptureSmoothing
+
+
+class FrameInterpolator(object):
+    """ Frame Interpolator class.
+    Keeps the last two captured frames and produces blended output frames,
+    which decouples the capture rate from the output rate.
+    All buffers are preallocated and reused while the frame shape is kept.
+    """
+
+    def __init__(self, mode=CaptureSmoothing.NONE, time_constant=0.05):
+        """
+            :param mode: the smoothing mode (default: CaptureSmoothing.NONE)
+            :type mode: str
+            :param time_constant: exponential smoothing time constant in
+                                  seconds (default: 0.05)
+            :type time_constant: float
+        """
+        self.__mode = mode
+        self.__time_constant = time_constant
+        self.__shape = None
+        self.__prev = None
+        self.__last = None
+        self.__state = None
+        self.__work = None
+        self.__output = None
+        self.__prev_time = None
+        self.__last_time = None
+        self.__output_time = None
+
+    def __allocate(self, shape):
+        self.__shape = shape
+        self.__prev = np.zeros(shape, np.float32)
+        self.__last = np.zeros(shape, np.float32)
+        self.__state = np.zeros(shape, np.float32)
+        self.__work = np.zeros(shape, np.float32)
+        self.__output = np.zeros(shape, np.uint8)
+
+    def set_mode(self, mode, time_constant):
+        """ Update the smoothing parameters.
+            :param mode: the smoothing mode
+            :type mode: str
+            :param time_constant: exponential smoothing time constant in
+                                  seconds
+            :type time_constant: float
+        """
+        self.__mode = mode
+        self.__time_constant = time_constant
+
+    def reset(self):
+        """ Forget all previously pushed frames.
+        """
+        self.__prev_time = None
+        self.__last_time = None
+        self.__output_time = None
+
+    def has_frame(self):
+        """
+            :return: True if at least one frame has been pushed
+            :rtype: bool
+        """
+        return self.__last_time is not None
+
+    def push(self, frame, timestamp):
+        """ Add a newly captured frame.
+            :param frame: the captured frame
+            :type frame: numpy.ndarray
+            :param timestamp: the capture time in seconds
+            :type timestamp: float
+        """
+        if frame.shape != self.__shape:
+            self.__allocate(frame.shape)
+            self.reset()
+
+        # Recycle the oldest buffer for the new frame.
+        self.__prev, self.__last = self.__last, self.__prev
+        self.__prev_time = self.__last_time
+        self.__last_time = timestamp
+        np.copyto(self.__last, frame)
+
+        if self.__prev_time is None:
+            # First frame, nothing to blend with.
+            np.copyto(self.__prev, frame)
+            np.copyto(self.__state, frame)
+            self.__prev_time = timestamp
+            self.__output_time = timestamp
+
+    def get_frame(self, timestamp):
+        """ Produce the output frame for the given time.
+            :param timestamp: the output time in seconds
+            :type timestamp: float
+            :return: the blended frame (reused between calls)
+            :rtype: numpy.ndarray
+        """
+        if self.__mode == CaptureSmoothing.LINEAR:
+            self.__blend_linear(timestamp)
+            source = self.__work
+        elif self.__mode == CaptureSmoothing.EXPONENTIAL:
+            self.__blend_exponential(timestamp)
+            source = self.__state
+        else:
+            source = self.__last
+
+        # Round into the output buffer.
+        np.add(source, 0.5, out=self.__work)
+        np.copyto(self.__output, self.__work, casting='unsafe')
+        return self.__output
+
+    def __blend_linear(self, timestamp):
+        # Move from the previous towards the last frame during one capture
+        # interval, trading one interval of latency for smooth motion.
+        interval = self.__last_time - self.__prev_time
+        if interval > 0:
+            alpha = min(max((timestamp - self.__last_time) / interval, 0.0),
+                        1.0)
+        else:
+            alpha = 1.0
+        np.subtract(self.__last, self.__prev, out=self.__work)
+        self.__work *= alpha
+        self.__work += self.__prev
+
+    def __blend_exponential(self, timestamp):
+        dt = max(timestamp - self.__output_time, 0.0)
+        self.__output_time = timestamp
+        if self.__time_constant > 0:
+            weight = 1.0 - exp(-dt / self.__time_constant)
+        else:
+            weight = 1.0
+        np.subtract(self.__last, self.__state, out=self.__work)
+        self.__work *= weight
+        self.__state += self.__work
@@ -0,0 +1,84 @@
+""" Capture buffer pool module. """
+
+# Cairo surfaces
+import cairo
+
+# Frame processing
+import numpy as np
+
+
+class CaptureBuffer(object):
+    """ Capture Buffer class.
+    A cairo image surface with a drawing context and array views of its
+    pixel data.
+    """
+
+    def __init__(self, width, height):
+        """
+            :param width: the width in pixels
+            :type width: int
+            :param height: the height in pixels
+            :type height: int
+        """
+        self.width = width
+        self.height = height
+        self.surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        self.context = cairo.Context(self.surface)
+        self.context.set_operator(cairo.OPERATOR_SOURCE)
+        # Pixels are stored as native endian 0xXXRRGGBB, i.e. BGRX bytes.
+        pixels = np.frombuffer(self.surface.get_data(), np.uint8).reshape(
+            height, self.surface.get_stride())
+        self.rgb = pixels[:, :width * 4].reshape(height, width, 4)[..., 2::-1]
+        self.array = np.empty((height, width, 3), np.uint8)
+
+    def to_array(self):
+        """ Copy the surface into the RGB array.
+            :return: the (height, width, 3) RGB array, reused between calls
+            :rtype: numpy.ndarray
+        """
+        self.surface.flush()
+        np.copyto(self.array, self.rgb)
+        return self.array
+
+
+class CaptureBufferPool(object):
+    """ Capture Buffer Pool class.
+    Keeps one buffer per role, reallocated only when its size changes.
+    """
+
+    class Role(object):
+        SOURCE = 'source'
+        DESTINATION = 'destination'
+
+    def __init__(self):
+        self.__buffers = {}
+        self.__allocations = 0
+
+    def get(self, role, width, height):
+        """ Get the buffer of a role with the given size.
+            :param role: the buffer role, see CaptureBufferPool.Role
+            :type role: str
+            :param width: the width in pixels
+            :type width: int
+            :param height: the height in pixels
+            :type height: int
+            :rtype: CaptureBuffer
+        """
+        buf = self.__buffers.get(role)
+        if buf is None or buf.width != width or buf.height != height:
+            buf = CaptureBuffer(width, height)
+            self.__buffers[role] = buf
+            self.__allocations += 1
+        return buf
+
+    def get_allocation_count(self):
+        """
+            :return: the number of buffers allocated so far
+            :rtype: int
+        """
+        return self.__allocations
+
+    def clear(self):
+        """ Release all buffers.
+        """
+        self.__buffers.clear()
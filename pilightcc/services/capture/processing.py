@@ -0,0 +1,277 @@
+""" Capture frame processing module. """
+
+# Vectorized reductions
+import numpy as np
+
+# Parallel reductions
+from multiprocessing.pool import ThreadPool
+
+
+class EdgeRegions(object):
+    """ Edge Regions class.
+    The screen regions of a LED layout for one frame size. LED sums are
+    computed in strip order (each edge in ascending coordinates: top, right,
+    bottom, left) and gathered into physical LED order with the layout's
+    edge index.
+    """
+
+    def __init__(self, layout, width, height, depth=0.1):
+        """
+            :param layout: the LED layout
+            :type layout: LedLayout
+            :param width: the frame width
+            :type width: int
+            :param height: the frame height
+            :type height: int
+            :param depth: the region depth as frame fraction (default: 0.1)
+            :type depth: float
+        """
+        self.layout = layout
+        self.width = width
+        self.height = height
+        self.count = layout.count
+        self.order = layout.edge_index
+
+        # (rows, columns, axis along the edge, segment starts, offset) per
+        # strip, the LEDs of a strip are stored from offset on.
+        self.strips = []
+        offset = 0
+        for rows, cols, axis, starts in layout.get_edges(width, height,
+                                                         depth):
+            self.strips.append((rows, cols, axis, starts, offset))
+            offset += len(starts)
+
+        # The (x0, y0, x1, y1) region of every LED, in strip order.
+        self.rects = np.empty((self.count, 4), np.intp)
+        self.rects[self.order] = layout.get_rects(width, height, depth)
+        self.sizes = ((self.rects[:, 2] - self.rects[:, 0]) *
+                      (self.rects[:, 3] - self.rects[:, 1])).astype(
+            np.uint32)[:, None]
+
+
+class SampleGrid(object):
+    """ Sample Grid class.
+    A fixed sparse set of pixel coordinates per LED region, a grid of about
+    `samples` cells per region with one sample in each cell, either at the
+    cell centre (stratified) or at a random position within the cell
+    (jittered). LED colors are averaged from these samples only, so the cost
+    follows the LED count instead of the frame size. The grid is built once
+    per set of regions, regions without pixels, e.g. of more LEDs than the
+    frame has pixels along an edge, have no samples and stay black.
+    """
+
+    def __init__(self, regions, samples, jitter=False, seed=0):
+        """
+            :param regions: the LED regions
+            :type regions: EdgeRegions
+            :param samples: the number of samples per LED
+            :type samples: int
+            :param jitter: jitter the samples within the cells
+                           (default: False)
+            :type jitter: bool
+            :param seed: the jitter seed, the grid is reproducible (default: 0)
+            :type seed: int
+        """
+        self.regions = regions
+        random = np.random.RandomState(seed)
+        rows = []
+        cols = []
+        counts = []
+        # Samples in physical order.
+        for x0, y0, x1, y1 in regions.rects[regions.order]:
+            width, height = x1 - x0, y1 - y0
+            if width <= 0 or height <= 0:
+                counts.append(0)
+                continue
+            # Square cells, no more cells than pixels.
+            nx = int(min(max(round(np.sqrt(samples * float(width) / height)),
+                             1), width))
+            ny = int(min(max(-(-samples // nx), 1), height))
+            offset_x = random.rand(ny, nx) if jitter else 0.5
+            offset_y = random.rand(ny, nx) if jitter else 0.5
+            xs = x0 + (np.arange(nx)[None, :] + offset_x) * width / nx
+            ys = y0 + (np.arange(ny)[:, None] + offset_y) * height / ny
+            cols.append(np.broadcast_to(xs, (ny, nx)).astype(np.intp).ravel())
+            rows.append(np.broadcast_to(ys, (ny, nx)).astype(np.intp).ravel())
+            counts.append(nx * ny)
+
+        self.__rows = np.concatenate(rows) if rows else np.zeros(0, np.intp)
+        self.__cols = np.concatenate(cols) if cols else np.zeros(0, np.intp)
+        counts = np.array(counts, np.uint32)
+        self.__sampled = np.flatnonzero(counts)
+        counts = counts[self.__sampled]
+        self.__starts = np.cumsum(np.append(0, counts[:-1])).astype(np.intp)
+        self.__counts = counts[:, None]
+        self.__sums = np.empty((len(counts), 3), np.uint32)
+        self.__colors = np.zeros((regions.count, 3), np.uint8)
+
+    def get_sample_count(self):
+        return len(self.__rows)
+
+    def sample_leds(self, frame):
+        """ Average the LED samples of a frame.
+            :param frame: the (h, w, 3) RGB frame of the regions' size
+            :type frame: numpy.ndarray
+            :return: the (n, 3) LED colors in physical order, reused
+            :rtype: numpy.ndarray
+        """
+        if not len(self.__rows):
+            return self.__colors
+        samples = frame[self.__rows, self.__cols]
+        np.add.reduceat(samples, self.__starts, axis=0, dtype=np.uint32,
+                        out=self.__sums)
+        self.__sums += self.__counts // 2
+        self.__sums //= self.__counts
+        if len(self.__sums) == len(self.__colors):
+            np.copyto(self.__colors, self.__sums, casting='unsafe')
+        else:
+            self.__colors[self.__sampled] = self.__sums
+        return self.__colors
+
+
+class TiledProcessor(object):
+    """ Tiled Processor class.
+    Reduces large frames on a thread pool. Frames are split into bands of
+    output rows or into edge strips, NumPy releases the GIL inside the
+    reductions so the tiles are reduced in parallel and only the small
+    partial sums are merged. All buffers are reused while sizes are kept.
+    """
+
+    def __init__(self, workers=1):
+        """
+            :param workers: the number of worker threads (default: 1)
+            :type workers: int
+        """
+        self.__workers = max(workers, 1)
+        self.__pool = ThreadPool(self.__workers) \
+            if self.__workers > 1 else None
+        self.__scale_key = None
+        self.__led_key = None
+
+    def get_workers(self):
+        return self.__workers
+
+    def __map(self, func, tasks):
+        if self.__pool is None:
+            return [func(t) for t in tasks]
+        return self.__pool.map(func, tasks)
+
+    def __setup_downscale(self, source_width, source_height, width, height):
+        self.__scale_key = (source_width, source_height, width, height)
+        self.__row_edges = (np.arange(height) * source_height) // height
+        self.__col_edges = (np.arange(width) * source_width) // width
+        # Targets larger than the source repeat edges, each repeated block
+        # is the one source pixel at its edge (nearest neighbour).
+        self.__row_ends = np.maximum(
+            np.append(self.__row_edges[1:], source_height),
+            self.__row_edges + 1)
+        counts = np.outer(
+            np.maximum(np.diff(np.append(self.__row_edges, source_height)),
+                       1),
+            np.maximum(np.diff(np.append(self.__col_edges, source_width)), 1))
+        self.__counts = counts.astype(np.uint32)[..., None]
+        self.__half_counts = self.__counts // 2
+        self.__row_sums = np.empty((height, source_width, 3), np.uint32)
+        self.__sums = np.empty((height, width, 3), np.uint32)
+        self.__scaled = np.empty((height, width, 3), np.uint8)
+        bands = np.array_split(np.arange(height), min(self.__workers * 2,
+                                                      height))
+        self.__bands = [(b[0], b[-1] + 1) for b in bands if len(b)]
+
+    def downscale(self, frame, width, height):
+        """ Area average a frame, axes larger than the frame's are repeated.
+            :param frame: the (h, w, 3) RGB frame
+            :type frame: numpy.ndarray
+            :param width: the scaled width
+            :type width: int
+            :param height: the scaled height
+            :type height: int
+            :return: the (height, width, 3) frame, reused between calls
+            :rtype: numpy.ndarray
+        """
+        source_height, source_width = frame.shape[:2]
+        if (source_width, source_height, width, height) != self.__scale_key:
+            self.__setup_downscale(source_width, source_height, width, height)
+
+        def reduce_band(band):
+            first, last = band
+            top = self.__row_edges[first]
+            bottom = self.__row_ends[last - 1]
+            np.add.reduceat(frame[top:bottom],
+                            self.__row_edges[first:last] - top, axis=0,
+                            dtype=np.uint32,
+                            out=self.__row_sums[first:last])
+            sums = self.__sums[first:last]
+            np.add.reduceat(self.__row_sums[first:last], self.__col_edges,
+                            axis=1, out=sums)
+            # Rounded mean.
+            sums += self.__half_counts[first:last]
+            sums //= self.__counts[first:last]
+            np.copyto(self.__scaled[first:last], sums, casting='unsafe')
+
+        self.__map(reduce_band, self.__bands)
+        return self.__scaled
+
+    def __setup_leds(self, regions):
+        self.__led_key = regions
+        self.__led_sums = np.empty((regions.count, 3), np.uint32)
+        self.__led_ordered = np.empty((regions.count, 3), np.uint32)
+        self.__led_colors = np.empty((regions.count, 3), np.uint8)
+        self.__edge_sums = [np.empty((regions.width if axis == 1 else
+                                      regions.height, 3), np.uint32)
+                            for _, _, axis, _, _ in regions.strips]
+
+        # Split the strips into chunks of LEDs for the workers.
+        chunks = max(-(-self.__workers // len(regions.strips)), 1)
+        self.__led_tasks = []
+        for i, (_, _, _, starts, _) in enumerate(regions.strips):
+            for part in np.array_split(np.arange(len(starts)),
+                                       min(chunks, max(len(starts), 1))):
+                if len(part):
+                    self.__led_tasks.append((i, part[0], part[-1] + 1))
+
+    def average_leds(self, frame, regions):
+        """ Average the LED regions of a frame.
+            :param frame: the (h, w, 3) RGB frame
+            :type frame: numpy.ndarray
+            :param regions: the LED regions for the frame size
+            :type regions: EdgeRegions
+            :return: the (n, 3) LED colors in physical order, reused
+            :rtype: numpy.ndarray
+        """
+        if regions is not self.__led_key:
+            self.__setup_leds(regions)
+
+        def reduce_chunk(task):
+            i, first, last = task
+            rows, cols, axis, starts, offset = regions.strips[i]
+            start = starts[first]
+            end = starts[last] if last < len(starts) else \
+                len(self.__edge_sums[i])
+            # Sum across the strip depth, then along the LED segments.
+            along = slice(start, end)
+            strip = frame[rows, cols][(slice(None), along) if axis == 1
+                                      else (along, slice(None))]
+            edge_sums = self.__edge_sums[i][start:end]
+            np.add.reduce(strip, axis=1 - axis, dtype=np.uint32,
+                          out=edge_sums)
+            np.add.reduceat(edge_sums, starts[first:last] - start, axis=0,
+                            out=self.__led_sums[offset + first:
+                                                offset + last])
+
+        self.__map(reduce_chunk, self.__led_tasks)
+
+        # Rounded mean, gathered into physical order.
+        self.__led_sums += regions.sizes // 2
+        self.__led_sums //= regions.sizes
+        np.take(self.__led_sums, regions.order, axis=0,
+                out=self.__led_ordered)
+        np.copyto(self.__led_colors, self.__led_ordered, casting='unsafe')
+        return self.__led_colors
+
+    def close(self):
+        """ Stop the worker threads.
+        """
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
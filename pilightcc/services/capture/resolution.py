@@ -0,0 +1,53 @@
+""" Capture resolution module. """
+
+from math import ceil, sqrt
+
+
+def compute_capture_size(count_top, count_bottom, count_side, screen_width,
+                         screen_height, samples_per_led, depth=0.1):
+    """ Compute the smallest capture size giving every LED enough samples.
+
+    Every LED covers an edge region of the image, 1/count of the edge long
+    and `depth` of the image deep, so a region has depth * width * height /
+    count samples: the image area alone sets the samples per LED. The
+    aspect ratio follows the LED layout, which makes every region equally
+    long along its edge (width / horizontal count = height / side count),
+    the screen aspect is used if an edge has no LEDs. The size never
+    exceeds the screen size.
+
+        :param count_top: the LED count along the top edge
+        :type count_top: int
+        :param count_bottom: the LED count along the bottom edge
+        :type count_bottom: int
+        :param count_side: the LED count along each side edge
+        :type count_side: int
+        :param screen_width: the captured screen width
+        :type screen_width: int
+        :param screen_height: the captured screen height
+        :type screen_height: int
+        :param samples_per_led: the minimum number of samples per LED
+        :type samples_per_led: int
+        :param depth: the LED region depth as image fraction (default: 0.1)
+        :type depth: float
+        :return: the (width, height) capture size, None without LEDs
+        :rtype: tuple
+    """
+    count_horizontal = max(count_top, count_bottom)
+    if count_horizontal <= 0 and count_side <= 0:
+        return None
+
+    if count_horizontal > 0 and count_side > 0:
+        aspect = float(count_horizontal) / count_side
+    else:
+        aspect = float(screen_width) / screen_height
+
+    # Samples per region: (width / count) * (height * depth) for the
+    # horizontal edges and (width * depth) * (height / count) for the sides.
+    area = samples_per_led * max(count_horizontal, count_side) / depth
+    height = sqrt(area / aspect)
+    width = aspect * height
+
+    # At least one sample row/column per LED and region.
+    width = max(int(ceil(width)), count_horizontal, int(ceil(1 / depth)))
+    height = max(int(ceil(height)), count_side, int(ceil(1 / depth)))
+    return min(width, screen_width), min(height, screen_height)
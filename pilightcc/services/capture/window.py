@@ -0,0 +1,187 @@
+""" Capture window and screen tracking module. """
+
+# PyGI - Window tracking (Wnck).
+from gi import require_version
+
+require_version('Gdk', '3.0')
+require_version('Wnck', '3.0')
+
+from gi.repository import Gdk
+from gi.repository import GLib
+from gi.repository import Wnck
+
+
+def _dispatch_events():
+    # Desktop signals are dispatched on the default main context.
+    context = GLib.MainContext.default()
+    while context.iteration(False):
+        pass
+
+
+class ScreenWatcher(object):
+    """ Screen Watcher class.
+    Notices screen resizes and monitor changes through Gdk signals, so the
+    screen size is not queried for every frame. Signals are dispatched by
+    update, which should be called from the capture thread.
+    """
+
+    def __init__(self):
+        self.__screen = Gdk.Screen.get_default()
+        self.__changed = False
+        self.__handlers = [] if self.__screen is None else [
+            self.__screen.connect('size-changed', self.__on_changed),
+            self.__screen.connect('monitors-changed', self.__on_changed)]
+
+    def __on_changed(self, _):
+        self.__changed = True
+
+    def update(self):
+        """ Dispatch pending screen events.
+            :return: True if the screen changed since the last update
+            :rtype: bool
+        """
+        _dispatch_events()
+        changed, self.__changed = self.__changed, False
+        return changed
+
+    def close(self):
+        """ Stop watching.
+        """
+        for handler in self.__handlers:
+            self.__screen.disconnect(handler)
+        self.__handlers = []
+
+
+class WindowTarget(object):
+    """ Window Target class.
+    Parses window targets of the form 'active', 'class:<name>' or
+    'title:<text>'.
+    """
+
+    ACTIVE = 'active'
+    CLASS = 'class'
+    TITLE = 'title'
+
+    def __init__(self, value):
+        """
+            :param value: the target description
+            :type value: str
+        """
+        kind, _, pattern = value.partition(':')
+        self.kind = kind.strip().lower()
+        self.pattern = pattern.strip().lower()
+
+    def matches(self, window):
+        """
+            :param window: the window to check
+            :type window: Wnck.Window
+            :rtype: bool
+        """
+        if self.kind == WindowTarget.CLASS:
+            return self.pattern in (
+                (window.get_class_group_name() or '').lower(),
+                (window.get_class_instance_name() or '').lower())
+        elif self.kind == WindowTarget.TITLE:
+            return self.pattern in (window.get_name() or '').lower()
+        return False
+
+
+class WindowTracker(object):
+    """ Window Tracker class.
+    Follows a target window through Wnck signals, so the capture area is
+    kept up to date as the window moves or resizes without looking the
+    window up for every frame. Signals are dispatched by update, which
+    should be called from the capture thread, the callback is called with
+    the new area whenever it changes.
+    """
+
+    def __init__(self, target, callback=None, screen=None):
+        """
+            :param target: the target description, see WindowTarget
+            :type target: str
+            :param callback: called as callback(area) on area changes,
+                             also while the tracker is created
+                             (default: None)
+            :type callback: callable
+            :param screen: the screen (default: the Wnck default screen)
+            :type screen: Wnck.Screen
+        """
+        self.__target = WindowTarget(target)
+        self.__callback = callback
+        self.__screen = Wnck.Screen.get_default() if screen is None \
+            else screen
+        self.__screen.force_update()
+        self.__window = None
+        self.__window_handler = None
+        self.__area = None
+
+        self.__screen_handlers = [
+            self.__screen.connect('active-window-changed',
+                                  self.__on_active_window_changed),
+            self.__screen.connect('window-opened', self.__on_window_opened),
+            self.__screen.connect('window-closed', self.__on_window_closed)]
+
+        if self.__target.kind == WindowTarget.ACTIVE:
+            self.__select(self.__screen.get_active_window())
+        else:
+            self.__select(next((w for w in self.__screen.get_windows()
+                                if self.__target.matches(w)), None))
+
+    def __select(self, window):
+        if self.__window is not None:
+            self.__window.disconnect(self.__window_handler)
+        self.__window = window
+        self.__window_handler = None
+        if window is not None:
+            self.__window_handler = window.connect(
+                'geometry-changed', self.__on_geometry_changed)
+        self.__on_geometry_changed(window)
+
+    def __on_active_window_changed(self, screen, _):
+        if self.__target.kind == WindowTarget.ACTIVE:
+            self.__select(screen.get_active_window())
+
+    def __on_window_opened(self, _, window):
+        if self.__window is None and self.__target.matches(window):
+            self.__select(window)
+
+    def __on_window_closed(self, _, window):
+        if window == self.__window:
+            self.__window = None
+            self.__select(None)
+
+    def __on_geometry_changed(self, window):
+        area = None
+        if window is not None:
+            x, y, width, height = window.get_client_window_geometry()
+            # Clip to the screen.
+            left, top = max(x, 0), max(y, 0)
+            right = min(x + width, self.__screen.get_width())
+            bottom = min(y + height, self.__screen.get_height())
+            if right > left and bottom > top:
+                area = Gdk.Rectangle()
+                area.x, area.y = left, top
+                area.width, area.height = right - left, bottom - top
+        self.__area = area
+        if self.__callback is not None:
+            self.__callback(area)
+
+    def update(self):
+        """ Dispatch pending window events.
+        """
+        _dispatch_events()
+
+    def get_area(self):
+        """
+            :return: the target window area, None if not found
+            :rtype: Gdk.Rectangle
+        """
+        return self.__area
+
+    def close(self):
+        """ Stop tracking.
+        """
+        self.__select(None)
+        for handler in self.__screen_handlers:
+            self.__screen.disconnect(handler)
+        self.__screen_handlers = []
@@ -0,0 +1,300 @@
+""" XRender server side scaling module. """
+
+# Xlib and XRender bindings
+import ctypes
+import ctypes.util
+
+# Frame processing
+import numpy as np
+
+# Application
+from pilightcc.util.error import BaseError
+
+_Display = ctypes.c_void_p
+_XID = ctypes.c_ulong
+
+_Z_PIXMAP = 2
+_LSB_FIRST = 0
+_ALL_PLANES = ctypes.c_ulong(-1).value
+_INCLUDE_INFERIORS = 1
+_CP_SUBWINDOW_MODE = 1 << 8
+_PICT_OP_SRC = 1
+
+
+def _fixed(value):
+    # XFixed is 16.16 fixed point.
+    return int(round(value * 65536))
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [('width', ctypes.c_int),
+                ('height', ctypes.c_int),
+                ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int),
+                ('data', ctypes.c_void_p),
+                ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int),
+                ('bitmap_bit_order', ctypes.c_int),
+                ('bitmap_pad', ctypes.c_int),
+                ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int),
+                ('bits_per_pixel', ctypes.c_int),
+                ('red_mask', ctypes.c_ulong),
+                ('green_mask', ctypes.c_ulong),
+                ('blue_mask', ctypes.c_ulong),
+                ('obdata', ctypes.c_void_p),
+                ('f', ctypes.c_void_p * 6)]
+
+
+class _XTransform(ctypes.Structure):
+    _fields_ = [('matrix', (ctypes.c_int * 3) * 3)]
+
+
+class _XRenderPictureAttributes(ctypes.Structure):
+    _fields_ = [('repeat', ctypes.c_int),
+                ('alpha_map', _XID),
+                ('alpha_x_origin', ctypes.c_int),
+                ('alpha_y_origin', ctypes.c_int),
+                ('clip_x_origin', ctypes.c_int),
+                ('clip_y_origin', ctypes.c_int),
+                ('clip_mask', _XID),
+                ('graphics_exposures', ctypes.c_int),
+                ('subwindow_mode', ctypes.c_int),
+                ('poly_edge', ctypes.c_int),
+                ('poly_mode', ctypes.c_int),
+                ('dither', _XID),
+                ('component_alpha', ctypes.c_int)]
+
+
+def _load(name):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise XRenderError("XRender error: lib{} not found".format(name))
+    return ctypes.CDLL(path)
+
+
+def _declare(lib, name, restype, *argtypes):
+    func = getattr(lib, name)
+    func.restype = restype
+    func.argtypes = list(argtypes)
+    return func
+
+
+class XRenderError(BaseError):
+    """ Error raised when XRender scaling is not available.
+    """
+
+    def __init__(self, msg):
+        """
+            :param msg: the error message
+            :type msg: str
+        """
+        super(XRenderError, self).__init__(msg)
+
+
+class XRenderScaler(object):
+    """ XRender Scaler class.
+    Scales the root window on the X server with an XRender picture
+    transform and filter, composited into a small offscreen pixmap, so only
+    the scaled pixels are transferred. Uses its own X connection, the
+    pixmap and the image buffer are reused while the size is kept.
+    """
+
+    NEAREST = 'nearest'
+    BILINEAR = 'bilinear'
+    GOOD = 'good'
+    BEST = 'best'
+    # Box convolution, averages the whole scaled area of every pixel.
+    BOX = 'box'
+
+    def __init__(self):
+        """
+            :raises: XRenderError if Xlib, the display or XRender is missing
+        """
+        self.__x11 = _load('X11')
+        self.__xrender = _load('Xrender')
+        x, r = self.__x11, self.__xrender
+        u, i, ul, p = ctypes.c_uint, ctypes.c_int, ctypes.c_ulong, \
+            ctypes.c_void_p
+        self.__open_display = _declare(x, 'XOpenDisplay', _Display,
+                                       ctypes.c_char_p)
+        self.__close_display = _declare(x, 'XCloseDisplay', i, _Display)
+        self.__default_screen = _declare(x, 'XDefaultScreen', i, _Display)
+        self.__root_window = _declare(x, 'XRootWindow', _XID, _Display, i)
+        self.__default_visual = _declare(x, 'XDefaultVisual', p, _Display, i)
+        self.__default_depth = _declare(x, 'XDefaultDepth', i, _Display, i)
+        self.__display_width = _declare(x, 'XDisplayWidth', i, _Display, i)
+        self.__display_height = _declare(x, 'XDisplayHeight', i, _Display, i)
+        self.__create_pixmap = _declare(x, 'XCreatePixmap', _XID, _Display,
+                                        _XID, u, u, u)
+        self.__free_pixmap = _declare(x, 'XFreePixmap', i, _Display, _XID)
+        self.__create_image = _declare(x, 'XCreateImage',
+                                       ctypes.POINTER(_XImage), _Display, p,
+                                       u, i, i, p, u, u, i, i)
+        self.__get_sub_image = _declare(x, 'XGetSubImage',
+                                        ctypes.POINTER(_XImage), _Display,
+                                        _XID, i, i, u, u, ul, i,
+                                        ctypes.POINTER(_XImage), i, i)
+        self.__free = _declare(x, 'XFree', i, p)
+        self.__query_extension = _declare(
+            r, 'XRenderQueryExtension', i, _Display,
+            ctypes.POINTER(i), ctypes.POINTER(i))
+        self.__find_visual_format = _declare(r, 'XRenderFindVisualFormat', p,
+                                             _Display, p)
+        self.__create_picture = _declare(
+            r, 'XRenderCreatePicture', _XID, _Display, _XID, p, ul,
+            ctypes.POINTER(_XRenderPictureAttributes))
+        self.__free_picture = _declare(r, 'XRenderFreePicture', None,
+                                       _Display, _XID)
+        self.__set_transform = _declare(r, 'XRenderSetPictureTransform', None,
+                                        _Display, _XID,
+                                        ctypes.POINTER(_XTransform))
+        self.__set_filter = _declare(r, 'XRenderSetPictureFilter', None,
+                                     _Display, _XID, ctypes.c_char_p,
+                                     ctypes.POINTER(i), i)
+        self.__composite = _declare(r, 'XRenderComposite', None, _Display, i,
+                                    _XID, _XID, _XID, i, i, i, i, i, i, u, u)
+
+        self.__display = self.__open_display(None)
+        if not self.__display:
+            raise XRenderError("XRender error: could not open display")
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        screen = self.__default_screen(self.__display)
+        self.__visual = self.__default_visual(self.__display, screen)
+        self.__depth = self.__default_depth(self.__display, screen)
+        self.__format = self.__find_visual_format(self.__display,
+                                                  self.__visual)
+        if not self.__query_extension(self.__display,
+                                      ctypes.byref(event_base),
+                                      ctypes.byref(error_base)) or \
+                not self.__format or self.__depth not in (24, 32):
+            self.__close_display(self.__display)
+            self.__display = None
+            raise XRenderError("XRender error: extension not available")
+        self.__root = self.__root_window(self.__display, screen)
+        self.__screen_size = (self.__display_width(self.__display, screen),
+                              self.__display_height(self.__display, screen))
+
+        attributes = _XRenderPictureAttributes(
+            subwindow_mode=_INCLUDE_INFERIORS)
+        self.__source = self.__create_picture(
+            self.__display, self.__root, self.__format, _CP_SUBWINDOW_MODE,
+            ctypes.byref(attributes))
+        self.__filter = None
+        self.__key = None
+        self.__pixmap = None
+        self.__destination = None
+        self.__images = {}
+
+    def get_screen_size(self):
+        return self.__screen_size
+
+    def set_filter(self, name):
+        """
+            :param name: the filter name, see XRenderScaler constants
+            :type name: str
+        """
+        if name != self.__filter:
+            self.__filter = name
+            self.__key = None
+
+    def __get_image(self, width, height):
+        # One reused image per size, reading into a NumPy buffer.
+        entry = self.__images.get((width, height))
+        if entry is None:
+            data = np.empty((height, width, 4), np.uint8)
+            image = self.__create_image(
+                self.__display, self.__visual, self.__depth, _Z_PIXMAP, 0,
+                data.ctypes.data, width, height, 32, width * 4)
+            if not image or image.contents.bits_per_pixel != 32:
+                raise XRenderError("XRender error: unsupported pixel format")
+            # BGRX or XRGB bytes.
+            rgb = data[..., 2::-1] if image.contents.byte_order == \
+                _LSB_FIRST else data[..., 1:]
+            entry = (image, data, rgb, np.empty((height, width, 3),
+                                                np.uint8))
+            self.__images[(width, height)] = entry
+        return entry
+
+    def __read(self, drawable, x, y, width, height):
+        image, _, rgb, array = self.__get_image(width, height)
+        self.__get_sub_image(self.__display, drawable, x, y, width, height,
+                             _ALL_PLANES, _Z_PIXMAP, image, 0, 0)
+        np.copyto(array, rgb)
+        return array
+
+    def __setup(self, x, y, area_width, area_height, width, height):
+        self.__key = (x, y, area_width, area_height, width, height)
+        if self.__pixmap is None or self.__pixmap[1:] != (width, height):
+            self.__free_destination()
+            pixmap = self.__create_pixmap(self.__display, self.__root, width,
+                                          height, self.__depth)
+            self.__pixmap = (pixmap, width, height)
+            self.__destination = self.__create_picture(
+                self.__display, pixmap, self.__format, 0, None)
+
+        # Destination pixels map to source pixels through the transform.
+        scale_x = float(area_width) / width
+        scale_y = float(area_height) / height
+        transform = _XTransform()
+        transform.matrix[0][0] = _fixed(scale_x)
+        transform.matrix[0][2] = _fixed(x)
+        transform.matrix[1][1] = _fixed(scale_y)
+        transform.matrix[1][2] = _fixed(y)
+        transform.matrix[2][2] = _fixed(1)
+        self.__set_transform(self.__display, self.__source,
+                             ctypes.byref(transform))
+
+        if self.__filter == XRenderScaler.BOX:
+            size_x = max(int(np.ceil(scale_x)), 1)
+            size_y = max(int(np.ceil(scale_y)), 1)
+            weight = _fixed(1.0 / (size_x * size_y))
+            params = (ctypes.c_int * (2 + size_x * size_y))(
+                _fixed(size_x), _fixed(size_y),
+                *([weight] * (size_x * size_y)))
+            self.__set_filter(self.__display, self.__source, 'convolution',
+                              params, len(params))
+        else:
+            self.__set_filter(self.__display, self.__source,
+                              self.__filter or XRenderScaler.BILINEAR,
+                              None, 0)
+
+    def scale(self, x, y, area_width, area_height, width, height):
+        """ Scale an area of the root window on the server and read it.
+            :return: the (height, width, 3) RGB frame, reused between calls
+            :rtype: numpy.ndarray
+        """
+        if (x, y, area_width, area_height, width, height) != self.__key:
+            self.__setup(x, y, area_width, area_height, width, height)
+        self.__composite(self.__display, _PICT_OP_SRC, self.__source, 0,
+                         self.__destination, 0, 0, 0, 0, 0, 0, width, height)
+        return self.__read(self.__pixmap[0], 0, 0, width, height)
+
+    def read(self, x, y, width, height):
+        """ Read an area of the root window without scaling.
+            :return: the (height, width, 3) RGB frame, reused between calls
+            :rtype: numpy.ndarray
+        """
+        return self.__read(self.__root, x, y, width, height)
+
+    def __free_destination(self):
+        if self.__destination is not None:
+            self.__free_picture(self.__display, self.__destination)
+            self.__free_pixmap(self.__display, self.__pixmap[0])
+            self.__destination = None
+            self.__pixmap = None
+
+    def close(self):
+        """ Release the server resources and the connection.
+        """
+        if self.__display is None:
+            return
+        self.__free_destination()
+        self.__free_picture(self.__display, self.__source)
+        for image, _, _, _ in self.__images.values():
+            # The data is owned by NumPy, only free the structure.
+            image.contents.data = None
+            self.__free(image)
+        self.__images.clear()
+        self.__close_display(self.__display)
+        self.__display = None
@@ -217,15 +217,17 @@ class SettingsStore(object):
         return self.__settings
 
     def update(self, settings):
+        changed = set()
         for key, value in settings.iteritems():
             if key in self.__settings and self.__settings[key] != value:
                 # Update the value.
                 self.__settings[key] = value
+                changed.add(key)
 
-                # Check units if callback is needed for the changed setting.
-                for keys, callback in self.__units:
-                    if key in keys and callback is not None:
-                        callback()
+        # Call each unit once, after all values of the unit are updated.
+        for keys, callback in self.__units:
+            if callback is not None and changed.intersection(keys):
+                callback()
 
 
 class ServiceLauncher(object):
@@ -16,8 +16,22 @@ class Setting(object):
     """
     CAPTURE_SCALE_WIDTH = 'cWidth'
     CAPTURE_SCALE_HEIGHT = 'cHeight'
+    CAPTURE_SCALE_AUTO = 'cScaleAuto'
+    CAPTURE_SAMPLES_PER_LED = 'cSamplesPerLed'
     CAPTURE_PRIORITY = 'cPriority'
     CAPTURE_FRAME_RATE = 'cFrameRate'
+    CAPTURE_OUTPUT_FRAME_RATE = 'cOutputFrameRate'
+    CAPTURE_SMOOTHING = 'cSmoothing'
+    CAPTURE_SMOOTHING_TIME = 'cSmoothingTime'
+    CAPTURE_MONITORS = 'cMonitors'
+    CAPTURE_BACKEND = 'cBackend'
+    CAPTURE_SCALING = 'cScaling'
+    CAPTURE_MODE = 'cMode'
+    CAPTURE_VIDEO_FILE = 'cVideoFile'
+    CAPTURE_VIDEO_REALTIME = 'cVideoRealtime'
+    CAPTURE_WINDOW = 'cWindow'
+    CAPTURE_WORKERS = 'cWorkers'
+    CAPTURE_SAMPLING = 'cSampling'
 
     HYPERION_IP_ADDRESS = 'hIpAddress'
     HYPERION_JSON_PORT = 'hJSONPort'
@@ -28,11 +42,69 @@ class Setting(object):
     LED_COUNT_SIDE = 'lCountSide'
     LED_START_CORNER = 'lStartCorner'
     LED_DIRECTION = 'lDirection'
+    LED_GAMMA = 'lGamma'
+    LED_BRIGHTNESS = 'lBrightness'
+    LED_WHITE_RED = 'lWhiteRed'
+    LED_WHITE_GREEN = 'lWhiteGreen'
+    LED_WHITE_BLUE = 'lWhiteBlue'
 
     AUDIO_OUTPUT_DEVICE_NAME = 'aOutputDeviceName'
     AUDIO_SPOTIFY_ENABLE = 'aSpotifyAutoEnable'
     AUDIO_PRIORITY = 'aPriority'
     AUDIO_FRAME_RATE = 'aFrameRate'
+    AUDIO_ANALYSER = 'aAnalyser'
+    AUDIO_EFFECT = 'aEffect'
+    AUDIO_CACHE_LEVELS = 'aCacheLevels'
+    AUDIO_CACHE_SIZE = 'aCacheSize'
+    AUDIO_SOURCE = 'aSource'
+    AUDIO_INTERVAL = 'aInterval'
+    AUDIO_LOW_CUTOFF = 'aLowCutoff'
+    AUDIO_MID_LOWER = 'aMidLower'
+    AUDIO_MID_UPPER = 'aMidUpper'
+    AUDIO_HIGH_CUTOFF = 'aHighCutoff'
+
+
+class CaptureBackend(object):
+    PIXBUF = 'pixbuf'
+    POOLED = 'pooled'
+    VIDEO = 'video'
+    XRENDER = 'xrender'
+
+
+class CaptureScaling(object):
+    NEAREST = 'nearest'
+    TILES = 'tiles'
+    BILINEAR = 'bilinear'
+    HYPER = 'hyper'
+    AREA = 'area'
+
+
+class CaptureMode(object):
+    IMAGE = 'image'
+    DOMINANT = 'dominant'
+    LEDS = 'leds'
+
+
+class CaptureSampling(object):
+    FULL = 'full'
+    STRATIFIED = 'stratified'
+    JITTERED = 'jittered'
+
+
+class CaptureSmoothing(object):
+    NONE = 'none'
+    LINEAR = 'linear'
+    EXPONENTIAL = 'exponential'
+
+
+class AudioAnalyser(object):
+    LEVEL = 'level'
+    FFT = 'fft'
+
+
+class AudioEffect(object):
+    LEVEL = 'level'
+    SPECTRUM = 'spectrum'
 
 
 class LedCorner(object):
@@ -72,10 +144,48 @@ class SettingsManager:
             _BaseSetting(64, _Section.CAPTURE, False, int),
         Setting.CAPTURE_SCALE_HEIGHT:
             _BaseSetting(64, _Section.CAPTURE, False, int),
+        # Derive the scale size from the LED layout instead.
+        Setting.CAPTURE_SCALE_AUTO:
+            _BaseSetting(False, _Section.CAPTURE, False,
+                         lambda s: s == 'True'),
+        Setting.CAPTURE_SAMPLES_PER_LED:
+            _BaseSetting(16, _Section.CAPTURE, False, int),
         Setting.CAPTURE_PRIORITY:
             _BaseSetting(900, _Section.CAPTURE, False, int),
         Setting.CAPTURE_FRAME_RATE:
             _BaseSetting(30, _Section.CAPTURE, False, int),
+        Setting.CAPTURE_OUTPUT_FRAME_RATE:
+            _BaseSetting(30, _Section.CAPTURE, False, int),
+        Setting.CAPTURE_SMOOTHING:
+            _BaseSetting(CaptureSmoothing.NONE, _Section.CAPTURE, False, str),
+        Setting.CAPTURE_SMOOTHING_TIME:
+            _BaseSetting(50, _Section.CAPTURE, False, int),
+        # Comma separated monitor indices, empty for the whole screen.
+        # Stream i uses Hyperion proto port + i and capture priority + i.
+        Setting.CAPTURE_MONITORS:
+            _BaseSetting("", _Section.CAPTURE, False, str),
+        Setting.CAPTURE_BACKEND:
+            _BaseSetting(CaptureBackend.POOLED, _Section.CAPTURE, False, str),
+        Setting.CAPTURE_SCALING:
+            _BaseSetting(CaptureScaling.BILINEAR, _Section.CAPTURE, False,
+                         str),
+        Setting.CAPTURE_MODE:
+            _BaseSetting(CaptureMode.IMAGE, _Section.CAPTURE, False, str),
+        # Video file source for the video backend.
+        Setting.CAPTURE_VIDEO_FILE:
+            _BaseSetting("", _Section.CAPTURE, False, str),
+        Setting.CAPTURE_VIDEO_REALTIME:
+            _BaseSetting(True, _Section.CAPTURE, False,
+                         lambda s: str(s) == 'True'),
+        # Window to follow: 'active', 'class:<name>' or 'title:<text>'.
+        Setting.CAPTURE_WINDOW:
+            _BaseSetting("", _Section.CAPTURE, False, str),
+        # Worker threads per stream for area scaling and LED averaging.
+        Setting.CAPTURE_WORKERS:
+            _BaseSetting(1, _Section.CAPTURE, False, int),
+        # LED mode pixel sampling, sparse modes take samples per LED.
+        Setting.CAPTURE_SAMPLING:
+            _BaseSetting(CaptureSampling.FULL, _Section.CAPTURE, False, str),
 
         Setting.HYPERION_IP_ADDRESS:
             _BaseSetting("127.0.0.1", _Section.HYPERION, False, str),
@@ -94,6 +204,17 @@ class SettingsManager:
             _BaseSetting(LedCorner.SE, _Section.HYPERION, False, str),
         Setting.LED_DIRECTION:
             _BaseSetting(LedDir.CCW, _Section.HYPERION, False, str),
+        Setting.LED_GAMMA:
+            _BaseSetting(1.0, _Section.HYPERION, False, float),
+        # Brightness in percent.
+        Setting.LED_BRIGHTNESS:
+            _BaseSetting(100, _Section.HYPERION, False, int),
+        Setting.LED_WHITE_RED:
+            _BaseSetting(255, _Section.HYPERION, False, int),
+        Setting.LED_WHITE_GREEN:
+            _BaseSetting(255, _Section.HYPERION, False, int),
+        Setting.LED_WHITE_BLUE:
+            _BaseSetting(255, _Section.HYPERION, False, int),
 
         Setting.AUDIO_OUTPUT_DEVICE_NAME:
             _BaseSetting("", _Section.AUDIO, False, str),
@@ -102,7 +223,29 @@ class SettingsManager:
         Setting.AUDIO_PRIORITY:
             _BaseSetting(100, _Section.AUDIO, False, int),
         Setting.AUDIO_FRAME_RATE:
-            _BaseSetting(60, _Section.AUDIO, False, int)
+            _BaseSetting(60, _Section.AUDIO, False, int),
+        Setting.AUDIO_ANALYSER:
+            _BaseSetting(AudioAnalyser.LEVEL, _Section.AUDIO, False, str),
+        Setting.AUDIO_EFFECT:
+            _BaseSetting(AudioEffect.LEVEL, _Section.AUDIO, False, str),
+        Setting.AUDIO_CACHE_LEVELS:
+            _BaseSetting(255, _Section.AUDIO, False, int),
+        Setting.AUDIO_CACHE_SIZE:
+            _BaseSetting(1024, _Section.AUDIO, False, int),
+        Setting.AUDIO_SOURCE:
+            _BaseSetting("alsa_output.usb-Propellerhead_Balance_"
+                         "0001002008080-00.analog-stereo.monitor",
+                         _Section.AUDIO, False, str),
+        Setting.AUDIO_INTERVAL:
+            _BaseSetting(20, _Section.AUDIO, False, int),
+        Setting.AUDIO_LOW_CUTOFF:
+            _BaseSetting(100, _Section.AUDIO, False, int),
+        Setting.AUDIO_MID_LOWER:
+            _BaseSetting(1000, _Section.AUDIO, False, int),
+        Setting.AUDIO_MID_UPPER:
+            _BaseSetting(4500, _Section.AUDIO, False, int),
+        Setting.AUDIO_HIGH_CUTOFF:
+            _BaseSetting(5000, _Section.AUDIO, False, int)
     }
 
     def __init__(self):
@@ -0,0 +1,45 @@
+""" Monotonic clock module. """
+
+# clock_gettime bindings
+import ctypes
+import ctypes.util
+import time
+
+_CLOCK_MONOTONIC = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long),
+                ('tv_nsec', ctypes.c_long)]
+
+
+def _load_clock_gettime():
+    # In libc on recent systems, in librt on older ones.
+    for name in ('c', 'rt'):
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            func = ctypes.CDLL(path).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        func.restype = ctypes.c_int
+        func.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+        return func
+    return None
+
+
+_clock_gettime = _load_clock_gettime()
+
+
+def monotonic():
+    """ Get the time of a clock that never goes back, for measuring
+    intervals. Falls back to the wall clock without clock_gettime.
+        :return: the time in seconds, from an arbitrary point
+        :rtype: float
+    """
+    timespec = _Timespec()
+    if _clock_gettime is None or \
+            _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+        return time.time()
+    return timespec.tv_sec + timespec.tv_nsec * 1e-9
@@ -0,0 +1,204 @@
+""" Offline audio benchmark.
+
+Replays reference tracks through an audio analyser, the audio effect and
+a mock Hyperion output, so the audio path runs without PulseAudio or a
+Hyperion server. Tracks are audio files or generated test signals
+(test:<audiotestsrc wave>), analysed as fast as possible unless
+--realtime is given:
+
+    python test/bench_audio.py --tracks track.ogg,test:pink-noise
+
+For every track and effect it measures analyser messages per second, the
+CPU time per second of audio and the latency from analysis to output.
+Results are written as JSON and can be compared against a saved baseline:
+
+    python test/bench_audio.py --save-baseline audio-baseline.json
+    python test/bench_audio.py --baseline audio-baseline.json
+
+The process exits with status 1 if any result regressed by more than the
+tolerance.
+"""
+
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from os import path
+
+_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+from pilightcc.settings.settings import AudioAnalyser, AudioEffect
+
+TRACKS = ['test:pink-noise', 'test:ticks', 'test:sine']
+
+# Effect and analyser settings per benchmarked effect.
+EFFECTS = {
+    'level': (AudioEffect.LEVEL, AudioAnalyser.LEVEL),
+    'level-fft': (AudioEffect.LEVEL, AudioAnalyser.FFT),
+    'spectrum': (AudioEffect.SPECTRUM, AudioAnalyser.LEVEL)
+}
+
+_POLL_INTERVAL = 0.05
+
+
+class MockOutput(object):
+    """ Stands in for the Hyperion connection, counts what is sent.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def send_encoded(self, message):
+        self.messages += 1
+        self.bytes += len(message)
+
+
+def _cpu_time():
+    # User and system time of all threads, GStreamer's included.
+    return sum(os.times()[:2])
+
+
+def run_track(track, effect_name, seconds, realtime, timeout):
+    """ Replay a track through an effect.
+        :return: the result
+        :rtype: dict
+    """
+    from pilightcc.hyperion.hypjson import HyperionJson
+    from pilightcc.services.audio.audioanalyzer import AudioSource
+    from pilightcc.services.audio.audioeffect import LevelEffect
+    from pilightcc.services.audio.audioeffect import SpectrumEffect
+    from pilightcc.services.audio.latency import FrameTiming, LatencyStats
+    from pilightcc.settings.settings import Setting, SettingsManager
+    from pilightcc.util.clock import monotonic
+
+    settings = dict((key, setting.default) for key, setting in
+                    SettingsManager._CONF.iteritems())
+    effect_setting, analyser_setting = EFFECTS[effect_name]
+    settings[Setting.AUDIO_EFFECT] = effect_setting
+    settings[Setting.AUDIO_ANALYSER] = analyser_setting
+    effect = SpectrumEffect(settings) \
+        if effect_setting == AudioEffect.SPECTRUM else LevelEffect(settings)
+    output = MockOutput()
+    latency = LatencyStats(window=10 ** 6)
+    end_time = [0.0]
+
+    def on_data(data, timing):
+        frame = effect.get_effect(data)
+        timing.stamp(FrameTiming.RENDER)
+        output.send_encoded(HyperionJson.encode_colors(
+            frame.to_list(), settings[Setting.AUDIO_PRIORITY]))
+        timing.stamp(FrameTiming.SEND)
+        latency.add(timing)
+        end_time[0] = max(end_time[0], timing.timestamp)
+
+    analyser = effect.get_new_analyser(
+        on_data, AudioSource.parse(track, realtime, seconds))
+    cpu = _cpu_time()
+    start = monotonic()
+    analyser.start()
+    while analyser.is_running() and monotonic() - start < timeout:
+        time.sleep(_POLL_INTERVAL)
+    analyser.stop()
+    elapsed = monotonic() - start
+    cpu = _cpu_time() - cpu
+
+    audio_time = end_time[0] + settings[Setting.AUDIO_INTERVAL] / 1000.0
+    result = {
+        'track': track,
+        'effect': effect_name,
+        'realtime': realtime,
+        'messages': output.messages,
+        'messages_per_s': output.messages / elapsed,
+        'audio_s': audio_time,
+        'cpu_per_audio_s': cpu / audio_time if output.messages else None
+    }
+    for stage in (FrameTiming.RENDER, FrameTiming.TOTAL):
+        percentiles = latency.get_percentiles(stage)
+        if percentiles is not None:
+            for p, value in zip((50, 95, 99), percentiles):
+                result['{}_ms_p{}'.format(stage, p)] = value * 1000
+    return result
+
+
+def _key(result):
+    return result['track'], result['effect'], result['realtime']
+
+
+def find_regressions(results, baseline, tolerance):
+    """ Compare the CPU time per second of audio against a baseline.
+        :return: (result, baseline result) pairs which regressed
+        :rtype: list
+    """
+    reference = dict((_key(r), r) for r in baseline)
+    return [(r, reference[_key(r)]) for r in results
+            if _key(r) in reference and r['cpu_per_audio_s'] and
+            reference[_key(r)]['cpu_per_audio_s'] and
+            r['cpu_per_audio_s'] > reference[_key(r)]['cpu_per_audio_s'] *
+            (1 + tolerance)]
+
+
+def main():
+    parser = ArgumentParser(description="Offline audio benchmark.")
+    parser.add_argument('--tracks', default=','.join(TRACKS),
+                        help="comma separated audio files or test:<wave>")
+    parser.add_argument('--effects', default=','.join(sorted(EFFECTS)),
+                        help="comma separated effects")
+    parser.add_argument('--seconds', type=float, default=30,
+                        help="length of generated test signals")
+    parser.add_argument('--realtime', action='store_true',
+                        help="replay in real time")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help="maximum time per replay in seconds")
+    parser.add_argument('--output', help="JSON results file (default: stdout)")
+    parser.add_argument('--baseline', help="baseline JSON to compare with")
+    parser.add_argument('--save-baseline', help="save results as baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="allowed relative CPU time regression")
+    args = parser.parse_args()
+
+    results = []
+    for track in filter(None, args.tracks.split(',')):
+        if ':' not in track:
+            track = 'file:' + path.abspath(track)
+        for effect_name in filter(None, args.effects.split(',')):
+            results.append(run_track(track, effect_name, args.seconds,
+                                     args.realtime, args.timeout))
+
+    for r in results:
+        print >> sys.stderr, \
+            "{:>30} {:>9}: {:6d} messages, {:8.1f} messages/s, {:6.3f} " \
+            "CPU s per audio s, total latency p50/p95/p99 {:.2f}/{:.2f}/" \
+            "{:.2f} ms".format(
+                r['track'], r['effect'], r['messages'], r['messages_per_s'],
+                r['cpu_per_audio_s'] or float('nan'),
+                *[r.get('total_ms_p{}'.format(p), float('nan'))
+                  for p in (50, 95, 99)])
+
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print report
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f),
+                                           args.tolerance)
+        for r, b in regressions:
+            print >> sys.stderr, "Regression: {} {}: {:.3f} CPU s per " \
+                                 "audio s (baseline {:.3f})".format(
+                r['track'], r['effect'], r['cpu_per_audio_s'],
+                b['cpu_per_audio_s'])
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
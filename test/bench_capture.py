@@ -0,0 +1,286 @@
+""" Headless capture benchmark.
+
+Starts a virtual X server (Xvfb) for each resolution, draws synthetic
+moving content on it and measures every capture backend and scaling method
+for grab time, scale time, end-to-end fps and allocation rate. The xrender
+backend transfers its frame while scaling, so compare it with the pixbuf
+backend on fps and grab plus scale time.
+
+With --video the video file backend is measured as well, decoding as fast
+as possible without any display, so it also runs where Xvfb is missing:
+
+    python test/bench_capture.py --video clip.mp4 --resolutions ''
+
+Results are written as JSON and can be compared against a saved baseline:
+
+    python test/bench_capture.py --save-baseline capture-baseline.json
+    python test/bench_capture.py --baseline capture-baseline.json
+
+The process exits with status 1 if any result regressed by more than the
+tolerance.
+"""
+
+import json
+import resource
+import sys
+import time
+from argparse import ArgumentParser, SUPPRESS
+from colorsys import hsv_to_rgb
+from os import environ, path, devnull
+from subprocess import Popen, PIPE
+
+_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160)
+}
+
+SCALE_WIDTH = 64
+SCALE_HEIGHT = 64
+
+_XVFB_TIMEOUT = 10
+_DRAW_INTERVAL = 16
+_DRAW_SETTLE_DELAY = 1
+
+
+def _free_display():
+    for n in range(99, 199):
+        if not path.exists("/tmp/.X{}-lock".format(n)):
+            return ":{}".format(n)
+    raise RuntimeError("No free X display")
+
+
+def start_xvfb(display, width, height):
+    """ Start a virtual X server and wait until it accepts connections.
+    """
+    null = open(devnull, 'w')
+    proc = Popen(['Xvfb', display, '-screen', '0',
+                  '{}x{}x24'.format(width, height), '-nolisten', 'tcp'],
+                 stdout=null, stderr=null)
+    socket_path = "/tmp/.X11-unix/X{}".format(display[1:])
+    deadline = time.time() + _XVFB_TIMEOUT
+    while not path.exists(socket_path):
+        if proc.poll() is not None or time.time() > deadline:
+            proc.kill()
+            raise RuntimeError("Xvfb failed to start on " + display)
+        time.sleep(0.05)
+    return proc
+
+
+def run_draw():
+    """ Draw moving color bars over the whole screen until killed.
+    """
+    from gi import require_version
+    require_version('Gtk', '3.0')
+    from gi.repository import Gtk, Gdk, GLib
+
+    screen = Gdk.Screen.get_default()
+    width, height = screen.get_width(), screen.get_height()
+    # Popup windows are placed exactly, no window manager is running.
+    window = Gtk.Window(type=Gtk.WindowType.POPUP)
+    window.move(0, 0)
+    window.resize(width, height)
+    area = Gtk.DrawingArea()
+    window.add(area)
+    phase = [0]
+
+    def on_draw(_, ctx):
+        ctx.set_source_rgb(0.1, 0.1, 0.1)
+        ctx.paint()
+        bars = 8
+        for i in range(bars):
+            ctx.set_source_rgb(*hsv_to_rgb(
+                (float(i) / bars + phase[0] / 240.0) % 1, 1, 1))
+            x = (phase[0] * 8 + i * width // bars) % width
+            ctx.rectangle(x, 0, width // (2 * bars), height)
+            ctx.fill()
+
+    def on_tick():
+        phase[0] += 1
+        area.queue_draw()
+        return True
+
+    area.connect('draw', on_draw)
+    GLib.timeout_add(_DRAW_INTERVAL, on_tick)
+    window.show_all()
+    Gtk.main()
+
+
+def run_worker(resolution, frames, video_file=None):
+    """ Measure all screen backends and scaling methods on the current
+    display, or the video backend if a video file is given.
+    """
+    from pilightcc.services.capture.backend import create_backend
+    from pilightcc.services.capture.backend import get_backend_names
+    from pilightcc.settings.settings import CaptureBackend, CaptureScaling
+
+    if video_file is None:
+        names = [n for n in get_backend_names() if n != CaptureBackend.VIDEO]
+    else:
+        names = [CaptureBackend.VIDEO]
+
+    page_size = resource.getpagesize()
+    results = []
+    for name in names:
+        for scaling in [CaptureScaling.NEAREST, CaptureScaling.TILES,
+                        CaptureScaling.BILINEAR, CaptureScaling.HYPER,
+                        CaptureScaling.AREA]:
+            backend = create_backend(name, scaling, video_file=video_file,
+                                     realtime=False)
+            # Warm up.
+            backend.capture(None, SCALE_WIDTH, SCALE_HEIGHT)
+
+            grab_time = 0
+            scale_time = 0
+            faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+            start = time.time()
+            for _ in range(frames):
+                t0 = time.time()
+                frame = backend.grab(None)
+                t1 = time.time()
+                backend.scale(frame, SCALE_WIDTH, SCALE_HEIGHT)
+                t2 = time.time()
+                grab_time += t1 - t0
+                scale_time += t2 - t1
+            elapsed = time.time() - start
+            faults = resource.getrusage(
+                resource.RUSAGE_SELF).ru_minflt - faults
+
+            # Fresh pages touched approximates the allocation churn.
+            results.append({
+                'resolution': resolution,
+                'backend': name,
+                'scaling': scaling,
+                'grab_ms': 1000 * grab_time / frames,
+                'scale_ms': 1000 * scale_time / frames,
+                'fps': frames / elapsed,
+                'alloc_mb_per_s': faults * page_size / elapsed / 2 ** 20
+            })
+            if hasattr(backend, 'get_allocation_count'):
+                results[-1]['buffer_allocations'] = \
+                    backend.get_allocation_count()
+            if hasattr(backend, 'is_server_scaled'):
+                results[-1]['server_scaled'] = backend.is_server_scaled()
+            backend.close()
+    json.dump(results, sys.stdout)
+
+
+def run_resolution(resolution, frames):
+    """ Run the worker on a fresh virtual display.
+    """
+    width, height = RESOLUTIONS[resolution]
+    display = _free_display()
+    env = dict(environ, DISPLAY=display,
+               PYTHONPATH=path.pathsep.join(
+                   [_ROOT] + environ.get('PYTHONPATH', '').split(
+                       path.pathsep)))
+    script = path.abspath(__file__)
+
+    xvfb = start_xvfb(display, width, height)
+    drawer = None
+    try:
+        drawer = Popen([sys.executable, script, '--draw'], env=env)
+        time.sleep(_DRAW_SETTLE_DELAY)
+        worker = Popen([sys.executable, script, '--worker', resolution,
+                        '--frames', str(frames)], env=env, stdout=PIPE)
+        output = worker.communicate()[0]
+        if worker.returncode != 0:
+            raise RuntimeError("Worker failed for " + resolution)
+        return json.loads(output)
+    finally:
+        if drawer is not None:
+            drawer.kill()
+            drawer.wait()
+        xvfb.kill()
+        xvfb.wait()
+
+
+def run_video(video_file, frames):
+    """ Run the worker on a video file, no display is needed.
+    """
+    env = dict(environ, PYTHONPATH=path.pathsep.join(
+        [_ROOT] + environ.get('PYTHONPATH', '').split(path.pathsep)))
+    worker = Popen([sys.executable, path.abspath(__file__), '--worker',
+                    'video', '--frames', str(frames), '--video',
+                    path.abspath(video_file)], env=env, stdout=PIPE)
+    output = worker.communicate()[0]
+    if worker.returncode != 0:
+        raise RuntimeError("Worker failed for " + video_file)
+    return json.loads(output)
+
+
+def _key(result):
+    return result['resolution'], result['backend'], result['scaling']
+
+
+def find_regressions(results, baseline, tolerance):
+    """ Compare fps against a baseline.
+        :return: (result, baseline result) pairs which regressed
+        :rtype: list
+    """
+    reference = dict((_key(r), r) for r in baseline)
+    return [(r, reference[_key(r)]) for r in results
+            if _key(r) in reference and
+            r['fps'] < reference[_key(r)]['fps'] * (1 - tolerance)]
+
+
+def main():
+    parser = ArgumentParser(description="Headless capture benchmark.")
+    parser.add_argument('--resolutions', default=','.join(
+        sorted(RESOLUTIONS.keys())), help="comma separated resolutions")
+    parser.add_argument('--frames', type=int, default=100,
+                        help="frames per measurement")
+    parser.add_argument('--output', help="JSON results file (default: stdout)")
+    parser.add_argument('--baseline', help="baseline JSON to compare with")
+    parser.add_argument('--save-baseline', help="save results as baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="allowed relative fps regression")
+    parser.add_argument('--video', help="also measure the video backend")
+    parser.add_argument('--draw', action='store_true', help=SUPPRESS)
+    parser.add_argument('--worker', help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.draw:
+        return run_draw()
+    if args.worker:
+        return run_worker(args.worker, args.frames, args.video)
+
+    results = []
+    for resolution in filter(None, args.resolutions.split(',')):
+        results += run_resolution(resolution, args.frames)
+    if args.video:
+        results += run_video(args.video, args.frames)
+
+    for r in results:
+        print >> sys.stderr, \
+            "{resolution:>6} {backend:>8} {scaling:>9}: grab {grab_ms:7.2f} " \
+            "ms, scale {scale_ms:7.2f} ms, {fps:7.1f} fps, " \
+            "{alloc_mb_per_s:8.1f} MB/s".format(**r)
+
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print report
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f),
+                                           args.tolerance)
+        for r, b in regressions:
+            print >> sys.stderr, "Regression: {} {} {}: {:.1f} fps " \
+                                 "(baseline {:.1f})".format(
+                r['resolution'], r['backend'], r['scaling'], r['fps'],
+                b['fps'])
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
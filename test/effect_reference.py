@@ -0,0 +1,66 @@
+""" Reference level effect for the LED frame and effect graph tests.
+
+The list based level effect and channel join the audio effects were
+written with, on a 25/16/12 LED layout.
+"""
+
+from timeit import timeit
+
+from pilightcc.settings.settings import LedCorner, LedDir
+
+TOP = 25
+BOTTOM = 16
+SIDE = 12
+WIDTH = TOP // 2 + BOTTOM // 2 + SIDE
+COLOR = [0, 0, 255]
+
+# Low, mid and high levels of the left, then the right channel.
+LEVELS = [-3.5, -12.25, -40.0, -0.5, -22.0, -15.0]
+
+
+def list_join(left_ch, right_ch, corner, direction):
+    """ Join two channels of (r,g,b) lists into a flat strip list.
+    """
+    joined = list(left_ch)
+    joined += [[0, 0, 0]] if TOP % 2 else []
+    joined += right_ch[::-1]
+    joined += [[0, 0, 0]] if BOTTOM % 2 else []
+    offsets = [BOTTOM // 2, SIDE, TOP, SIDE]
+    corner_index = {LedCorner.SW: 1, LedCorner.NW: 2,
+                    LedCorner.NE: 3, LedCorner.SE: 4}[corner]
+    if direction == LedDir.CCW:
+        corner_index = 1 - corner_index
+        joined.reverse()
+    start = sum(offsets[:corner_index])
+    return [c for color in joined[start:] + joined[:start] for c in color]
+
+
+def _list_pulse(level, width):
+    return [[int(round(c * max(level, 0.15))) for c in COLOR]
+            for _ in range(width)]
+
+
+def list_effect(levels):
+    """ The level effect comb as a flat strip list, every channel lit by
+    its own levels.
+    """
+    norm = [(max(-30, min(0, v)) + 30) / 30.0 for v in levels]
+    low = BOTTOM // 2 + int(round(SIDE * 0.3))
+    mid = int(round(SIDE * 0.7))
+    left = _list_pulse(norm[0], low) + _list_pulse(norm[1], mid) + \
+        _list_pulse(norm[2], WIDTH - low - mid)
+    right = _list_pulse(norm[3], low) + _list_pulse(norm[4], mid) + \
+        _list_pulse(norm[5], WIDTH - low - mid)
+    return list_join(left, right, LedCorner.SE, LedDir.CCW)
+
+
+def compare_rate(name, reference, candidate, runs=2000):
+    """ Time a call against the reference and print both.
+        :return: the (reference, candidate) time per call in us
+        :rtype: tuple
+    """
+    before = 1e6 * timeit(reference, number=runs) / runs
+    after = 1e6 * timeit(candidate, number=runs) / runs
+    print "\n{0} time, reference: {1:.1f} us, new: {2:.1f} us".format(
+        name, before, after)
+    return before, after
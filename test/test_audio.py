@@ -0,0 +1,36 @@
+import unittest
+
+from pilightcc.services.audio.audio import AudioService
+from pilightcc.settings.settings import Setting, SettingsManager
+
+_PORT = 25999
+
+
+class AudioServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = AudioService(_PORT)
+        self.settings = self.service._get_settings()
+        self.settings.update(dict(
+            (key, conf.default) for key, conf in SettingsManager._CONF.items()
+            if key in self.settings))
+        self.settings[Setting.AUDIO_SOURCE] = 'test:sine'
+
+    def __update_effect(self, **changes):
+        self.settings.update(changes)
+        self.service._AudioService__update_audio_effect()
+        return self.service._AudioService__audio_analyser
+
+    def test_keep_analyser(self):
+        analyser = self.__update_effect()
+        # Effect and analyser option changes keep the running analyser.
+        self.assertIs(self.__update_effect(**{
+            Setting.LED_COUNT_TOP: 20, Setting.AUDIO_FRAME_RATE: 30,
+            Setting.AUDIO_CACHE_SIZE: 0, Setting.AUDIO_INTERVAL: 40}),
+            analyser)
+        # A new source needs a new one.
+        self.assertIsNot(self.__update_effect(**{
+            Setting.AUDIO_SOURCE: 'test:pink-noise'}), analyser)
+
+
+if __name__ == '__main__':
+    unittest.main()
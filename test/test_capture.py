@@ -1,12 +1,18 @@
+import resource
 import unittest
 from timeit import timeit
 
-from pilightcc.services.capture.capture import CaptureService
+from pilightcc.services.capture.backend import PixbufCaptureBackend
+from pilightcc.services.capture.backend import PooledCaptureBackend
+from pilightcc.services.capture.backend import XRenderCaptureBackend
+from pilightcc.services.capture.backend import VideoFileCaptureBackend
+from pilightcc.services.capture.backend import CaptureError
+from pilightcc.services.capture.backend import get_monitor_areas
 
 
 class CaptureTestCase(unittest.TestCase):
     def test_capture_format(self):
-        pb = CaptureService.get_pixel_buffer()
+        pb = PixbufCaptureBackend.get_pixel_buffer()
         print "\nCapture format:"
         print "Size: {0}x{1}".format(pb.get_width(), pb.get_height())
         print "Channels: {0}".format(str(pb.get_n_channels()))
@@ -19,23 +25,71 @@ class CaptureTestCase(unittest.TestCase):
 
     def test_capture_scaling(self):
         scale = 2
-        pb = CaptureService.get_pixel_buffer()
-        pb2 = CaptureService.scale_pixel_buffer(pb, pb.get_width() / scale,
-                                                pb.get_height() / scale)
+        pb = PixbufCaptureBackend.get_pixel_buffer()
+        pb2 = PixbufCaptureBackend.scale_pixel_buffer(
+            pb, pb.get_width() / scale, pb.get_height() / scale)
         self.assertEqual(pb.get_byte_length(),
                          pb2.get_byte_length() * scale ** 2)
 
+    def test_capture_monitors(self):
+        areas = get_monitor_areas()
+        self.assertGreaterEqual(len(areas), 1)
+        for area in areas:
+            pb = PixbufCaptureBackend.get_pixel_buffer(area)
+            self.assertEqual(pb.get_width(), area.width)
+            self.assertEqual(pb.get_height(), area.height)
+
     def test_capture_rate(self):
         def capture_and_scale():
-            pb = CaptureService.get_pixel_buffer()
-            CaptureService.scale_pixel_buffer(pb, pb.get_width() / 2,
-                                              pb.get_height() / 2)
+            pb = PixbufCaptureBackend.get_pixel_buffer()
+            PixbufCaptureBackend.scale_pixel_buffer(pb, pb.get_width() / 2,
+                                                    pb.get_height() / 2)
 
         fps = 100 / timeit(capture_and_scale, number=100)
         print "\nCapture rate:"
         print "Avg fps: {0}".format(str(fps))
         self.assertGreaterEqual(fps, 30)
 
+    def test_capture_memory_churn(self):
+        def churn(backend, frames=100):
+            backend.capture(None, 64, 64)
+            faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+            for _ in range(frames):
+                backend.capture(None, 64, 64)
+            faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - \
+                faults
+            return float(faults * resource.getpagesize()) / frames
+
+        pixbuf_churn = churn(PixbufCaptureBackend())
+        pooled = PooledCaptureBackend()
+        pooled_churn = churn(pooled)
+        print "\nMemory churn per frame:"
+        print "Pixbuf: {0:.0f} kB".format(pixbuf_churn / 1024)
+        print "Pooled: {0:.0f} kB".format(pooled_churn / 1024)
+        self.assertEqual(pooled.get_allocation_count(), 2)
+        self.assertLess(pooled_churn, pixbuf_churn)
+
+    def test_capture_xrender(self):
+        backend = XRenderCaptureBackend()
+        frame = backend.capture(None, 64, 36)
+        self.assertEqual(frame.shape, (36, 64, 3))
+
+        pixbuf = PixbufCaptureBackend()
+        xrender_fps = 100 / timeit(lambda: backend.capture(None, 64, 36),
+                                   number=100)
+        pixbuf_fps = 100 / timeit(lambda: pixbuf.capture(None, 64, 36),
+                                  number=100)
+        print "\nServer side scaling: {0}".format(backend.is_server_scaled())
+        print "XRender fps: {0:.1f}".format(xrender_fps)
+        print "Pixbuf fps: {0:.1f}".format(pixbuf_fps)
+        backend.close()
+
+    def test_video_not_playable(self):
+        backend = VideoFileCaptureBackend(video_file='/nonexistent.mkv')
+        with self.assertRaises(CaptureError):
+            backend.get_screen_size()
+        backend.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from pilightcc.led.correction import ColorCorrection
+
+
+class ColorCorrectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.correction = ColorCorrection()
+        self.frame = np.tile(np.arange(256, dtype=np.uint8)[:, None], (1, 3))
+
+    def test_identity(self):
+        self.assertTrue(self.correction.is_identity())
+        expected = self.frame.copy()
+        self.correction.apply(self.frame)
+        self.assertTrue((self.frame == expected).all())
+
+    def test_brightness_and_white_point(self):
+        self.correction.set_correction(1.0, 0.5, (255, 128, 0))
+        self.assertFalse(self.correction.is_identity())
+        self.correction.apply(self.frame)
+        self.assertEqual(self.frame[255].tolist(), [128, 64, 0])
+        self.assertEqual(self.frame[0].tolist(), [0, 0, 0])
+
+    def test_gamma(self):
+        self.correction.set_correction(2.0)
+        self.correction.apply(self.frame)
+        self.assertEqual(self.frame[128].tolist(),
+                         [int(round(255 * (128 / 255.0) ** 2))] * 3)
+        self.assertEqual(self.frame[255].tolist(), [255] * 3)
+
+    def test_in_place_image(self):
+        self.correction.set_correction(1.0, 0.0)
+        image = np.full((8, 8, 3), 200, np.uint8)
+        self.assertIs(self.correction.apply(image), image)
+        self.assertFalse(image.any())
+
+
+if __name__ == '__main__':
+    unittest.main()
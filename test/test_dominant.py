@@ -0,0 +1,39 @@
+import unittest
+from timeit import timeit
+
+import numpy as np
+
+from pilightcc.services.capture.dominant import DominantColor
+
+
+class DominantColorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.zeros((64, 64, 3), np.uint8)
+        self.frame[:45] = [200, 20, 10]
+        self.frame[45:] = [10, 20, 200]
+
+    def test_dominant_color(self):
+        color = DominantColor().update(self.frame)
+        self.assertEqual(color.shape, (1, 1, 3))
+        self.assertEqual(color[0, 0].tolist(), [200, 20, 10])
+        self.assertEqual(DominantColor.to_rgb_int(color), 0xC8140A)
+
+    def test_warm_start(self):
+        dominant = DominantColor(iterations=1)
+        dominant.update(self.frame)
+        self.frame[:45] = [10, 20, 200]
+        self.frame[45:] = [200, 20, 10]
+        self.assertEqual(dominant.update(self.frame)[0, 0].tolist(),
+                         [10, 20, 200])
+
+    def test_dominant_rate(self):
+        dominant = DominantColor()
+        frame = np.random.randint(0, 256, (64, 64, 3)).astype(np.uint8)
+        fps = 100 / timeit(lambda: dominant.update(frame), number=100)
+        print "\nDominant color rate:"
+        print "Avg fps: {0}".format(str(fps))
+        self.assertGreaterEqual(fps, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+
+import numpy as np
+
+from effect_reference import TOP, BOTTOM, SIDE, COLOR, LEVELS
+from effect_reference import list_effect, list_join, compare_rate
+from pilightcc.led.layout import LedLayout
+from pilightcc.settings.settings import LedCorner, LedDir
+from pilightcc.settings.settings import Setting, SettingsManager
+from pilightcc.services.audio.effectgraph import EffectGraph, EffectContext
+from pilightcc.services.audio.effectgraph import EffectGraphError
+from pilightcc.services.audio.effectgraph import BandSelect, SpectrumSelect
+from pilightcc.services.audio.effectgraph import Normalize, Decay, Quantize
+from pilightcc.services.audio.effectgraph import SegmentFill, ColorMap
+from pilightcc.services.audio.effectgraph import Mirror, Layout
+
+_BANDS = ['low', 'mid', 'high']
+_SEGMENTS = [[(LedLayout.BOTTOM, 1.0), (LedLayout.LEFT, 0.3)],
+             [(LedLayout.LEFT, 0.7)]]
+
+
+def _level_graph(steps=None):
+    # The level effect comb.
+    stages = [BandSelect(_BANDS), Normalize(-30, 0, 0.15)]
+    stages += [Quantize(steps)] if steps else []
+    return EffectGraph(stages + [
+        SegmentFill(_SEGMENTS), ColorMap(COLOR), Mirror(), Layout()])
+
+
+def _data(levels):
+    return dict((band, {'decay': [levels[i], levels[i + 3]]})
+                for i, band in enumerate(_BANDS))
+
+
+class EffectGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.layout = LedLayout(TOP, BOTTOM, SIDE)
+        self.context = EffectContext(self.layout, 50)
+
+    def test_level_effect(self):
+        effect = _level_graph().compile(self.context)
+        self.assertFalse(effect.is_keyed())
+        self.assertEqual(effect.evaluate(_data(LEVELS)).to_list(),
+                         list_effect(LEVELS))
+
+    def test_keyed_effect(self):
+        effect = _level_graph(255).compile(self.context)
+        self.assertTrue(effect.is_keyed())
+        key = effect.get_key(_data(LEVELS))
+        self.assertEqual(key, (225, 151, 38, 251, 68, 128))
+        self.assertEqual(effect.evaluate_key(key).to_list(),
+                         list_effect(LEVELS))
+
+    def test_default_segments(self):
+        top, bottom, side = [SettingsManager._CONF[key].default for key in (
+            Setting.LED_COUNT_TOP, Setting.LED_COUNT_BOTTOM,
+            Setting.LED_COUNT_SIDE)]
+        layout = LedLayout(top, bottom, side)
+        fill, _ = SegmentFill(_SEGMENTS).compile(EffectContext(layout, 50),
+                                                 (2, 3))
+        # Segments are as long as the list effect's LED counts, which
+        # round 0.3 and 0.7 of the side separately.
+        low = bottom // 2 + int(round(side * 0.3))
+        mid = int(round(side * 0.7))
+        levels = np.array([[0, 1, 2], [3, 4, 5]], np.float32)
+        self.assertEqual(fill.apply(levels)[1].tolist(),
+                         [3] * low + [4] * mid +
+                         [5] * (layout.channel_width - low - mid))
+
+    def test_layout(self):
+        width = self.layout.channel_width
+        channels = np.random.randint(0, 256, (2, width, 3)).astype(np.uint8)
+        # The list join matched except for counter clockwise strips from
+        # the south west corner and odd bottom counts.
+        for corner, direction in ((LedCorner.SW, LedDir.CW),
+                                  (LedCorner.NW, LedDir.CW),
+                                  (LedCorner.NW, LedDir.CCW),
+                                  (LedCorner.NE, LedDir.CW),
+                                  (LedCorner.NE, LedDir.CCW),
+                                  (LedCorner.SE, LedDir.CW),
+                                  (LedCorner.SE, LedDir.CCW)):
+            context = EffectContext(
+                LedLayout(TOP, BOTTOM, SIDE, corner, direction), 50)
+            mirror, shape = Mirror().compile(context, channels.shape)
+            layout, _ = Layout().compile(context, shape)
+            self.assertEqual(
+                layout.apply(mirror.apply(channels)).to_list(),
+                list_join(channels[0].tolist(), channels[1].tolist(),
+                          corner, direction))
+
+    def test_spectrum_decay(self):
+        matrix = np.eye(5, dtype=np.float32)
+        layout = LedLayout(2, 2, 3)
+        effect = EffectGraph([
+            SpectrumSelect(matrix), Normalize(-30, 0), Decay(5),
+            ColorMap([255, 255, 255]), Mirror(),
+            Layout()]).compile(EffectContext(layout, 10))
+        loud = np.zeros((2, 5), np.float32)
+        quiet = np.full((2, 5), -30.0, np.float32)
+        effect.evaluate(loud)
+        # Half of the level falls per frame, never below zero.
+        self.assertEqual(effect.evaluate(quiet).colors.max(), 128)
+        self.assertEqual(effect.evaluate(quiet).colors.max(), 0)
+        self.assertEqual(effect.evaluate(quiet).colors.max(), 0)
+        effect.evaluate(loud)
+        effect.reset()
+        self.assertEqual(effect.evaluate(quiet).colors.max(), 0)
+
+    def test_invalid_graph(self):
+        with self.assertRaises(EffectGraphError):
+            EffectGraph([Normalize(-30, 0)]).compile(self.context)
+        with self.assertRaises(EffectGraphError):
+            EffectGraph([BandSelect(_BANDS), SegmentFill([]), ColorMap(
+                COLOR), Mirror(), Layout()]).compile(self.context)
+        with self.assertRaises(EffectGraphError):
+            EffectGraph([BandSelect(_BANDS)]).compile(self.context)
+
+    def test_effect_rate(self):
+        data = _data(LEVELS)
+        effect = _level_graph().compile(self.context)
+        before, after = compare_rate("Level effect frame",
+                                     lambda: list_effect(LEVELS),
+                                     lambda: effect.evaluate(data))
+        self.assertLess(after, before)
+
+
+if __name__ == '__main__':
+    unittest.main()
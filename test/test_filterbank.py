@@ -0,0 +1,114 @@
+import unittest
+from timeit import timeit
+
+import numpy as np
+
+from pilightcc.services.audio.filterbank import FilterBank
+from pilightcc.services.audio.filterbank import get_band_weights
+from pilightcc.services.audio.filterbank import get_log_frequency_matrix
+
+_RATE = 44100
+_BANDS = [(0, 100), (1000, 4500), (5000, 22050)]
+
+
+def _sine(frequency, amplitude=1.0, frames=4096):
+    t = np.arange(frames) / float(_RATE)
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(
+        np.float32)[:, None]
+
+
+class FilterBankTestCase(unittest.TestCase):
+    def test_band_levels(self):
+        bank = FilterBank(_RATE, 2, _BANDS, sample_peaks=True)
+        bank.push(np.hstack([_sine(50), _sine(2000, 0.5)]))
+        rms, peak, decay = bank.analyse(0)
+        self.assertEqual(rms.shape, (2, 3))
+        # A full scale sine is -3 dB rms, half scale -9 dB.
+        self.assertAlmostEqual(rms[0, 0], -3.0, delta=0.1)
+        self.assertAlmostEqual(rms[1, 1], -9.0, delta=0.1)
+        self.assertLess(rms[0, 1], -60)
+        self.assertLess(rms[1, 2], -60)
+        # Sample peaks, like the level element.
+        self.assertAlmostEqual(peak[0, 0], 0.0, delta=0.1)
+        self.assertAlmostEqual(peak[1, 1], -6.0, delta=0.1)
+        self.assertLess(peak[0, 1], -60)
+        np.testing.assert_array_equal(decay, peak)
+
+    def test_empty_push(self):
+        bank = FilterBank(_RATE, 2, _BANDS)
+        bank.push(np.hstack([_sine(50), _sine(50)]))
+        bank.push(np.zeros((0, 2), np.float32))
+        self.assertAlmostEqual(bank.analyse(0)[0][0, 0], -3.0, delta=0.1)
+
+    def test_weights_cached(self):
+        weights = get_band_weights(_RATE, 2048, _BANDS)
+        self.assertIs(get_band_weights(_RATE, 2048, list(_BANDS)), weights)
+        self.assertIsNot(get_band_weights(_RATE, 1024, _BANDS), weights)
+        self.assertEqual(weights.shape, (1025, 3))
+
+    def test_log_frequency_matrix(self):
+        matrix = get_log_frequency_matrix(_RATE, 128, 40)
+        self.assertEqual(matrix.shape, (128, 40))
+        np.testing.assert_allclose(matrix.sum(axis=0), 1, rtol=1e-5)
+        # Low outputs use few bins, high outputs many.
+        self.assertLess((matrix[:, 0] > 0).sum(), (matrix[:, -1] > 0).sum())
+        self.assertIs(get_log_frequency_matrix(_RATE, 128, 40), matrix)
+
+    def test_peak_decay(self):
+        bank = FilterBank(_RATE, 1, _BANDS, peak_ttl=0.3, peak_falloff=10,
+                          sample_peaks=True)
+        bank.push(_sine(50))
+        bank.analyse(0)
+        bank.push(np.zeros((4096, 1), np.float32))
+        self.assertAlmostEqual(bank.analyse(0.2)[2][0, 0], 0.0, delta=0.1)
+        self.assertAlmostEqual(bank.analyse(0.5)[2][0, 0], -3.0, delta=0.1)
+
+    def test_carry_over(self):
+        bank = FilterBank(_RATE, 1, _BANDS, peak_ttl=0.3, peak_falloff=10,
+                          sample_peaks=True)
+        bank.push(_sine(50))
+        bank.analyse(0)
+        # New cutoffs continue from the samples and the held peak.
+        new_bank = FilterBank(_RATE, 1, [(0, 200), (800, 4500),
+                                         (5000, 22050)],
+                              peak_ttl=0.3, peak_falloff=10,
+                              sample_peaks=True)
+        new_bank.carry_over(bank)
+        rms, _, decay = new_bank.analyse(0.5)
+        self.assertAlmostEqual(rms[0, 0], -3.0, delta=0.1)
+        self.assertAlmostEqual(decay[0, 0], -5.0, delta=0.1)
+        # Other band counts only keep the samples.
+        new_bank = FilterBank(_RATE, 1, _BANDS[:2], sample_peaks=True)
+        new_bank.carry_over(bank)
+        rms, _, decay = new_bank.analyse(0.5)
+        self.assertAlmostEqual(rms[0, 0], -3.0, delta=0.1)
+        self.assertLess(decay[0, 0], -60)
+
+    def test_rms_peaks(self):
+        bank = FilterBank(_RATE, 1, _BANDS)
+        bank.push(_sine(50))
+        rms, peak, decay = bank.analyse(0)
+        np.testing.assert_array_equal(peak, rms)
+        np.testing.assert_array_equal(decay, rms)
+
+    def test_band_count_cost(self):
+        bands = [(20 * 2 ** (i / 6.0), 20 * 2 ** ((i + 1) / 6.0))
+                 for i in range(64)]
+        samples = np.hstack([_sine(50), _sine(2000)])
+        print "\nFilter bank analysis time:"
+        for layout, sample_peaks in ((_BANDS, False), (bands, False),
+                                     (_BANDS, True), (bands, True)):
+            bank = FilterBank(_RATE, 2, layout, sample_peaks=sample_peaks)
+
+            def analyse():
+                bank.push(samples[:882])
+                bank.analyse(0)
+            ms = 1000 * timeit(analyse, number=100) / 100
+            print "Bands: {0}, sample peaks: {1}, {2:.3f} ms".format(
+                len(layout), sample_peaks, ms)
+            # Sample peaks filter every band, other levels share one FFT.
+            self.assertLess(ms, len(layout) if sample_peaks else 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
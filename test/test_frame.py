@@ -0,0 +1,25 @@
+import unittest
+
+import numpy as np
+
+from pilightcc.led.frame import LedFrame, normalize
+
+
+class LedFrameTestCase(unittest.TestCase):
+    def test_to_list(self):
+        frame = LedFrame(3)
+        self.assertEqual(len(frame), 3)
+        frame.colors[1] = [255, 128, 0]
+        self.assertEqual(frame.to_list(), [0, 0, 0, 255, 128, 0, 0, 0, 0])
+
+    def test_normalize(self):
+        levels = normalize([-40.0, -15.0, 5.0], -30, 0)
+        self.assertEqual(levels.tolist(), [0.0, 0.5, 1.0])
+        out = np.empty(3, np.float32)
+        self.assertIs(normalize(np.array([-30.0, -7.5, 0.0]), -30, 0, out),
+                      out)
+        self.assertEqual(out.tolist(), [0.0, 0.75, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
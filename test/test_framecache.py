@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from pilightcc.hyperion.hypjson import HyperionJson
+from pilightcc.services.audio.framecache import FrameCache
+
+
+class FrameCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.payload = HyperionJson.encode_colors([0, 0, 255] * 100, 100,
+                                                  500)
+
+    def test_hit_rate(self):
+        cache = FrameCache(1 << 20)
+        self.assertIsNone(cache.get((1, 2)))
+        cache.put((1, 2), self.payload)
+        self.assertEqual(cache.get((1, 2)), self.payload)
+        self.assertEqual(cache.get((1, 2)), self.payload)
+        self.assertEqual(cache.get_lookups(), 3)
+        self.assertAlmostEqual(cache.get_hit_rate(), 2 / 3.0)
+        cache.clear()
+        self.assertEqual(cache.get_size(), 0)
+        self.assertEqual(cache.get_lookups(), 0)
+
+    def test_lru_eviction(self):
+        cache = FrameCache(1 << 12)
+        for i in range(100):
+            cache.put((i,), self.payload)
+            # Keep the first entry in use.
+            cache.get((0,))
+        self.assertLessEqual(cache.get_bytes(), 1 << 12)
+        self.assertLess(cache.get_size(), 100)
+        self.assertIsNotNone(cache.get((0,)))
+        self.assertIsNotNone(cache.get((99,)))
+        self.assertIsNone(cache.get((1,)))
+
+    def test_disabled(self):
+        cache = FrameCache(0)
+        self.assertFalse(cache.is_enabled())
+        cache.put((1,), self.payload)
+        self.assertIsNone(cache.get((1,)))
+
+    def test_encode_colors(self):
+        message = json.loads(self.payload)
+        self.assertTrue(self.payload.endswith("\n"))
+        self.assertEqual(message['command'], 'color')
+        self.assertEqual(message['color'], [0, 0, 255] * 100)
+        self.assertEqual(message['duration'], 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from pilightcc.services.capture.interpolation import FrameInterpolator
+from pilightcc.settings.settings import CaptureSmoothing
+
+
+class FrameInterpolatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.black = np.zeros((4, 4, 3), np.uint8)
+        self.white = np.full((4, 4, 3), 255, np.uint8)
+
+    def test_none(self):
+        interpolator = FrameInterpolator(CaptureSmoothing.NONE)
+        interpolator.push(self.black, 0.0)
+        interpolator.push(self.white, 0.1)
+        self.assertTrue((interpolator.get_frame(0.1) == 255).all())
+
+    def test_linear(self):
+        interpolator = FrameInterpolator(CaptureSmoothing.LINEAR)
+        interpolator.push(self.black, 0.0)
+        interpolator.push(self.white, 0.1)
+        self.assertTrue((interpolator.get_frame(0.1) == 0).all())
+        self.assertTrue((interpolator.get_frame(0.15) == 128).all())
+        self.assertTrue((interpolator.get_frame(0.3) == 255).all())
+
+    def test_exponential(self):
+        interpolator = FrameInterpolator(CaptureSmoothing.EXPONENTIAL, 0.1)
+        interpolator.push(self.black, 0.0)
+        interpolator.push(self.white, 0.0)
+        first = int(interpolator.get_frame(0.1)[0, 0, 0])
+        self.assertEqual(first, int(round(255 * (1 - np.exp(-1)))))
+        self.assertGreater(int(interpolator.get_frame(0.2)[0, 0, 0]), first)
+        self.assertEqual(int(interpolator.get_frame(10.0)[0, 0, 0]), 255)
+
+    def test_resize(self):
+        interpolator = FrameInterpolator(CaptureSmoothing.LINEAR)
+        interpolator.push(self.black, 0.0)
+        interpolator.push(np.full((2, 2, 3), 9, np.uint8), 0.1)
+        self.assertEqual(interpolator.get_frame(0.1).shape, (2, 2, 3))
+        self.assertTrue((interpolator.get_frame(0.1) == 9).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
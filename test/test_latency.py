@@ -0,0 +1,43 @@
+import unittest
+
+from pilightcc.services.audio.latency import FrameTiming, LatencyStats
+from pilightcc.util.clock import monotonic
+
+
+class LatencyTestCase(unittest.TestCase):
+    def test_monotonic(self):
+        times = [monotonic() for _ in range(100)]
+        self.assertEqual(times, sorted(times))
+
+    def test_stage_latencies(self):
+        timing = FrameTiming(1.0, 1.02, 0.01, 0.005)
+        for stage, now in ((FrameTiming.ANALYSIS, 10.0),
+                           (FrameTiming.DISPATCH, 10.001),
+                           (FrameTiming.WAIT, 10.003),
+                           (FrameTiming.RENDER, 10.004),
+                           (FrameTiming.SEND, 10.006)):
+            timing.stamp(stage, now)
+        latencies = timing.get_latencies()
+        self.assertAlmostEqual(latencies[FrameTiming.CAPTURE], 0.01)
+        self.assertAlmostEqual(latencies[FrameTiming.WAIT], 0.002)
+        self.assertAlmostEqual(latencies[FrameTiming.SEND], 0.002)
+        self.assertAlmostEqual(latencies[FrameTiming.TOTAL], 0.021)
+
+    def test_percentiles(self):
+        stats = LatencyStats(window=100)
+        for i in range(200):
+            timing = FrameTiming(analysis_latency=i / 1000.0)
+            timing.stamp(FrameTiming.ANALYSIS, 0)
+            stats.add(timing)
+        # Only the last 100 frames are kept.
+        p50, p95, p99 = stats.get_percentiles(FrameTiming.ANALYSIS)
+        self.assertAlmostEqual(p50, 0.1495)
+        self.assertAlmostEqual(p99, 0.19801)
+        self.assertIsNone(stats.get_percentiles(FrameTiming.RENDER))
+        self.assertIn("analysis 149.5/", stats.get_report())
+        stats.clear()
+        self.assertIsNone(stats.get_percentiles(FrameTiming.ANALYSIS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from pilightcc.led.layout import LedLayout
+from pilightcc.settings.settings import LedCorner, LedDir
+
+
+class LedLayoutTestCase(unittest.TestCase):
+    def test_sides(self):
+        layout = LedLayout(3, 3, 2, LedCorner.NW, LedDir.CW)
+        self.assertEqual(layout.sides.tolist(),
+                         [0, 0, 0, 1, 1, 2, 2, 2, 3, 3])
+        self.assertEqual(layout.positions.tolist(),
+                         [0, 1, 2, 0, 1, 2, 1, 0, 1, 0])
+        self.assertEqual(layout.get_side_mask(LedLayout.RIGHT).sum(), 2)
+
+    def test_counter_clockwise_south_west(self):
+        # Starts with the left most bottom LED, towards the right.
+        layout = LedLayout(4, 4, 2, LedCorner.SW, LedDir.CCW)
+        self.assertEqual(layout.sides[:5].tolist(), [2, 2, 2, 2, 1])
+        self.assertEqual(layout.positions[:5].tolist(), [0, 1, 2, 3, 1])
+
+    def test_channel_index(self):
+        # Channels: left 0-5 and right 6-11 from the bottom centre, 12 unlit.
+        layout = LedLayout(5, 5, 2, LedCorner.SE, LedDir.CW)
+        self.assertEqual(layout.channel_width, 6)
+        self.assertEqual(layout.channel_index.tolist(),
+                         [7, 6, 12, 0, 1, 2, 3, 4, 5, 12, 11, 10, 9, 8])
+
+    def test_odd_bottom_counter_clockwise(self):
+        # The strip starts at the bottom of the right side for any padding.
+        for bottom in (4, 5):
+            layout = LedLayout(4, bottom, 3, LedCorner.SE, LedDir.CCW)
+            width = layout.channel_width
+            self.assertEqual(layout.channel_index[0], width + bottom // 2)
+
+    def test_rects(self):
+        layout = LedLayout(3, 3, 2, LedCorner.SE, LedDir.CCW)
+        rects = layout.get_rects(120, 80)
+        self.assertEqual(rects.shape, (10, 4))
+        # Right side bottom up, then the top right to left.
+        self.assertEqual(rects[0].tolist(), [108, 40, 120, 80])
+        self.assertEqual(rects[2].tolist(), [80, 0, 120, 8])
+        # Every LED has exactly one region.
+        self.assertEqual(sorted(layout.edge_index.tolist()), range(10))
+        self.assertTrue((rects[:, 2:] > rects[:, :2]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import threading
+import unittest
+from timeit import timeit
+
+from gi import require_version
+
+require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from pilightcc.services.audio.mainloop import GLibLoop
+
+_CYCLES = 200
+
+
+class GLibLoopTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = GLibLoop.get()
+        self.bus = Gst.Bus.new()
+        self.received = threading.Event()
+
+    def tearDown(self):
+        self.loop.shutdown()
+
+    def __on_eos(self, *_):
+        self.received.set()
+
+    def __cycle(self):
+        self.loop.detach(self.bus, self.loop.attach(
+            self.bus, [('message::eos', self.__on_eos)]))
+
+    def test_shared_instance(self):
+        self.assertIs(GLibLoop.get(), self.loop)
+
+    def test_dispatch(self):
+        connections = self.loop.attach(
+            self.bus, [('message::eos', self.__on_eos)])
+        self.assertTrue(self.loop.is_running())
+        self.bus.post(Gst.Message.new_eos(None))
+        self.assertTrue(self.received.wait(1))
+        self.loop.detach(self.bus, connections)
+        self.assertEqual(self.loop.get_watches(), 0)
+
+    def test_constant_threads(self):
+        self.__cycle()
+        threads = threading.active_count()
+        for _ in range(_CYCLES):
+            self.__cycle()
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(self.loop.get_watches(), 0)
+
+    def test_shutdown(self):
+        self.__cycle()
+        threads = threading.active_count()
+        self.loop.shutdown()
+        self.assertFalse(self.loop.is_running())
+        self.assertEqual(threading.active_count(), threads - 1)
+        # Started again by the next attach, on a new loop.
+        connections = self.loop.attach(
+            self.bus, [('message::eos', self.__on_eos)])
+        self.assertTrue(self.loop.is_running())
+        self.bus.post(Gst.Message.new_eos(None))
+        self.assertTrue(self.received.wait(1))
+        self.loop.detach(self.bus, connections)
+
+    def test_cycle_time(self):
+        self.__cycle()
+        first = 1e6 * timeit(self.__cycle, number=_CYCLES) / _CYCLES
+        last = 1e6 * timeit(self.__cycle, number=_CYCLES) / _CYCLES
+        print "\nAttach/detach time, first: {0:.1f} us, after {1} " \
+              "cycles: {2:.1f} us".format(first, _CYCLES, last)
+        self.assertLess(last, 2 * first + 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import timeit
+import unittest
+
+import numpy as np
+
+from pilightcc.services.audio.onset import OnsetDetector
+from pilightcc.services.audio.pacing import interpolate
+
+_RATE = 50.0
+
+
+def _pulses(bpm, seconds, channels=2, bands=3):
+    # A kick every beat on a quiet floor, with a little noise.
+    rng = np.random.RandomState(0)
+    times = np.arange(int(seconds * _RATE)) / _RATE
+    period = 60.0 / bpm
+    phase = np.mod(times, period)
+    levels = np.where(phase < 1 / _RATE, -10.0, -40.0)
+    noise = rng.uniform(-0.5, 0.5, (len(times), channels * bands))
+    return times, levels[:, None] + noise
+
+
+class OnsetTestCase(unittest.TestCase):
+    def test_beats(self):
+        detector = OnsetDetector()
+        times, levels = _pulses(120, 10)
+        beats = [t for t, l in zip(times, levels)
+                 if detector.update(l, t)['beat']]
+        self.assertAlmostEqual(detector.get_bpm(), 120, delta=1)
+        self.assertAlmostEqual(len(beats), 20, delta=1)
+        np.testing.assert_allclose(np.diff(beats), 0.5, atol=0.03)
+
+    def test_tempo_octave(self):
+        detector = OnsetDetector(min_bpm=80)
+        for t, l in zip(*_pulses(70, 15)):
+            detector.update(l, t)
+        self.assertAlmostEqual(detector.get_bpm(), 140, delta=2)
+
+    def test_fill_in(self):
+        detector = OnsetDetector(max_missed=2)
+        times, levels = _pulses(120, 8)
+        # The kicks stop after 6 s.
+        levels[times >= 6] = -40.0
+        beats = [t for t, l in zip(times, levels)
+                 if detector.update(l, t)['beat']]
+        self.assertEqual(len([t for t in beats if t >= 6]), 2)
+
+    def test_restart(self):
+        detector = OnsetDetector()
+        for t, l in zip(*_pulses(120, 5)):
+            detector.update(l, t)
+        data = detector.update(np.full(6, -40.0), 0.0)
+        self.assertFalse(data['beat'])
+        self.assertEqual(data['bpm'], 0)
+
+    def test_interpolate(self):
+        previous = {'low': {'rms': [-20.0]}, 'beat': False,
+                    'onset_strength': 0.0, 'bpm': 120.0}
+        latest = {'low': {'rms': [-10.0]}, 'beat': True,
+                  'onset_strength': 4.0, 'bpm': 120.0}
+        self.assertEqual(interpolate(previous, latest, 0.5),
+                         {'low': {'rms': [-15.0]}, 'beat': True,
+                          'onset_strength': 2.0, 'bpm': 120.0})
+
+    def test_benchmark(self):
+        # The cost per update doesn't grow with the stream length.
+        times, levels = _pulses(120, 60)
+        costs = []
+        for count in (500, 3000):
+            detector = OnsetDetector()
+            samples = list(zip(times[:count], levels[:count]))
+
+            def run():
+                for t, l in samples:
+                    detector.update(l, t)
+            costs.append(min(timeit.repeat(run, number=1, repeat=3)) / count)
+        print("\nOnset detection: {:.1f} us/update ({} updates), "
+              "{:.1f} us/update ({} updates)".format(
+                  costs[0] * 1e6, 500, costs[1] * 1e6, 3000))
+        self.assertLess(costs[1], costs[0] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
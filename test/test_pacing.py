@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from pilightcc.services.audio.pacing import Mailbox, FrameClock
+from pilightcc.services.audio.pacing import DataInterpolator, interpolate
+
+
+class _FakeClock(object):
+    # Time only passes by sleeping or advancing.
+    def __init__(self):
+        self.now = 100.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class PacingTestCase(unittest.TestCase):
+    def test_mailbox(self):
+        mailbox = Mailbox()
+        self.assertFalse(mailbox.wait(0))
+        for i in range(3):
+            mailbox.put(i)
+        self.assertTrue(mailbox.wait(0))
+        self.assertEqual(mailbox.take(), (2, True))
+        self.assertEqual(mailbox.take(), (2, False))
+        self.assertEqual(mailbox.get_dropped(), 2)
+
+    def test_frame_clock(self):
+        fake = _FakeClock()
+        clock = FrameClock(200, fake.time, fake.sleep)
+        first = clock.wait()
+        second = clock.wait()
+        self.assertAlmostEqual(second - first, 0.005)
+        self.assertEqual(clock.get_late(), 0)
+        # A slow frame skips the ticks it missed.
+        fake.now += 0.0225
+        third = clock.wait()
+        self.assertEqual(clock.get_late(), 3)
+        self.assertAlmostEqual(third, fake.now)
+        self.assertAlmostEqual(clock.wait() - third, 0.0025)
+        self.assertAlmostEqual(clock.wait() - third, 0.0075)
+
+    def test_interpolate(self):
+        previous = {'low': {'decay': [-20.0, -10.0]}}
+        latest = {'low': {'decay': [-10.0, -30.0]}}
+        self.assertEqual(interpolate(previous, latest, 0.25),
+                         {'low': {'decay': [-17.5, -15.0]}})
+        np.testing.assert_allclose(
+            interpolate(np.zeros((2, 4)), np.ones((2, 4)), 0.5), 0.5)
+
+    def test_interpolator(self):
+        interpolator = DataInterpolator(1 / 60.0)
+        interpolator.push([0.0], 0.0)
+        self.assertEqual(interpolator.get(0.25), [0.0])
+        interpolator.push([1.0], 0.5)
+        self.assertEqual(interpolator.get(0.75), [0.5])
+        self.assertEqual(interpolator.get(1.0), [1.0])
+        # Frames slower than updates render the latest update.
+        interpolator.set_period(1.0)
+        self.assertEqual(interpolator.get(0.75), [1.0])
+
+    def test_interpolated_beats(self):
+        interpolator = DataInterpolator(1 / 60.0)
+        interpolator.push({'beat': True, 'low': [0.0]}, 0.0)
+        self.assertEqual([interpolator.get(t)['beat']
+                          for t in (0.0, 0.1, 0.2)], [True, False, False])
+        # A beat is rendered once, also while interpolating.
+        interpolator.push({'beat': True, 'low': [1.0]}, 0.5)
+        frames = [interpolator.get(t) for t in (0.6, 0.8, 1.2)]
+        self.assertEqual([f['beat'] for f in frames], [True, False, False])
+        np.testing.assert_allclose([f['low'] for f in frames],
+                                   [[0.2], [0.6], [1.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
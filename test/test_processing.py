@@ -0,0 +1,138 @@
+import unittest
+from timeit import timeit
+
+import numpy as np
+
+from pilightcc.led.layout import LedLayout
+from pilightcc.settings.settings import LedCorner, LedDir
+from pilightcc.services.capture.processing import EdgeRegions
+from pilightcc.services.capture.processing import TiledProcessor
+from pilightcc.services.capture.processing import SampleGrid
+
+
+class TiledProcessorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.random.randint(0, 256, (360, 640, 3)).astype(
+            np.uint8)
+
+    def test_downscale(self):
+        expected = np.round(self.frame.reshape(36, 10, 64, 10, 3).mean(
+            axis=(1, 3)))
+        for workers in (1, 3):
+            processor = TiledProcessor(workers)
+            scaled = processor.downscale(self.frame, 64, 36)
+            self.assertEqual(scaled.shape, (36, 64, 3))
+            self.assertLessEqual(np.abs(scaled - expected).max(), 1)
+            processor.close()
+
+    def test_upscale(self):
+        small = self.frame[:36, :64]
+        for workers in (1, 3):
+            processor = TiledProcessor(workers)
+            np.testing.assert_array_equal(
+                processor.downscale(small, 128, 72),
+                small.repeat(2, axis=0).repeat(2, axis=1))
+            # Only the width is larger than the source.
+            expected = np.round(small.reshape(18, 2, 64, 3).mean(
+                axis=1)).repeat(2, axis=1)
+            self.assertLessEqual(np.abs(processor.downscale(
+                small, 128, 18) - expected).max(), 1)
+            processor.close()
+
+    def test_downscale_strided(self):
+        # Capture buffers are reversed BGRX views.
+        bgrx = np.zeros((360, 640, 4), np.uint8)
+        bgrx[..., 2::-1] = self.frame
+        processor = TiledProcessor(2)
+        np.testing.assert_array_equal(
+            processor.downscale(bgrx[..., 2::-1], 64, 36),
+            processor.downscale(self.frame, 64, 36).copy())
+        processor.close()
+
+    def test_led_order(self):
+        # Clockwise from the top left: top, right, bottom, left.
+        layout = LedLayout(3, 3, 2, LedCorner.NW, LedDir.CW)
+        regions = EdgeRegions(layout, 12, 8)
+        self.assertEqual(regions.order.tolist(),
+                         [0, 1, 2, 3, 4, 7, 6, 5, 9, 8])
+        # Counter clockwise from the bottom right: right side bottom up.
+        layout = LedLayout(3, 3, 2, LedCorner.SE, LedDir.CCW)
+        regions = EdgeRegions(layout, 12, 8)
+        self.assertEqual(regions.order.tolist(),
+                         [4, 3, 2, 1, 0, 8, 9, 5, 6, 7])
+
+    def test_average_leds(self):
+        frame = np.zeros((80, 120, 3), np.uint8)
+        frame[:8, :40] = [90, 60, 30]
+        layout = LedLayout(3, 3, 2, LedCorner.NW, LedDir.CW)
+        regions = EdgeRegions(layout, 120, 80)
+        for workers in (1, 8):
+            processor = TiledProcessor(workers)
+            colors = processor.average_leds(frame, regions)
+            self.assertEqual(colors.shape, (10, 3))
+            self.assertEqual(colors[0].tolist(), [90, 60, 30])
+            self.assertEqual(colors[1].tolist(), [0, 0, 0])
+            # The top left corner is shared with the left side.
+            self.assertEqual(colors[9].tolist(), [18, 12, 6])
+            processor.close()
+
+    def test_sample_leds(self):
+        frame = np.zeros((80, 120, 3), np.uint8)
+        frame[:8, :40] = [90, 60, 30]
+        layout = LedLayout(3, 3, 2, LedCorner.NW, LedDir.CW)
+        regions = EdgeRegions(layout, 120, 80)
+        for jitter in (False, True):
+            grid = SampleGrid(regions, 16, jitter)
+            colors = grid.sample_leds(frame)
+            self.assertEqual(colors[0].tolist(), [90, 60, 30])
+            self.assertEqual(colors[1].tolist(), [0, 0, 0])
+            self.assertLessEqual(grid.get_sample_count(), 10 * 20)
+
+    def test_sample_empty_regions(self):
+        # More LEDs than pixels along the edges leave regions empty.
+        frame = np.full((20, 40, 3), 200, np.uint8)
+        regions = EdgeRegions(LedLayout(60, 60, 34), 40, 20)
+        colors = SampleGrid(regions, 16).sample_leds(frame)
+        sizes = regions.sizes[:, 0][regions.order]
+        self.assertTrue((sizes == 0).any())
+        self.assertTrue((colors[sizes == 0] == 0).all())
+        self.assertTrue((colors[sizes > 0] == 200).all())
+
+    def test_sample_grid_fixed(self):
+        regions = EdgeRegions(LedLayout(60, 60, 34), 1920, 1080)
+        frame = np.random.randint(0, 256, (1080, 1920, 3)).astype(np.uint8)
+        first = SampleGrid(regions, 16, True).sample_leds(frame).copy()
+        np.testing.assert_array_equal(
+            SampleGrid(regions, 16, True).sample_leds(frame), first)
+
+    def test_worker_scaling(self):
+        frame = np.random.randint(0, 256, (2160, 3840, 3)).astype(np.uint8)
+        regions = EdgeRegions(LedLayout(60, 60, 34), 3840, 2160)
+        print "\nTiled processing of a 3840x2160 frame:"
+        expected = None
+        for workers in (1, 2, 4, 8):
+            processor = TiledProcessor(workers)
+            scale_ms = 1000 * timeit(
+                lambda: processor.downscale(frame, 64, 36), number=5) / 5
+            leds_ms = 1000 * timeit(
+                lambda: processor.average_leds(frame, regions), number=5) / 5
+            print "Workers: {0}, downscale: {1:.1f} ms, LEDs: {2:.1f} ms" \
+                .format(workers, scale_ms, leds_ms)
+            colors = processor.average_leds(frame, regions).copy()
+            if expected is None:
+                expected = colors
+            np.testing.assert_array_equal(colors, expected)
+            processor.close()
+
+    def test_sample_rate(self):
+        frame = np.random.randint(0, 256, (2160, 3840, 3)).astype(np.uint8)
+        regions = EdgeRegions(LedLayout(60, 60, 34), 3840, 2160)
+        grid = SampleGrid(regions, 16, True)
+        sample_ms = 1000 * timeit(lambda: grid.sample_leds(frame),
+                                  number=100) / 100
+        print "\nSparse sampling of a 3840x2160 frame: {0:.2f} ms".format(
+            sample_ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from pilightcc.services.capture.resolution import compute_capture_size
+
+
+class CaptureResolutionTestCase(unittest.TestCase):
+    def assertSamples(self, size, top, bottom, side, samples, depth=0.1):
+        width, height = size
+        horizontal = max(top, bottom)
+        self.assertGreaterEqual(
+            float(width) / horizontal * height * depth, samples)
+        self.assertGreaterEqual(
+            width * depth * float(height) / side, samples)
+
+    def test_layout_aspect(self):
+        size = compute_capture_size(30, 20, 15, 1920, 1080, 16)
+        self.assertSamples(size, 30, 20, 15, 16)
+        self.assertAlmostEqual(float(size[0]) / size[1], 2, 1)
+
+    def test_dense_layout(self):
+        sparse = compute_capture_size(30, 30, 15, 1920, 1080, 16)
+        dense = compute_capture_size(150, 150, 75, 1920, 1080, 16)
+        self.assertSamples(dense, 150, 150, 75, 16)
+        self.assertGreater(dense[0] * dense[1], sparse[0] * sparse[1])
+
+    def test_no_side_leds(self):
+        width, height = compute_capture_size(40, 0, 0, 1600, 900, 8)
+        self.assertAlmostEqual(float(width) / height, 16.0 / 9, 1)
+        self.assertGreaterEqual(width, 40)
+
+    def test_limits(self):
+        self.assertIsNone(compute_capture_size(0, 0, 0, 1920, 1080, 16))
+        self.assertEqual(compute_capture_size(300, 300, 200, 320, 240, 64),
+                         (320, 240))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+from pilightcc.services.capture.window import WindowTarget, WindowTracker
+
+
+class _StubSignals(object):
+    # Minimal GObject style signal connections.
+    def __init__(self):
+        self.handlers = {}
+        self.__next_id = 1
+
+    def connect(self, signal, handler):
+        handler_id = self.__next_id
+        self.__next_id += 1
+        self.handlers[handler_id] = (signal, handler)
+        return handler_id
+
+    def disconnect(self, handler_id):
+        del self.handlers[handler_id]
+
+    def emit(self, signal, *args):
+        for name, handler in self.handlers.values():
+            if name == signal:
+                handler(self, *args)
+
+
+class _StubWindow(_StubSignals):
+    def __init__(self, name, class_name, geometry):
+        _StubSignals.__init__(self)
+        self.name = name
+        self.class_name = class_name
+        self.geometry = geometry
+
+    def get_name(self):
+        return self.name
+
+    def get_class_group_name(self):
+        return self.class_name
+
+    def get_class_instance_name(self):
+        return None
+
+    def get_client_window_geometry(self):
+        return self.geometry
+
+    def move(self, *geometry):
+        self.geometry = geometry
+        self.emit('geometry-changed')
+
+
+class _StubScreen(_StubSignals):
+    def __init__(self, windows, active=None):
+        _StubSignals.__init__(self)
+        self.windows = windows
+        self.active = active
+
+    def force_update(self):
+        pass
+
+    def get_windows(self):
+        return self.windows
+
+    def get_active_window(self):
+        return self.active
+
+    def get_width(self):
+        return 1920
+
+    def get_height(self):
+        return 1080
+
+
+def _size(area):
+    return None if area is None else (area.x, area.y, area.width,
+                                      area.height)
+
+
+class WindowTrackerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.player = _StubWindow("Movie - Player", "Player",
+                                  (100, 50, 800, 600))
+        self.editor = _StubWindow("notes.txt - Editor", "Editor",
+                                  (0, 0, 640, 480))
+        self.screen = _StubScreen([self.editor, self.player], self.editor)
+        self.areas = []
+
+    def _track(self, target):
+        return WindowTracker(target, lambda a: self.areas.append(_size(a)),
+                             self.screen)
+
+    def test_target_matches(self):
+        self.assertTrue(WindowTarget('class:player').matches(self.player))
+        self.assertFalse(WindowTarget('class:player').matches(self.editor))
+        self.assertTrue(WindowTarget('title: Movie').matches(self.player))
+        self.assertFalse(WindowTarget('title:movie').matches(self.editor))
+        self.assertFalse(WindowTarget('active').matches(self.player))
+
+    def test_track_geometry(self):
+        tracker = self._track('class:Player')
+        self.assertEqual(self.areas, [(100, 50, 800, 600)])
+        # Moved partly off screen, the area is clipped.
+        self.player.move(1500, -100, 800, 600)
+        self.assertEqual(_size(tracker.get_area()), (1500, 0, 420, 500))
+        self.assertEqual(self.areas[-1], (1500, 0, 420, 500))
+        # Other windows are ignored.
+        self.editor.move(10, 10, 100, 100)
+        self.assertEqual(len(self.areas), 2)
+        tracker.close()
+        self.assertEqual(self.screen.handlers, {})
+        self.assertEqual(self.player.handlers, {})
+
+    def test_open_and_close(self):
+        self.screen.windows = [self.editor]
+        tracker = self._track('title:movie')
+        self.assertIsNone(tracker.get_area())
+        self.screen.emit('window-opened', self.player)
+        self.assertEqual(_size(tracker.get_area()), (100, 50, 800, 600))
+        self.screen.emit('window-closed', self.player)
+        self.assertIsNone(tracker.get_area())
+        self.assertEqual(self.areas, [None, (100, 50, 800, 600), None])
+        tracker.close()
+
+    def test_active_window(self):
+        tracker = self._track('active')
+        self.assertEqual(_size(tracker.get_area()), (0, 0, 640, 480))
+        self.screen.active = self.player
+        self.screen.emit('active-window-changed', self.editor)
+        self.assertEqual(_size(tracker.get_area()), (100, 50, 800, 600))
+        self.assertEqual(self.editor.handlers, {})
+        tracker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()